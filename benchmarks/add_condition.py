@@ -0,0 +1,120 @@
+'''Benchmark of WindsurfScenario.add_condition on long timeseries
+
+Compares the original implementation, that selects the troughs around
+each peak using boolean masks over the entire timeseries, with the
+vectorized implementation. A synthetic wind speed record with a
+seasonal cycle, storms and noise is used. Both implementations are
+checked to give identical regimes.
+
+Usage:
+
+.. code-block:: text
+
+   >>> python benchmarks/add_condition.py [years] [step_in_minutes]
+
+'''
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+import scipy.signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from windsurf.configurator import WindsurfScenario
+
+
+def legacy_add_condition(self, t, y, threshold=None, regime=None, exclude=False):
+    '''Original implementation of WindsurfScenario.add_condition'''
+
+    t = np.asarray(t)
+    y = np.asarray(y)
+
+    # set regime
+    if regime is None:
+        regime = self.selected_regime
+
+    # get all peaks
+    peaks = np.asarray(scipy.signal.argrelmax(y)[0])
+
+    # remove peaks below threshold
+    if threshold is not None:
+        peaks = np.delete(peaks, np.where(y[peaks] < threshold)[0])
+
+    # add troughs in between peaks
+    troughs = []
+    for peak in peaks:
+        t1 = t[peak] - self.interval/2
+        t2 = t[peak] + self.interval/2
+        idx1 = (t >= t1) & (t <= t[peak])
+        idx2 = (t <= t2) & (t >= t[peak])
+        troughs.append(np.where(idx1)[0][0] + np.argmin(y[idx1]))
+        troughs.append(peak + np.argmin(y[idx2]))
+
+    # join close troughs
+    while True:
+        idx = np.where(t[troughs[2::2]] - t[troughs[1:-1:2]] < self.interval)[0] * 2 + 1
+        if len(idx) == 0:
+            break
+        troughs = np.delete(troughs, np.concatenate((idx, idx+1)))
+    troughs = np.concatenate(([0], troughs, [len(t)]))
+
+    # determine regimes
+    idx = np.asarray(np.sum([[np.mod(i,2)==0] * n for i, n in enumerate(troughs[1:] - troughs[:-1])]))
+    idx = np.interp(self.t, t, idx) >= .5 # interpolate to generic time axis
+    self.set_mask(regime, exclude, idx)
+
+
+def create_timeseries(years, step):
+    '''Create synthetic wind speed record'''
+
+    t = np.arange(0., years * 365. * 24. * 3600., step)
+    day = t / 24. / 3600.
+
+    rng = np.random.RandomState(0)
+    y = 6. + 3. * np.cos(2. * np.pi * day / 365.)
+    y += rng.gamma(2., 1., len(t))
+
+    # storms of one to three days
+    n = int(years * 20)
+    for t0, d, a in zip(rng.uniform(0., t[-1], n),
+                        rng.uniform(1., 3., n) * 24. * 3600.,
+                        rng.uniform(5., 15., n)):
+        i = slice(*np.searchsorted(t, [t0 - d, t0 + d]))
+        y[i] += a * np.cos(.5 * np.pi * (t[i] - t0) / d)**2
+
+    return t, y
+
+
+def run(years=10, step=10.):
+
+    t, y = create_timeseries(years, step * 60.)
+
+    scenarios = []
+    timings = []
+    for add_condition in [legacy_add_condition, WindsurfScenario.add_condition.im_func]:
+        scenario = WindsurfScenario(time=t)
+        scenario.add_regime('calm')
+        scenario.add_regime('storm')
+
+        t0 = time.time()
+        add_condition(scenario, t, y, threshold=15.)
+        timings.append(time.time() - t0)
+        scenarios.append(scenario)
+
+    identical = np.array_equal(scenarios[0].get_mask('storm'),
+                               scenarios[1].get_mask('storm'))
+
+    print 'samples         : %d' % len(t)
+    print 'storm fraction  : %8.4f' % np.mean(scenarios[1].get_mask('storm'))
+    print 'legacy          : %8.2f s' % timings[0]
+    print 'vectorized      : %8.2f s' % timings[1]
+    print 'speedup         : %8.2fx' % (timings[0] / timings[1])
+    print 'identical       : %s' % identical
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    run(*[float(x) for x in sys.argv[1:]])
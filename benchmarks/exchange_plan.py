@@ -0,0 +1,198 @@
+'''Micro-benchmark of the per-switch overhead of Windsurf._exchange_data
+
+Compares the original implementation, that parses the exchange
+configuration on every engine switch, with the exchange plan compiled
+at initialization. The original implementation uses copies of the
+original configuration helpers, operating on the raw JSON
+configuration, such that it is not affected by later optimizations of
+these helpers. Dummy engines return small arrays, such that the
+timings are dominated by coupling overhead rather than data copying.
+
+Usage:
+
+.. code-block:: text
+
+   >>> python benchmarks/exchange_plan.py [n_exchange] [n_switch]
+
+'''
+
+import os
+import sys
+import json
+import timeit
+import logging
+import tempfile
+import traceback
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from windsurf.model import Windsurf, logger
+
+
+ENGINES = ['xbeach', 'aeolis', 'cdm']
+
+
+class DummyEngine:
+    '''Minimal BMI engine holding a fixed set of small arrays'''
+
+    def __init__(self, configfile=''):
+        self.t = 0.
+        self.data = {}
+
+    def initialize(self):
+        pass
+
+    def finalize(self):
+        pass
+
+    def update(self, dt=-1):
+        self.t += 1.
+
+    def get_current_time(self):
+        return self.t
+
+    def get_var(self, name):
+        if not self.data.has_key(name):
+            self.data[name] = np.zeros((1, 10))
+        return self.data[name]
+
+    def set_var(self, name, value):
+        self.data[name] = value
+
+
+def legacy_split_var(self, name):
+    '''Original implementation of Windsurf._split_var'''
+
+    parts = name.split('.')
+
+    engine = None
+    name = None
+
+    if len(parts) == 1:
+        name = parts[0]
+    elif len(parts) == 2:
+        if parts[0] in self.models.keys():
+            engine, name = parts
+        else:
+            name = '.'.join(parts)
+    else:
+        engine = parts[0]
+        name = '.'.join(parts)
+
+    if engine is None:
+        if name.split('.')[0] in ['Cu', 'Ct', 'supply', 'pickup', 'mass', 'uth',
+                                  'uw', 'uws', 'uwn', 'udir']:
+            engine = 'aeolis'
+        elif name.split('.')[0] in ['zb', 'zs', 'zs0', 'H']:
+            engine = 'xbeach'
+        else:
+            raise ValueError(
+                'Unknown variable "%s", specify engine using "<engine>.%s"' % (
+                    name, name))
+
+    return engine, name
+
+
+def legacy_get_config_value(cfg, *keys):
+    '''Original implementation of Windsurf.get_config_value'''
+
+    if len(keys) > 0:
+        if cfg.has_key(keys[0]):
+            cfg = legacy_get_config_value(cfg[keys[0]], *keys[1:])
+        else:
+            cfg = None
+
+    return cfg
+
+
+def legacy_exchange_data(self, config, engine):
+    '''Original implementation of Windsurf._exchange_data'''
+
+    exchange = legacy_get_config_value(config, 'exchange')
+    if exchange is not None:
+        for ex in exchange:
+            engine_to, var_to = legacy_split_var(self, ex['var_to'])
+            engine_from, var_from = legacy_split_var(self, ex['var_from'])
+            if engine_to == engine:
+
+                logger.debug('Exchange "%s" to "%s"' % (
+                    ex['var_from'],
+                    ex['var_to']))
+
+                try:
+                    val = self.models[engine_from]['_wrapper'].get_var(var_from)
+                except:
+                    logger.error('Failed to get "%s" from "%s"!' % (var_from, engine_from))
+                    logger.error(traceback.format_exc())
+
+                try:
+                    self.models[engine_to]['_wrapper'].set_var(var_to, val)
+                except:
+                    logger.error('Failed to set "%s" in "%s"!' % (var_to, engine_to))
+                    logger.error(traceback.format_exc())
+
+
+def create_model(n_exchange):
+    '''Create and initialize Windsurf model with dummy engines
+
+    Returns the model and the raw JSON configuration it was created
+    from.
+
+    '''
+
+    exchange = []
+    for i in range(n_exchange):
+        engine_from = ENGINES[i % len(ENGINES)]
+        engine_to = ENGINES[(i + 1) % len(ENGINES)]
+        exchange.append({'var_from' : '%s.var%d' % (engine_from, i),
+                         'var_to' : '%s.var%d' % (engine_to, i)})
+
+    config = {
+        'time' : {'start' : 0., 'stop' : 1.},
+        'models' : {e : {'engine' : '__main__.DummyEngine',
+                         'configfile' : ''} for e in ENGINES},
+        'exchange' : exchange,
+        'netcdf' : {'interval' : 1.}
+    }
+
+    fd, configfile = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(config, fp)
+    with open(configfile, 'r') as fp:
+        config = json.load(fp)
+
+    try:
+        model = Windsurf(configfile=configfile)
+        model.initialize()
+    finally:
+        os.remove(configfile)
+
+    return model, config
+
+
+def run(n_exchange=48, n_switch=10000):
+
+    model, config = create_model(n_exchange)
+
+    def switch_legacy():
+        for i in xrange(n_switch):
+            legacy_exchange_data(model, config, ENGINES[i % len(ENGINES)])
+
+    def switch_plan():
+        for i in xrange(n_switch):
+            model._exchange_data(ENGINES[i % len(ENGINES)])
+
+    t1 = min(timeit.repeat(switch_legacy, number=1, repeat=3)) / n_switch
+    t2 = min(timeit.repeat(switch_plan, number=1, repeat=3)) / n_switch
+
+    print 'exchange items    : %d' % n_exchange
+    print 'engine switches   : %d' % n_switch
+    print 'legacy per switch : %8.2f us' % (t1 * 1e6)
+    print 'plan per switch   : %8.2f us' % (t2 * 1e6)
+    print 'speedup           : %8.2fx' % (t1 / t2)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    run(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,130 @@
+'''Benchmark of storage settings for netCDF output
+
+Writes synthetic output of a 2D domain with multiple bed layers and
+sediment fractions using different storage settings and reports the
+file size, the write throughput and the time needed to read a map
+and a timeseries at a single location. Bed level and sediment mass
+are smooth fields with small-scale noise, such that compression
+ratios are representative for model output.
+
+Usage:
+
+.. code-block:: text
+
+   >>> python benchmarks/netcdf_output.py [ny] [nx] [n_steps]
+
+'''
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import numpy as np
+import netCDF4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from windsurf import netcdf
+
+
+SETTINGS = [
+    ('default', {}),
+    ('zlib', {'zlib' : True, 'complevel' : 4}),
+    ('zlib+shuffle', {'zlib' : True, 'complevel' : 4, 'shuffle' : True}),
+    ('zlib+shuffle+lsd=3', {'zlib' : True, 'complevel' : 4, 'shuffle' : True,
+                            'least_significant_digit' : 3}),
+    ('zlib+lsd=3 map', {'zlib' : True, 'complevel' : 4, 'shuffle' : True,
+                        'least_significant_digit' : 3, 'chunking' : 'map'}),
+    ('zlib+lsd=3 timeseries', {'zlib' : True, 'complevel' : 4, 'shuffle' : True,
+                               'least_significant_digit' : 3, 'chunking' : 'timeseries',
+                               'time_chunk' : 64}),
+]
+
+
+def create_dimensions(ny, nx, n_layers=3, n_fractions=5):
+    return {
+        'x' : np.arange(nx) * 1.,
+        'y' : np.arange(ny) * 1.,
+        'layers' : np.arange(n_layers),
+        'fractions' : np.arange(n_fractions),
+    }
+
+
+def create_output(dimensions, i, rng):
+    '''Create synthetic output for a single time step'''
+
+    ny, nx = len(dimensions['y']), len(dimensions['x'])
+    nl, nf = len(dimensions['layers']), len(dimensions['fractions'])
+
+    y, x = np.meshgrid(dimensions['y'], dimensions['x'], indexing='ij')
+    zb = -10. + 20. * x / nx + np.sin(y / 10. + i / 50.) + .01 * rng.randn(ny, nx)
+
+    mass = np.exp(-(zb[:,:,np.newaxis,np.newaxis] / 10.)**2) * \
+           np.linspace(1., 2., nl)[:,np.newaxis] * np.linspace(.1, 1., nf) + \
+           .001 * rng.rand(ny, nx, nl, nf)
+
+    return {'time' : i * 3600., 'zb' : zb, 'mass' : mass}
+
+
+def run_settings(path, dimensions, n_steps, settings):
+
+    ncfile = os.path.join(path, 'output.nc')
+    variables = {
+        'zb' : dict(settings, dimensions=(u'time', u'y', u'x')),
+        'mass' : dict(settings, dimensions=(u'time', u'y', u'x', u'layers', u'fractions')),
+    }
+
+    netcdf.initialize(ncfile, dimensions, variables=variables)
+
+    rng = np.random.RandomState(0)
+    steps = [create_output(dimensions, i, rng) for i in range(min(n_steps, 10))]
+    nbytes = sum([v.nbytes for k, v in steps[0].iteritems() if k != 'time']) / 2 # float32
+
+    t0 = time.time()
+    with netcdf.NetCDFWriter(ncfile, threaded=False, flush_interval=0) as writer:
+        for i in range(n_steps):
+            output = dict(steps[i % len(steps)], time=i * 3600.)
+            writer.write(i, output)
+    t_write = time.time() - t0
+
+    nc = netCDF4.Dataset(ncfile, 'r')
+    t0 = time.time()
+    nc.variables['mass'][n_steps // 2,...]
+    t_map = time.time() - t0
+    t0 = time.time()
+    nc.variables['mass'][:,len(dimensions['y']) // 2,len(dimensions['x']) // 2,...]
+    t_series = time.time() - t0
+    nc.close()
+
+    return {
+        'size' : os.path.getsize(ncfile) / 1e6,
+        'raw' : nbytes * n_steps / 1e6,
+        'throughput' : nbytes * n_steps / 1e6 / t_write,
+        'read_map' : t_map * 1e3,
+        'read_series' : t_series * 1e3,
+    }
+
+
+def run(ny=100, nx=400, n_steps=200):
+
+    dimensions = create_dimensions(ny, nx)
+
+    print '%-24s %10s %8s %12s %10s %12s' % ('settings', 'size (MB)', 'ratio', 'write (MB/s)',
+                                            'map (ms)', 'series (ms)')
+
+    path = tempfile.mkdtemp()
+    try:
+        for name, settings in SETTINGS:
+            r = run_settings(path, dimensions, n_steps, settings)
+            print '%-24s %10.1f %8.1f %12.1f %10.1f %12.1f' % (name, r['size'], r['raw'] / r['size'],
+                                                             r['throughput'], r['read_map'],
+                                                             r['read_series'])
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    run(*[int(x) for x in sys.argv[1:]])
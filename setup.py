@@ -10,6 +10,7 @@ setup(
     long_description=open('README.txt').read(),
     install_requires=[
         'numpy',
+        'scipy',
         'docopt',
     ],
     #setup_requires=[
@@ -22,6 +23,9 @@ setup(
     test_suite='nose.collector',
     entry_points={'console_scripts': [
         'windsurf = windsurf.console:windsurf',
+        'windsurf-engine = windsurf.console:windsurf_engine',
+        'windsurf-compress = windsurf.console:windsurf_compress',
+        'windsurf-sweep = windsurf.console:windsurf_sweep',
         'windsurf-setup = windsurf.console:windsurf_setup'
     ]},
 )
@@ -0,0 +1,141 @@
+import unittest
+
+from windsurf.config import WindsurfConfig
+
+
+def create_config(**netcdf):
+    '''Return minimal configuration with given output settings'''
+
+    return {
+        'time' : {'start' : 0., 'stop' : 3600.},
+        'models' : {'aeolis' : {'engine' : 'aeolis', 'configfile' : 'aeolis.txt'}},
+        'netcdf' : dict(outputvars=['aeolis.zb'], interval=60., **netcdf),
+    }
+
+
+class TestOutputConfig(unittest.TestCase):
+
+
+    def test_defaults(self):
+        config = WindsurfConfig(create_config())
+        self.assertEqual(config.output_queue, 4)
+        self.assertEqual(config.output_flush, 10)
+        self.assertTrue(config.output_background)
+
+
+    def test_background(self):
+        config = WindsurfConfig(create_config(background=False))
+        self.assertFalse(config.output_background)
+        for value in ['false', 0, 1]:
+            self.assertRaises(ValueError, WindsurfConfig, create_config(background=value))
+
+
+    def test_queue(self):
+        self.assertEqual(WindsurfConfig(create_config(queue=2)).output_queue, 2)
+        for value in [True, 0, 2.5, '2']:
+            self.assertRaises(ValueError, WindsurfConfig, create_config(queue=value))
+
+
+    def test_flush(self):
+        self.assertEqual(WindsurfConfig(create_config(flush=0)).output_flush, 0)
+        for value in [True, False, -1, 1.5]:
+            self.assertRaises(ValueError, WindsurfConfig, create_config(flush=value))
+
+
+class TestStorageConfig(unittest.TestCase):
+
+
+    def test_storage(self):
+        config = WindsurfConfig(create_config(
+            storage={'zlib' : True, 'complevel' : 4},
+            variables={'zb' : {'time_chunk' : 16, 'chunksizes' : [1, 10]}}))
+        storage = config.output_storage['aeolis.zb']
+        self.assertEqual(storage['complevel'], 4)
+        self.assertEqual(storage['time_chunk'], 16)
+        self.assertEqual(tuple(storage['chunksizes']), (1, 10))
+
+
+    def test_booleans(self):
+        for storage in [{'complevel' : True},
+                        {'least_significant_digit' : False},
+                        {'time_chunk' : True},
+                        {'chunksizes' : [True, 10]},
+                        {'zlib' : 1}]:
+            self.assertRaises(ValueError, WindsurfConfig, create_config(storage=storage))
+
+
+def create_coupling_config(coupling=None, regimes=None):
+    '''Return minimal configuration with two model engines'''
+
+    return {
+        'models' : {
+            'xbeach' : {'engine' : 'xbeach', 'configfile' : 'params.txt'},
+            'aeolis' : {'engine' : 'aeolis', 'configfile' : 'aeolis.txt'},
+        },
+        'coupling' : coupling or {},
+        'regimes' : regimes or {},
+    }
+
+
+class TestCouplingConfig(unittest.TestCase):
+
+
+    def test_workers(self):
+        self.assertEqual(WindsurfConfig(create_coupling_config()).workers, 2)
+        self.assertEqual(WindsurfConfig(create_coupling_config({'workers' : 3})).workers, 3)
+        for value in [True, -1, 1.5, '2']:
+            self.assertRaises(ValueError, WindsurfConfig, create_coupling_config({'workers' : value}))
+
+
+    def test_ratio(self):
+        config = WindsurfConfig(create_coupling_config({'scheduler' : 'ratio',
+                                                        'ratio' : {'xbeach' : 10}}))
+        self.assertEqual(config.ratio['xbeach'], 10)
+        for value in [10, {'xbeach' : 0}, {'xbeach' : 2.5}, {'xbeach' : True},
+                      {'xbeach' : '10'}, {'cdm' : 1}]:
+            self.assertRaises(ValueError, WindsurfConfig, create_coupling_config({'ratio' : value}))
+
+
+    def test_active(self):
+        config = WindsurfConfig(create_coupling_config(regimes={
+            'calm' : {'xbeach' : {'_active' : False}}}))
+        self.assertEqual(config.regime_engines['calm']['xbeach'][0], False)
+        self.assertEqual(config.regime_engines['calm']['aeolis'][0], True)
+        for value in ['false', 0, None]:
+            self.assertRaises(ValueError, WindsurfConfig, create_coupling_config(regimes={
+                'calm' : {'xbeach' : {'_active' : value}}}))
+
+
+    def test_no_active_engine(self):
+        self.assertRaises(ValueError, WindsurfConfig, create_coupling_config(regimes={
+            'calm' : {'xbeach' : {'_active' : False}, 'aeolis' : {'_active' : False}}}))
+
+
+class TestConfigAccess(unittest.TestCase):
+
+
+    def test_mapping(self):
+        config = WindsurfConfig(create_config())
+        self.assertEqual(config['netcdf']['interval'], 60.)
+        self.assertEqual(config['netcdf']['outputvars'], ('aeolis.zb',))
+        self.assertTrue('netcdf' in config)
+        self.assertFalse('regimes' in config)
+        self.assertEqual(sorted(config.keys()), sorted(config))
+        self.assertRaises(KeyError, lambda: config['regimes'])
+
+
+    def test_get(self):
+        config = WindsurfConfig(create_config())
+        self.assertEqual(config.get('netcdf', 'interval'), 60.)
+        self.assertEqual(config.get('netcdf')['interval'], 60.)
+        self.assertEqual(config.get('regimes'), None)
+
+
+    def test_immutable(self):
+        config = WindsurfConfig(create_config())
+        self.assertRaises(TypeError, config['netcdf'].__setitem__, 'interval', 1.)
+        self.assertRaises(TypeError, setattr, config, 'tout', 1.)
+
+        def assign():
+            config['netcdf'] = {}
+        self.assertRaises(TypeError, assign)
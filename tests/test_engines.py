@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+
+from windsurf import engines
+
+
+class PlainEngine:
+    '''Model engine without partial updates'''
+
+
+    def __init__(self):
+        self.zb = np.zeros((3,4))
+
+
+    def get_var(self, name):
+        return self.zb
+
+
+    def set_var(self, name, value):
+        self.zb = np.array(value)
+
+
+class UnsupportedEngine(PlainEngine):
+    '''Model engine that refuses partial updates like the BMI wrappers'''
+
+
+    def set_var_slice(self, name, start, count, value):
+        raise NotImplemented('set_var_slice is not implemented')
+
+
+    def set_var_index(self, name, index, value):
+        raise NotImplemented('set_var_index is not implemented')
+
+
+class TestPartialUpdates(unittest.TestCase):
+
+
+    def check(self, wrapper):
+        engines.set_var_slice(wrapper, 'zb', [1,1], [2,2], np.ones((2,2)))
+        engines.set_var_index(wrapper, 'zb', [0,3], [2.,3.])
+        expected = np.zeros((3,4))
+        expected[1:3,1:3] = 1.
+        expected.flat[[0,3]] = [2.,3.]
+        np.testing.assert_array_equal(wrapper.zb, expected)
+
+
+    def test_missing_methods(self):
+        self.check(PlainEngine())
+
+
+    def test_not_implemented(self):
+        self.check(UnsupportedEngine())
+
+
+    def test_missing_symbols(self):
+        self.check(MissingSymbolEngine())
+
+
+class MissingSymbolEngine(PlainEngine):
+    '''Model engine library that does not export partial updates'''
+
+
+    def __getattr__(self, name):
+        if name in ['set_var_slice', 'set_var_index']:
+            return self._missing
+        raise AttributeError(name)
+
+
+    def _missing(self, *args):
+        # ctypes raises AttributeError for symbols that are not exported
+        raise AttributeError('undefined symbol: %s' % args[0])
\ No newline at end of file
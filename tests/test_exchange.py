@@ -0,0 +1,513 @@
+import os
+import json
+import ctypes
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from windsurf.model import Windsurf, WindsurfWrapper
+
+
+class Engine:
+    '''Minimal Python model engine with a fixed time step'''
+
+    dt = 1.
+
+
+    def __init__(self, configfile=''):
+        self.t = 0.
+        self.vars = {
+            'zb' : np.zeros((4,5)),
+            'n' : np.zeros(3, dtype=np.int32),
+        }
+        self.calls = []
+        self.fail = 0 # number of set calls that fail
+
+
+    def initialize(self):
+        pass
+
+
+    def update(self, dt=-1):
+        self.t += self.dt if dt < 0 else dt
+        self.step()
+
+
+    def step(self):
+        pass
+
+
+    def finalize(self):
+        pass
+
+
+    def get_current_time(self):
+        return self.t
+
+
+    def get_var(self, name):
+        return self.vars[name]
+
+
+    def set_var(self, name, value):
+        self._check_fail()
+        self.calls.append(('set_var', name))
+        self.vars[name] = np.array(value, dtype=self.vars[name].dtype)
+
+
+    def _check_fail(self):
+        if self.fail > 0:
+            self.fail -= 1
+            raise IOError('Failed to set variable')
+
+
+class Source(Engine):
+    '''Model engine that raises the bed level every time step'''
+
+
+    def step(self):
+        self.vars['zb'] = self.vars['zb'] + 1.
+
+
+class Clock(Engine):
+    '''Model engine that exposes its time as variable'''
+
+
+    def get_var(self, name):
+        if name == 't':
+            return np.asarray(self.t)
+        return Engine.get_var(self, name)
+
+
+    def set_var(self, name, value):
+        if name == 't':
+            self.t = float(value)
+        else:
+            Engine.set_var(self, name, value)
+
+
+class SliceTarget(Engine):
+    '''Model engine that reads slices from raw memory like a library'''
+
+
+    def __init__(self, configfile=''):
+        Engine.__init__(self, configfile)
+        self.vars['zb'] = np.zeros((4,5), dtype=np.float32)
+
+
+    def set_var_slice(self, name, start, count, value):
+        self._check_fail()
+        self.calls.append(('set_var_slice', name))
+        arr = self.vars[name]
+        ptr = value.ctypes.data_as(ctypes.POINTER(np.ctypeslib.as_ctypes_type(arr.dtype)))
+        data = np.ctypeslib.as_array(ptr, shape=(int(np.prod(count)),))
+        arr[tuple([slice(i, i+n) for i, n in zip(start, count)])] = data.reshape(count)
+
+
+class Grid(Source):
+    '''Model engine with a rectilinear grid'''
+
+
+    def __init__(self, configfile=''):
+        Source.__init__(self, configfile)
+        self.vars['x'], self.vars['y'] = np.meshgrid(np.arange(5.), np.arange(4.))
+
+
+class StaggeredGrid(Engine):
+    '''Model engine with a grid staggered with respect to Grid'''
+
+
+    def __init__(self, configfile=''):
+        Engine.__init__(self, configfile)
+        self.vars['x'], self.vars['y'] = np.meshgrid(np.arange(.5, 4.), np.arange(.5, 3.))
+        self.vars['zb'] = np.zeros((3,4))
+
+
+class WindsurfTestCase(unittest.TestCase):
+    '''Base class for tests that couple the model engines above'''
+
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tempdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tempdir)
+
+
+    def create_model(self, exchange=(), source='Source', target='Engine', **cfg):
+        '''Initialize Windsurf with a source and a target model engine'''
+
+        config = {
+            'time' : {'start' : 0., 'stop' : 100.},
+            'models' : {
+                'src' : {'engine' : '%s.%s' % (__name__, source), 'configfile' : ''},
+                'dst' : {'engine' : '%s.%s' % (__name__, target), 'configfile' : ''},
+            },
+            'exchange' : list(exchange),
+        }
+        config.update(cfg)
+
+        configfile = os.path.join(self.tempdir, 'windsurf.json')
+        with open(configfile, 'w') as fp:
+            json.dump(config, fp)
+
+        model = Windsurf(configfile)
+        model.initialize()
+        self.src = model.models['src']['_wrapper']
+        self.dst = model.models['dst']['_wrapper']
+        return model
+
+
+class TestRegion(WindsurfTestCase):
+
+
+    def test_fixed_region_strided(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'region' : {'start' : [1,2], 'count' : [2,3]},
+        }], target='SliceTarget')
+
+        self.src.vars['zb'] = np.arange(20.).reshape((4,5))
+        model._exchange_data('dst')
+
+        expected = np.zeros((4,5), dtype=np.float32)
+        expected[1:3,2:5] = self.src.vars['zb'][1:3,2:5]
+        self.assertEqual(self.dst.calls, [('set_var_slice', 'zb')])
+        self.assertEqual(self.dst.vars['zb'].dtype, np.float32)
+        np.testing.assert_array_equal(self.dst.vars['zb'], expected)
+
+
+    def test_changed_region(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'region' : 'changed',
+        }], target='SliceTarget')
+
+        model._exchange_data('dst')
+        self.src.vars['zb'][2,1:3] = 5.
+        model._exchange_data('dst')
+        model._exchange_data('dst')
+
+        self.assertEqual(self.dst.calls, [('set_var', 'zb'), ('set_var_slice', 'zb')])
+        np.testing.assert_array_equal(self.dst.vars['zb'], self.src.vars['zb'])
+
+
+    def test_changed_region_retry(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'region' : 'changed',
+        }], target='SliceTarget')
+
+        # first full write fails
+        self.dst.fail = 1
+        model._exchange_data('dst')
+        model._exchange_data('dst')
+        self.assertEqual(self.dst.calls, [('set_var', 'zb')])
+
+        # region write fails
+        model._exchange_data('dst')
+        self.src.vars['zb'][3,4] = 13.
+        self.dst.fail = 1
+        model._exchange_data('dst')
+        self.assertEqual(self.dst.vars['zb'][3,4], 0.)
+
+        model._exchange_data('dst')
+        self.assertEqual(self.dst.vars['zb'][3,4], 13.)
+
+
+class TestEngineActivity(WindsurfTestCase):
+
+
+    def test_reactivate(self):
+        model = self.create_model(target='Clock', models={
+            'src' : {'engine' : '%s.Source' % __name__, 'configfile' : ''},
+            'dst' : {'engine' : '%s.Clock' % __name__, 'configfile' : '', 'time_var' : 't'},
+        })
+
+        model.set_engine_active('dst', active=False)
+        for i in range(5):
+            model.update()
+        self.assertEqual(self.dst.t, 0.)
+        self.assertEqual(model.models['dst']['_time'], self.src.t)
+
+        model.set_engine_active('dst', active=True)
+        self.assertEqual(self.dst.t, self.src.t)
+        self.assertEqual(model.models['dst']['_offset'], 0.)
+
+        model.update()
+        self.assertEqual(self.dst.t, self.src.t)
+
+
+    def test_reactivate_without_time_var(self):
+        model = self.create_model()
+        model.set_engine_active('dst', active=False)
+        model.update()
+        self.assertRaises(RuntimeError, model.set_engine_active, 'dst', active=True)
+
+
+    def test_scenario_without_time_var(self):
+        self.assertRaises(ValueError, self.create_model,
+                          regimes={'calm' : {'dst' : {'_active' : False}},
+                                   'storm' : {}},
+                          scenario=[[0., 'storm'], [10., 'calm'], [20., 'storm']])
+
+
+class TestMorfac(WindsurfTestCase):
+
+
+    def test_float32(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'morfac' : True,
+        }], target='SliceTarget', coupling={'morfac' : 10.})
+
+        model._exchange_data('dst')
+        self.src.vars['zb'] = self.src.vars['zb'] + .5
+        model._exchange_data('dst')
+
+        link = model._exchange_plan['dst'][0]
+        value = model._accelerate_change(link, self.src.vars['zb'] + .5)
+        self.assertEqual(value.dtype, np.float32)
+        self.assertEqual(self.dst.vars['zb'].dtype, np.float32)
+        np.testing.assert_array_equal(self.dst.vars['zb'], 5.)
+        np.testing.assert_array_equal(value, 10.)
+
+
+    def test_scaled_change(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'morfac' : True,
+        }])
+
+        model._exchange_data('dst')
+        self.src.vars['zb'] = self.src.vars['zb'] + 1.
+        model._exchange_data('dst')
+        np.testing.assert_array_equal(self.dst.vars['zb'], 1.)
+
+        model.set_morfac(3.)
+        self.src.vars['zb'] = self.src.vars['zb'] + 1.
+        model._exchange_data('dst')
+        np.testing.assert_array_equal(self.dst.vars['zb'], 4.)
+
+
+class TestInterval(WindsurfTestCase):
+
+
+    def test_interval(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'interval' : 3.,
+        }])
+
+        for t in range(7):
+            model.models['dst']['_time'] = float(t)
+            model._exchange_data('dst')
+
+        self.assertEqual(len(self.dst.calls), 3) # t = 0, 3 and 6
+
+
+    def test_retry(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'interval' : 3.,
+        }])
+
+        self.dst.fail = 1
+        model._exchange_data('dst')
+        model.models['dst']['_time'] = 1.
+        model._exchange_data('dst')
+        self.assertEqual(self.dst.calls, [('set_var', 'zb')])
+
+
+class TestSkipUnchanged(WindsurfTestCase):
+
+
+    def check(self, skip_unchanged):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'skip_unchanged' : skip_unchanged,
+        }])
+
+        model._exchange_data('dst')
+        model._exchange_data('dst')
+        self.assertEqual(len(self.dst.calls), 1)
+        self.assertEqual(model.exchange_stats['bytes_skipped'], self.src.vars['zb'].nbytes)
+
+        self.src.vars['zb'][1,1] = 1.
+        model._exchange_data('dst')
+        self.assertEqual(len(self.dst.calls), 2)
+        np.testing.assert_array_equal(self.dst.vars['zb'], self.src.vars['zb'])
+
+
+    def test_compare(self):
+        self.check('compare')
+
+
+    def test_hash(self):
+        self.check('hash')
+
+
+    def test_failed_exchange(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'skip_unchanged' : True,
+        }])
+
+        self.dst.fail = 1
+        model._exchange_data('dst')
+        model._exchange_data('dst')
+        self.assertEqual(len(self.dst.calls), 1)
+
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.create_model, [{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'skip_unchanged' : 'checksum',
+        }])
+
+
+class TestInterpolate(WindsurfTestCase):
+
+
+    def exchange(self, model, t_from, t_to):
+        model.models['src']['_time'] = t_from
+        model.models['dst']['_time'] = t_to
+        model._exchange_data('dst')
+
+
+    def test_extrapolate(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'interpolate' : True,
+        }], target='SliceTarget')
+
+        self.exchange(model, 0., 0.)
+        np.testing.assert_array_equal(self.dst.vars['zb'], 0.)
+
+        self.src.vars['zb'] = self.src.vars['zb'] + 2.
+        self.exchange(model, 2., 1.)
+        np.testing.assert_array_equal(self.dst.vars['zb'], 1.)
+
+        self.exchange(model, 2., 3.)
+        np.testing.assert_array_equal(self.dst.vars['zb'], 3.)
+        self.assertEqual(self.dst.vars['zb'].dtype, np.float32)
+
+
+    def test_integer(self):
+        model = self.create_model([{
+            'var_from' : 'src.n',
+            'var_to' : 'dst.n',
+            'interpolate' : True,
+        }])
+
+        self.exchange(model, 0., 0.)
+        self.src.vars['n'] = np.array([1, 2, 3], dtype=np.int32)
+        self.exchange(model, 2., 1.)
+
+        np.testing.assert_array_equal(self.dst.vars['n'], [1, 2, 3])
+        self.assertEqual(self.dst.vars['n'].dtype, np.int32)
+
+
+class TestRegrid(WindsurfTestCase):
+
+
+    def test_linear(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'regrid' : 'linear',
+        }], source='Grid', target='StaggeredGrid')
+
+        self.src.vars['zb'] = self.src.vars['x'] + 10. * self.src.vars['y']
+        model._exchange_data('dst')
+
+        np.testing.assert_allclose(self.dst.vars['zb'],
+                                   self.dst.vars['x'] + 10. * self.dst.vars['y'])
+
+
+    def test_coordinates(self):
+        model = self.create_model([{
+            'var_from' : 'src.zb',
+            'var_to' : 'dst.zb',
+            'regrid' : {'method' : 'nearest', 'x_from' : 'src.y', 'y_from' : 'src.x',
+                        'x_to' : 'dst.y', 'y_to' : 'dst.x'},
+        }], source='Grid', target='StaggeredGrid')
+
+        link = model._exchange_plan['dst'][0]
+        self.assertEqual(link['regrid'].method, 'nearest')
+        self.assertFalse(link['shared'])
+
+
+class TestRegimes(WindsurfTestCase):
+
+
+    def create_wrapper(self, **cfg):
+        model = self.create_model(**cfg)
+        wrapper = WindsurfWrapper()
+        wrapper.engine = model
+        wrapper._compile_scenario()
+        return wrapper
+
+
+    def set_regime(self, wrapper, t):
+        wrapper.t = t
+        wrapper.set_regime()
+
+
+    def test_scenario(self):
+        wrapper = self.create_wrapper(
+            regimes={'calm' : {'dst' : {'n' : [1, 1, 1], 'zb' : 1.}},
+                     'storm' : {'dst' : {'n' : [2, 2, 2], 'zb' : 1.},
+                                'src' : {'_active' : False},
+                                '_morfac' : 5.}},
+            scenario=[[10., 'storm'], [0., 'calm']])
+
+        self.set_regime(wrapper, 0.)
+        self.assertEqual(wrapper.regime, 'calm')
+        self.assertEqual(self.dst.calls, [('set_var', 'n'), ('set_var', 'zb')])
+        np.testing.assert_array_equal(self.dst.vars['n'], [1, 1, 1])
+        self.assertEqual(wrapper.engine.morfac, 1.)
+
+        self.set_regime(wrapper, 5.)
+        self.assertEqual(len(self.dst.calls), 2)
+
+        # only parameters that differ from the previous regime are set
+        self.set_regime(wrapper, 10.)
+        self.assertEqual(wrapper.regime, 'storm')
+        self.assertEqual(self.dst.calls[2:], [('set_var', 'n')])
+        np.testing.assert_array_equal(self.dst.vars['n'], [2, 2, 2])
+        self.assertEqual(wrapper.engine.morfac, 5.)
+        self.assertFalse(wrapper.engine.models['src']['_active'])
+        self.assertTrue(wrapper.engine.models['dst']['_active'])
+
+
+    def test_without_scenario(self):
+        wrapper = self.create_wrapper(regimes={'calm' : {'dst' : {'n' : [1, 1, 1]}}})
+        self.set_regime(wrapper, 0.)
+        self.assertEqual(wrapper.regime, None)
+        self.assertEqual(self.dst.calls, [])
+
+
+    def test_before_scenario(self):
+        wrapper = self.create_wrapper(regimes={'calm' : {}}, scenario=[[10., 'calm']])
+        self.assertRaises(ValueError, self.set_regime, wrapper, 0.)
+
+
+    def test_unknown_regime(self):
+        self.assertRaises(ValueError, self.create_model,
+                          regimes={'calm' : {}}, scenario=[[0., 'storm']])
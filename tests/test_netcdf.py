@@ -0,0 +1,121 @@
+import os
+import shutil
+import netCDF4
+import tempfile
+import unittest
+import threading
+import numpy as np
+
+from windsurf.netcdf import NetCDFWriter
+
+
+class BlockingWriter(NetCDFWriter):
+    '''Writer that waits for a signal before writing each snapshot'''
+
+
+    def __init__(self, *args, **kwargs):
+        NetCDFWriter.__init__(self, *args, **kwargs)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+
+    def _process(self, task):
+        self.started.set()
+        self.release.wait()
+        NetCDFWriter._process(self, task)
+
+
+class TestNetCDFWriter(unittest.TestCase):
+
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.ncfile = os.path.join(self.tempdir, 'windsurf.nc')
+        with netCDF4.Dataset(self.ncfile, 'w') as nc:
+            nc.createDimension('time', None)
+            nc.createDimension('nv', 2)
+            nc.createDimension('x', 5)
+            nc.createVariable('time', 'f8', ('time',))
+            nc.createVariable('time_bounds', 'f8', ('time', 'nv'))
+            nc.createVariable('zb', 'f8', ('time', 'x'))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+
+    def test_write(self):
+        zb = np.zeros(5)
+        with NetCDFWriter(self.ncfile) as writer:
+            for i in range(3):
+                zb[:] = i
+                writer.write(i, {'time' : float(i), 'zb' : zb})
+        with netCDF4.Dataset(self.ncfile) as nc:
+            np.testing.assert_array_equal(nc.variables['time'][:], [0., 1., 2.])
+            np.testing.assert_array_equal(nc.variables['zb'][:,0], [0., 1., 2.])
+
+
+    def test_back_pressure(self):
+        writer = BlockingWriter(self.ncfile, queue_size=2)
+        writer.open()
+
+        submitted = []
+        def submit():
+            for i in range(5):
+                writer.write(i, {'time' : float(i), 'zb' : np.zeros(5) + i})
+                submitted.append(i)
+
+        thread = threading.Thread(target=submit)
+        thread.daemon = True
+        thread.start()
+
+        # one snapshot is being written and two are queued, the
+        # fourth write waits for room in the queue
+        self.assertTrue(writer.started.wait(10.))
+        thread.join(.5)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(len(submitted), 3)
+
+        writer.release.set()
+        thread.join(10.)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(submitted), 5)
+        writer.close()
+
+        with netCDF4.Dataset(self.ncfile) as nc:
+            np.testing.assert_array_equal(nc.variables['zb'][:,0], range(5))
+
+
+    def test_buffer_reuse(self):
+        zb = np.zeros(5)
+        with NetCDFWriter(self.ncfile, queue_size=2) as writer:
+            for i in range(10):
+                zb[:] = i
+                writer.write(i, {'time' : float(i), 'zb' : zb})
+            self.assertTrue(1 <= writer._nbuffers <= 3)
+        with netCDF4.Dataset(self.ncfile) as nc:
+            np.testing.assert_array_equal(nc.variables['zb'][:,:], np.repeat(np.arange(10.), 5).reshape((10,5)))
+
+
+    def test_error(self):
+        writer = NetCDFWriter(self.ncfile)
+        writer.open()
+        writer.write(0, {'time' : 0., 'zb' : np.zeros(5)})
+        writer.write(1, {'time' : 1., 'unknown' : np.zeros(5)})
+        self.assertRaises(KeyError, writer.flush)
+
+        # the error is raised once, the writer stays usable
+        writer.write(2, {'time' : 2., 'zb' : np.ones(5)})
+        writer.close()
+        self.assertRaises(IOError, writer.write, 3, {'time' : 3.})
+
+        with netCDF4.Dataset(self.ncfile) as nc:
+            np.testing.assert_array_equal(nc.variables['zb'][[0,2],0], [0., 1.])
+
+
+    def test_error_on_close(self):
+        writer = NetCDFWriter(self.ncfile)
+        writer.open()
+        writer.write(0, {'time' : 0., 'unknown' : np.zeros(5)})
+        self.assertRaises(KeyError, writer.close)
+        self.assertRaises(IOError, writer.write, 1, {'time' : 1.})
@@ -0,0 +1,134 @@
+import socket
+import unittest
+import numpy as np
+from multiprocessing import Process
+
+from windsurf import remote
+
+
+class DummyEngine:
+    '''Minimal Python model engine that stores the arrays it is given'''
+
+
+    def __init__(self, configfile=''):
+        self.t = 0.
+        self.vars = {
+            'zb' : np.arange(12.).reshape((3,4)),
+            'n' : np.array(3, dtype=np.int32),
+        }
+
+
+    def initialize(self):
+        pass
+
+
+    def update(self, dt=-1):
+        self.t += dt
+        self.vars['zb'] = self.vars['zb'] + dt
+
+
+    def finalize(self):
+        pass
+
+
+    def get_current_time(self):
+        return self.t
+
+
+    def get_var(self, name):
+        return self.vars[name]
+
+
+    def set_var(self, name, value):
+        self.vars[name] = np.array(value)
+
+
+def get_free_port():
+    '''Return port number that is free on localhost'''
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestRemoteEngine(unittest.TestCase):
+
+
+    def setUp(self):
+        address = 'tcp://127.0.0.1:%d' % get_free_port()
+        self.server = Process(target=remote.serve,
+                              args=(address, '%s.DummyEngine' % __name__))
+        self.server.daemon = True
+        self.server.start()
+        self.engine = remote.RemoteEngine(address, name='dummy', timeout=10.)
+        self.engine.initialize()
+
+
+    def tearDown(self):
+        try:
+            self.engine.finalize()
+        finally:
+            self.server.join(10.)
+            if self.server.is_alive():
+                self.server.terminate()
+
+
+    def test_get_var(self):
+        zb = self.engine.get_var('zb')
+        self.assertEqual(zb.dtype, np.float64)
+        np.testing.assert_array_equal(zb, np.arange(12.).reshape((3,4)))
+
+
+    def test_set_var(self):
+        value = np.linspace(0., 1., 12).reshape((3,4))
+        self.engine.set_var('zb', value)
+        np.testing.assert_array_equal(self.engine.get_var('zb'), value)
+
+
+    def test_set_var_noncontiguous(self):
+        value = np.arange(40.).reshape((5,8))[::2,1::2]
+        self.assertFalse(value.flags['C_CONTIGUOUS'])
+        self.engine.set_var('zb', value)
+        zb = self.engine.get_var('zb')
+        self.assertEqual(zb.shape, (3,4))
+        np.testing.assert_array_equal(zb, value)
+
+
+    def test_set_var_zero_dimensional(self):
+        self.engine.set_var('n', np.array(7, dtype=np.int32))
+        n = self.engine.get_var('n')
+        self.assertEqual(n.shape, ())
+        self.assertEqual(n.dtype, np.int32)
+        self.assertEqual(n, 7)
+
+
+    def test_get_vars(self):
+        zb, n = self.engine.get_vars(['zb', 'n'])
+        np.testing.assert_array_equal(zb, np.arange(12.).reshape((3,4)))
+        self.assertEqual(n.shape, ())
+        self.assertEqual(n, 3)
+
+
+    def test_set_vars(self):
+        zb = np.ones((4,3)).T
+        n = np.array(-1, dtype=np.int32)
+        self.engine.set_vars(['zb', 'n'], [zb, n])
+        values = self.engine.get_vars(['zb', 'n'])
+        np.testing.assert_array_equal(values[0], zb)
+        self.assertEqual(values[1], -1)
+        self.assertEqual(values[1].dtype, np.int32)
+
+
+    def test_update(self):
+        self.engine.update(2.5)
+        self.assertEqual(self.engine.get_current_time(), 2.5)
+        np.testing.assert_array_equal(self.engine.get_var('zb'),
+                                      np.arange(12.).reshape((3,4)) + 2.5)
+
+
+    def test_error(self):
+        self.assertRaises(RuntimeError, self.engine.get_var, 'unknown')
+        np.testing.assert_array_equal(self.engine.get_var('zb'),
+                                      np.arange(12.).reshape((3,4)))
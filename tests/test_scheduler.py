@@ -0,0 +1,91 @@
+import unittest
+
+from windsurf import scheduler
+
+
+def run(s, dt, times=None):
+    '''Run a single update and return the order of stepped model engines'''
+
+    s.start(times or {e:0. for e in s.engines})
+    steps = []
+    while not s.done():
+        if len(steps) > 100:
+            raise AssertionError('Scheduler does not finish: %s' % steps)
+        engine = s.next()
+        steps.append(engine)
+        s.advance(engine, s.times[engine] + dt[engine])
+    return steps
+
+
+class TestMaxLagScheduler(unittest.TestCase):
+
+
+    def test_order(self):
+        s = scheduler.create_scheduler('maxlag', ['a', 'b', 'c'])
+        self.assertEqual(run(s, {'a' : 1., 'b' : 2., 'c' : 3.}),
+                         ['a', 'b', 'c', 'a', 'a', 'b'])
+        self.assertEqual(s.target_time, 3.)
+
+
+    def test_lagging_engine(self):
+        s = scheduler.create_scheduler('maxlag', ['a', 'b'])
+        self.assertEqual(run(s, {'a' : 1., 'b' : 1.}, {'a' : 5., 'b' : 2.}),
+                         ['b', 'b', 'b', 'a', 'b'])
+        self.assertEqual(s.times, {'a' : 6., 'b' : 6.})
+
+
+    def test_next_group(self):
+        s = scheduler.create_scheduler('maxlag', ['a', 'b', 'c'])
+        s.start({'a' : 1., 'b' : 0., 'c' : 0.})
+        self.assertEqual(s.next_group(), ['b', 'c'])
+        s.advance('b', 2.)
+        self.assertEqual(s.next_group(), ['c'])
+
+
+class TestRoundRobinScheduler(unittest.TestCase):
+
+
+    def test_order(self):
+        s = scheduler.create_scheduler('roundrobin', ['a', 'b', 'c'])
+        self.assertEqual(run(s, {'a' : 1., 'b' : 2., 'c' : 3.}),
+                         ['a', 'b', 'c', 'a', 'b', 'a'])
+
+
+    def test_skip_finished(self):
+        s = scheduler.create_scheduler('roundrobin', ['a', 'b'])
+        self.assertEqual(run(s, {'a' : 1., 'b' : 4.}),
+                         ['a', 'b', 'a', 'a', 'a'])
+
+
+class TestFixedRatioScheduler(unittest.TestCase):
+
+
+    def test_ratio(self):
+        s = scheduler.create_scheduler('ratio', ['a', 'b'], ratio={'a' : 3})
+        self.assertEqual(s.ratio, {'a' : 3, 'b' : 1})
+        self.assertEqual(run(s, {'a' : 1., 'b' : 3.}),
+                         ['a', 'b', 'a', 'a'])
+
+
+    def test_ignore_target_time(self):
+        s = scheduler.create_scheduler('ratio', ['a', 'b'], ratio={'a' : 2, 'b' : 2})
+        self.assertEqual(run(s, {'a' : 1., 'b' : 5.}),
+                         ['a', 'b', 'a', 'b'])
+        self.assertEqual(s.times, {'a' : 2., 'b' : 10.})
+
+
+    def test_default_ratio(self):
+        s = scheduler.create_scheduler('ratio', ['a', 'b'])
+        self.assertEqual(run(s, {'a' : 1., 'b' : 2.}), ['a', 'b'])
+
+
+class TestCreateScheduler(unittest.TestCase):
+
+
+    def test_policies(self):
+        for policy, cls in scheduler.SCHEDULERS.iteritems():
+            self.assertIsInstance(scheduler.create_scheduler(policy, ['a']), cls)
+
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, scheduler.create_scheduler, 'fastest', ['a'])
@@ -0,0 +1,335 @@
+'''Scenario time compression
+
+Compresses long forcing records into a shorter representative
+scenario. Storms are detected with
+:func:`~windsurf.configurator.WindsurfScenario.add_condition` and kept
+at their original resolution. Calm stretches in between are
+compressed by a fixed factor: each step of the compressed forcing
+represents a number of steps of the original forcing, averaged such
+that wave energy and wind-driven transport are retained. The
+compressed calm stretches are meant to be run with a morphological
+acceleration factor equal to the compression factor, see
+:func:`~windsurf.model.Windsurf.set_morfac`.
+
+'''
+
+import os
+import json
+import logging
+import numpy as np
+
+from configurator import WindsurfScenario
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+# forcing file formats: time column, duration column and aggregation
+# method per column (default: mean)
+FORCING_FORMATS = {
+    'wind' : {'time' : 0, 'duration' : None, 'methods' : {1 : 'cube', 2 : 'angle'}},
+    'tide' : {'time' : 0, 'duration' : None, 'methods' : {}},
+    'waves' : {'time' : None, 'duration' : 5, 'methods' : {0 : 'rms', 2 : 'angle'}},
+}
+
+
+class ScenarioCompressor:
+    '''Compressor of forcing records and scenario
+
+    Examples
+    --------
+    >>> scenario = WindsurfScenario(time=t)
+    >>> scenario.add_regime('calm')
+    >>> scenario.add_regime('storm')
+    >>> scenario.add_condition(t, hs, threshold=2.)
+    >>> compressor = ScenarioCompressor(scenario, factor=10.)
+    >>> waves = compressor.compress_forcing(np.loadtxt('jons_table.txt'), 'waves')
+    >>> compressor.render_scenario()
+
+    '''
+
+
+    def __init__(self, scenario, factor=10., calm=None):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        scenario : WindsurfScenario
+            scenario with regimes and conditions
+        factor : float
+            compression factor for calm stretches
+        calm : list, optional
+            names of regimes that are compressed (default: first
+            regime of the scenario)
+
+        '''
+
+        if factor < 1.:
+            raise ValueError('Compression factor must be at least 1, got %s' % factor)
+
+        self.scenario = scenario
+        self.factor = float(factor)
+        self.calm = calm or scenario.regimes_order[:1]
+
+        self.t = np.asarray(scenario.t, dtype=float)
+        self.is_calm = np.in1d(scenario.get_codes(),
+                               [i for i, regime in enumerate(scenario.regimes_order)
+                                if regime in self.calm])
+
+        self.tc = compress_time(self.t, self.is_calm, self.factor)
+        self.stats = {}
+
+
+    def get_compressed_time(self, t):
+        '''Map original time to compressed time'''
+        return np.interp(t, self.t, self.tc)
+
+
+    def get_original_time(self, tc):
+        '''Map compressed time to original time'''
+        return np.interp(tc, self.tc, self.t)
+
+
+    def get_morfac(self, tc):
+        '''Return morphological acceleration factor at compressed time'''
+        calm = np.interp(self.get_original_time(tc), self.t, self.is_calm.astype(float)) >= .5
+        return np.where(calm, self.factor, 1.)
+
+
+    def compress_forcing(self, data, kind, step=None):
+        '''Compress forcing record
+
+        Storms keep their original values. Calm stretches are
+        averaged over the original time span represented by each
+        compressed step.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            forcing record, like the contents of ``wind.txt``,
+            ``tide.txt`` or ``jons_table.txt``
+        kind : str
+            forcing type, see :data:`FORCING_FORMATS`
+        step : float, optional
+            time step of compressed record (default: median time step
+            of original record)
+
+        Returns
+        -------
+        numpy.ndarray
+            compressed forcing record
+
+        '''
+
+        fmt = FORCING_FORMATS[kind]
+        data = np.atleast_2d(np.asarray(data, dtype=float))
+
+        if fmt['time'] is not None:
+            t = data[:,fmt['time']]
+        else:
+            t = self.t[0] + np.cumsum(data[:,fmt['duration']]) - data[:,fmt['duration']]
+
+        if step is None:
+            step = np.median(np.diff(t)) if len(t) > 1 else self.t[1] - self.t[0]
+
+        tc0 = self.get_compressed_time(t[0])
+        tc1 = self.get_compressed_time(t[-1])
+        tc = np.arange(tc0, tc1 + step / 2., step)
+
+        # time spans in original record represented by compressed steps
+        edges = self.get_original_time(np.concatenate(([tc[0]], tc[:-1] + step / 2., [tc[-1]])))
+        centers = self.get_original_time(tc)
+        average = np.diff(edges) > step * (1. + 1e-6)
+
+        result = np.zeros((len(tc), data.shape[1]))
+        for j in range(data.shape[1]):
+            if j == fmt['time']:
+                result[:,j] = tc
+            elif j == fmt['duration']:
+                result[:,j] = step
+            else:
+                method = fmt['methods'].get(j, 'mean')
+                result[:,j] = np.where(average,
+                                       aggregate(t, data[:,j], edges, method=method),
+                                       interpolate(t, data[:,j], centers, method=method))
+
+        # statistics of retained forcing
+        if kind == 'waves':
+            self._update_stats('wave_energy', data[:,0]**2 * data[:,fmt['duration']],
+                               result[:,0]**2 * step * self.get_morfac(tc))
+        elif kind == 'wind':
+            self._update_stats('wind_transport', data[:,1]**3 * np.gradient(t),
+                               result[:,1]**3 * step * self.get_morfac(tc))
+
+        logger.info('Compressed %s record from %d to %d rows' % (kind, len(data), len(result)))
+
+        return result
+
+
+    def render_scenario(self):
+        '''Return scenario in compressed time
+
+        Returns
+        -------
+        list
+            regime switches in compressed time
+
+        '''
+
+        return [(float(self.get_compressed_time(t)), regime)
+                for t, regime in self.scenario.render_scenario()]
+
+
+    def render_regimes(self):
+        '''Return regime settings for compressed regimes'''
+        return {regime : {'_morfac' : self.factor} for regime in self.calm}
+
+
+    def get_report(self):
+        '''Return report on compression
+
+        Returns
+        -------
+        dict
+            original and compressed duration, reduction factor,
+            fraction of time in storms and retained wave energy and
+            wind transport (if compressed)
+
+        '''
+
+        report = {
+            'duration_original' : self.t[-1] - self.t[0],
+            'duration_compressed' : self.tc[-1] - self.tc[0],
+            'storm_fraction' : np.mean(~self.is_calm),
+        }
+        report['reduction_factor'] = report['duration_original'] / report['duration_compressed']
+
+        for key, (original, compressed) in self.stats.iteritems():
+            report['%s_retained' % key] = compressed / original if original > 0. else np.nan
+
+        return report
+
+
+    def write(self, path, forcing, step=None):
+        '''Write compressed forcing files and scenario
+
+        Writes a compressed copy of each forcing file and a
+        ``scenario.json`` file with the scenario and regime settings
+        in compressed time.
+
+        Parameters
+        ----------
+        path : str
+            output directory
+        forcing : dict
+            paths to forcing files by forcing type, see
+            :data:`FORCING_FORMATS`
+        step : float, optional
+            time step of compressed records
+
+        Returns
+        -------
+        dict
+            report on compression, see
+            :func:`~windsurf.compression.ScenarioCompressor.get_report`
+
+        '''
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        for kind, fname in sorted(forcing.iteritems()):
+            data = self.compress_forcing(np.loadtxt(fname), kind, step=step)
+            np.savetxt(os.path.join(path, os.path.split(fname)[1]), data, fmt='%f')
+
+        with open(os.path.join(path, 'scenario.json'), 'w') as fp:
+            json.dump({
+                'time' : {'start' : self.tc[0], 'stop' : self.tc[-1]},
+                'regimes' : self.render_regimes(),
+                'scenario' : self.render_scenario(),
+            }, fp, indent=4)
+
+        return self.get_report()
+
+
+    def _update_stats(self, key, original, compressed):
+        self.stats[key] = (np.sum(original), np.sum(compressed))
+
+
+def compress_time(t, calm, factor):
+    '''Compute compressed time axis
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        original time axis
+    calm : numpy.ndarray
+        boolean array indicating calm samples
+    factor : float
+        compression factor for calm samples
+
+    Returns
+    -------
+    numpy.ndarray
+        compressed time for each sample of original time axis
+
+    '''
+
+    dt = np.diff(t) * np.where(calm[:-1], 1. / factor, 1.)
+    return t[0] + np.concatenate(([0.], np.cumsum(dt)))
+
+
+def interpolate(t, y, ti, method='mean'):
+    '''Interpolate timeseries, accounting for angles'''
+
+    if method == 'angle':
+        r = np.radians(y)
+        return np.mod(np.degrees(np.arctan2(np.interp(ti, t, np.sin(r)),
+                                            np.interp(ti, t, np.cos(r)))), 360.)
+    else:
+        return np.interp(ti, t, y)
+
+
+def aggregate(t, y, edges, method='mean'):
+    '''Average timeseries over time spans
+
+    Averages are computed from the cumulative integral of the
+    timeseries, such that all time spans are averaged at once.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        time axis of timeseries
+    y : numpy.ndarray
+        timeseries
+    edges : numpy.ndarray
+        edges of time spans
+    method : str
+        averaging method: "mean", "rms" (energy), "cube" (transport)
+        or "angle" (directions in degrees)
+
+    Returns
+    -------
+    numpy.ndarray
+        average of timeseries in each time span
+
+    '''
+
+    if method == 'angle':
+        r = np.radians(y)
+        return np.mod(np.degrees(np.arctan2(aggregate(t, np.sin(r), edges),
+                                            aggregate(t, np.cos(r), edges))), 360.)
+    elif method == 'rms':
+        return np.sqrt(np.maximum(aggregate(t, y**2, edges), 0.))
+    elif method == 'cube':
+        return np.cbrt(aggregate(t, y**3, edges))
+
+    if len(t) < 2:
+        return np.zeros(len(edges) - 1) + y[0]
+
+    F = np.concatenate(([0.], np.cumsum(.5 * (y[1:] + y[:-1]) * np.diff(t))))
+    Fe = np.interp(edges, t, F)
+    dt = np.diff(edges)
+    return np.where(dt > 0., np.diff(Fe) / np.where(dt > 0., dt, 1.),
+                    np.interp(edges[:-1], t, y))
@@ -0,0 +1,497 @@
+'''Compiled Windsurf configuration
+
+The JSON configuration file is validated and compiled once when it is
+loaded, such that invalid configurations fail at startup and values
+that are needed during the simulation are available without
+traversing the JSON structure. The compiled configuration cannot be
+modified.
+
+'''
+
+import logging
+import numpy as np
+
+import scheduler
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+COUPLING_MODES = ['sequential', 'threads']
+HOSTS = ['local', 'process']
+CHUNKING = ['map', 'timeseries']
+
+
+class FrozenDict(dict):
+    '''Dictionary that cannot be modified'''
+
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Configuration cannot be modified')
+
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+
+def freeze(value):
+    '''Return immutable copy of JSON structure
+
+    Dictionaries are converted to :class:`FrozenDict` and lists to
+    tuples, recursively.
+
+    '''
+
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.iteritems())
+    elif isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    else:
+        return value
+
+
+class WindsurfConfig(object):
+    '''Compiled and validated Windsurf configuration
+
+    Holds the JSON configuration as an immutable structure and the
+    following precompiled values:
+
+    - start and stop time
+    - model engine specifications, hosts and time variables
+    - coupling mode, scheduler and morphological acceleration
+    - output file, variables and interval, output writer settings
+      and storage settings per output variable
+    - restart times as a sorted array and restart variables
+    - normalized exchange items
+    - regime table with parameters and coupler settings per regime
+    - scenario sorted by time
+
+    Raises ValueError upon initialization if the configuration is
+    invalid. The JSON configuration can be read like a dictionary,
+    but cannot be modified: dictionaries are returned as
+    :class:`FrozenDict` and lists as tuples. Note that
+    :func:`~windsurf.config.WindsurfConfig.get` traverses the
+    structure and does not accept a default value.
+
+    Examples
+    --------
+    >>> with open('windsurf.json', 'r') as fp:
+    ...     config = WindsurfConfig(json.load(fp))
+    >>> config.outputvars
+    (u'xbeach.zb', u'aeolis.zb')
+    >>> config.get('netcdf', 'interval')
+    3600.0
+    >>> config['netcdf']['interval']
+    3600.0
+
+    '''
+
+
+    def __init__(self, config):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        config : dict
+            JSON configuration structure
+
+        Raises
+        ------
+        ValueError
+            if the configuration is invalid
+
+        '''
+
+        if not isinstance(config, dict):
+            raise ValueError('Configuration must be a JSON object')
+
+        self.raw = freeze(config)
+        self._cache = {}
+
+        self._compile_time()
+        self._compile_models()
+        self._compile_coupling()
+        self._compile_output()
+        self._compile_restart()
+        self._compile_exchange()
+        self._compile_regimes()
+        self._compile_scenario()
+
+        self._frozen = True
+
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise TypeError('Configuration cannot be modified')
+        object.__setattr__(self, name, value)
+
+
+    def __getitem__(self, key):
+        '''Return section of JSON configuration structure'''
+        return self.raw[key]
+
+
+    def __contains__(self, key):
+        return key in self.raw
+
+
+    def __iter__(self):
+        return iter(self.raw)
+
+
+    def __len__(self):
+        return len(self.raw)
+
+
+    def keys(self):
+        return self.raw.keys()
+
+
+    def iteritems(self):
+        return self.raw.iteritems()
+
+
+    def get(self, *keys):
+        '''Get configuration value by traversing JSON structure
+
+        Lookups are cached. Unlike ``dict.get``, all arguments are
+        keys and no default value can be given.
+
+        Parameters
+        ----------
+        keys : str
+            traverse into JSON configuration structure
+
+        Returns
+        -------
+        value from JSON configuration file or (partial) structure or
+        None if non-existent
+
+        '''
+
+        if not self._cache.has_key(keys):
+            cfg = self.raw
+            for key in keys:
+                if isinstance(cfg, dict) and cfg.has_key(key):
+                    cfg = cfg[key]
+                else:
+                    cfg = None
+                    break
+            self._cache[keys] = cfg
+
+        return self._cache[keys]
+
+
+    def _compile_time(self):
+
+        self.tstart = self.get('time', 'start')
+        self.tstop = self.get('time', 'stop')
+
+        for key, value in [('start', self.tstart), ('stop', self.tstop)]:
+            if value is not None and not is_number(value):
+                raise ValueError('Invalid %s time "%s"' % (key, value))
+
+        if self.tstart is not None and self.tstop is not None and self.tstop < self.tstart:
+            raise ValueError('Stop time (%s) is before start time (%s)' % (self.tstop, self.tstart))
+
+
+    def _compile_models(self):
+
+        self.models = self.get('models') or FrozenDict()
+        if not isinstance(self.models, dict) or len(self.models) == 0:
+            raise ValueError('No model engines configured')
+
+        hosts = {}
+        time_vars = {}
+        for name, props in self.models.iteritems():
+            if not isinstance(props, dict):
+                raise ValueError('Invalid specification of engine "%s"' % name)
+
+            time_vars[name] = props.get('time_var')
+            if time_vars[name] is not None and not isinstance(time_vars[name], basestring):
+                raise ValueError('Invalid time variable "%s" for engine "%s"' % (
+                    time_vars[name], name))
+
+            host = props.get('host') or self.get('coupling', 'host') or 'local'
+            if host in HOSTS:
+                for key in ['engine', 'configfile']:
+                    if not props.has_key(key):
+                        raise ValueError('No "%s" specified for engine "%s"' % (key, name))
+            elif not host.startswith('tcp://') and not host.startswith('unix://'):
+                raise ValueError('Unknown host "%s" for engine "%s"' % (host, name))
+
+            hosts[name] = host
+
+        self.hosts = FrozenDict(hosts)
+        self.time_vars = FrozenDict(time_vars)
+
+
+    def _compile_coupling(self):
+
+        self.coupling_mode = self.get('coupling', 'mode') or 'sequential'
+        if self.coupling_mode not in COUPLING_MODES:
+            raise ValueError('Unknown coupling mode "%s", use one of: %s' % (
+                self.coupling_mode, ', '.join(COUPLING_MODES)))
+
+        self.workers = self.get('coupling', 'workers') or len(self.models)
+        if not is_integer(self.workers) or self.workers < 1:
+            raise ValueError('Invalid number of workers "%s"' % self.workers)
+
+        self.scheduler = self.get('coupling', 'scheduler') or 'maxlag'
+        if not scheduler.SCHEDULERS.has_key(self.scheduler):
+            raise ValueError('Unknown scheduler "%s", use one of: %s' % (
+                self.scheduler, ', '.join(sorted(scheduler.SCHEDULERS.keys()))))
+
+        self.ratio = self.get('coupling', 'ratio')
+        if self.ratio is not None:
+            if not isinstance(self.ratio, dict):
+                raise ValueError('Invalid ratio "%s", use number of steps per engine' % (self.ratio,))
+            for engine, n in self.ratio.iteritems():
+                self._check_engine(engine, 'ratio')
+                if not is_integer(n) or n < 1:
+                    raise ValueError('Number of steps for engine "%s" in ratio must be a positive integer, got %s' % (
+                        engine, n))
+
+        self.morfac = self._check_morfac(self.get('coupling', 'morfac') or 1.)
+
+        self.morfac_params = self.get('coupling', 'morfac_params') or FrozenDict()
+        for engine in self.morfac_params.iterkeys():
+            self._check_engine(engine, 'morfac parameters')
+
+
+    def _compile_output(self):
+
+        self.outputfile = self.get('netcdf', 'outputfile')
+        self.outputvars = self.get('netcdf', 'outputvars')
+        self.attributes = self.get('netcdf', 'attributes')
+        self.crs = self.get('netcdf', 'crs')
+        self.tout = self.get('netcdf', 'interval')
+
+        if self.outputvars is not None:
+            self.outputvars = tuple(self.outputvars)
+            if self.tout is None:
+                raise ValueError('No output interval specified')
+
+        if self.tout is not None and (not is_number(self.tout) or self.tout <= 0.):
+            raise ValueError('Output interval must be positive, got %s' % self.tout)
+
+        self.output_queue = self.get('netcdf', 'queue')
+        if self.output_queue is None:
+            self.output_queue = 4
+        if not is_integer(self.output_queue) or self.output_queue < 1:
+            raise ValueError('Output queue size must be a positive integer, got %s' % self.output_queue)
+
+        self.output_flush = self.get('netcdf', 'flush')
+        if self.output_flush is None:
+            self.output_flush = 10
+        if not is_integer(self.output_flush) or self.output_flush < 0:
+            raise ValueError('Output flush interval must be a non-negative integer, got %s' % self.output_flush)
+
+        self.output_background = self.get('netcdf', 'background')
+        if self.output_background is None:
+            self.output_background = True
+        if not isinstance(self.output_background, bool):
+            raise ValueError('Output background writing must be true or false, got %s' % (
+                self.output_background,))
+
+        # storage settings per output variable: defaults, overridden
+        # by settings for the variable name without engine and
+        # statistic (e.g. "zb" for "xbeach.zb.avg") and settings for
+        # the full variable name
+        defaults = self.get('netcdf', 'storage') or FrozenDict()
+        self._check_storage(defaults, 'all variables')
+
+        settings = self.get('netcdf', 'variables') or FrozenDict()
+        for name, storage in settings.iteritems():
+            self._check_storage(storage, 'variable "%s"' % name)
+
+        storage = {}
+        for var in self.outputvars or ():
+            parts = var.split('.')
+            if len(parts) > 1 and self.models.has_key(parts[0]):
+                parts = parts[1:]
+            storage[var] = dict(defaults)
+            storage[var].update(settings.get(parts[0], {}))
+            storage[var].update(settings.get(var, {}))
+            storage[var] = FrozenDict(storage[var])
+        self.output_storage = FrozenDict(storage)
+
+
+    def _compile_restart(self):
+
+        times = self.get('restart', 'times') or ()
+        try:
+            self.restart_times = np.sort(np.asarray(times, dtype=float).ravel())
+        except (TypeError, ValueError):
+            raise ValueError('Invalid restart times "%s"' % (times,))
+        self.restart_times.flags.writeable = False
+
+        self.restart_variables = self.get('restart', 'variables')
+        if self.restart_variables is not None:
+            self.restart_variables = tuple(self.restart_variables)
+
+        self.restart_backup = bool(self.get('restart', 'backup'))
+
+
+    def _compile_exchange(self):
+
+        exchange = []
+        for ex in self.get('exchange') or ():
+            if not isinstance(ex, dict) or not ex.has_key('var_from') or not ex.has_key('var_to'):
+                raise ValueError('Exchange item without "var_from" and "var_to": %s' % (ex,))
+
+            skip_unchanged = ex.get('skip_unchanged') or False
+            if skip_unchanged is True:
+                skip_unchanged = 'compare'
+            if skip_unchanged not in [False, 'compare', 'hash']:
+                raise ValueError(
+                    'Invalid value "%s" for "skip_unchanged" in exchange "%s" to "%s"' % (
+                        skip_unchanged, ex['var_from'], ex['var_to']))
+
+            interval = float(ex.get('interval') or 0.)
+            if interval < 0.:
+                raise ValueError(
+                    'Negative interval in exchange "%s" to "%s"' % (
+                        ex['var_from'], ex['var_to']))
+
+            region = ex.get('region')
+            if region is not None and region != 'changed':
+                if not isinstance(region, dict) or \
+                   len(region.get('start') or []) != len(region.get('count') or [1]):
+                    raise ValueError(
+                        'Invalid region in exchange "%s" to "%s", use "changed" or start and count' % (
+                            ex['var_from'], ex['var_to']))
+
+            exchange.append(FrozenDict({
+                'var_from' : ex['var_from'],
+                'var_to' : ex['var_to'],
+                'interval' : interval,
+                'skip_unchanged' : skip_unchanged,
+                'interpolate' : bool(ex.get('interpolate')),
+                'morfac' : bool(ex.get('morfac')),
+                'region' : region,
+                'regrid' : ex.get('regrid'),
+            }))
+
+        self.exchange = tuple(exchange)
+
+
+    def _compile_regimes(self):
+
+        self.regimes = self.get('regimes') or FrozenDict()
+
+        morfac = {}
+        engines = {}
+        for regime, settings in self.regimes.iteritems():
+            if not isinstance(settings, dict):
+                raise ValueError('Invalid specification of regime "%s"' % regime)
+
+            for engine, params in settings.iteritems():
+                if engine.startswith('_'):
+                    continue # reserved for coupler settings
+                self._check_engine(engine, 'regime "%s"' % regime)
+                if not isinstance(params, dict):
+                    raise ValueError('Invalid parameters for engine "%s" in regime "%s"' % (
+                        engine, regime))
+
+            morfac[regime] = self._check_morfac(settings.get('_morfac', self.morfac))
+
+            active = {}
+            for engine in self.models.iterkeys():
+                active[engine] = settings.get(engine, {}).get('_active', True)
+                if not isinstance(active[engine], bool):
+                    raise ValueError('Invalid value "%s" for "_active" of engine "%s" in regime "%s"' % (
+                        active[engine], engine, regime))
+            if not any(active.values()):
+                raise ValueError('No active engine in regime "%s"' % regime)
+
+            engines[regime] = FrozenDict({
+                engine : (active[engine], settings.get(engine, {}).get('_constants'))
+                for engine in self.models.iterkeys()
+            })
+
+        self.regime_morfac = FrozenDict(morfac)
+        self.regime_engines = FrozenDict(engines)
+
+
+    def _compile_scenario(self):
+
+        scenario = self.get('scenario') or ()
+        for s in scenario:
+            if not isinstance(s, tuple) or len(s) != 2 or not is_number(s[0]):
+                raise ValueError('Invalid regime switch %s in scenario, use [time, regime]' % (s,))
+            if not self.regimes.has_key(s[1]):
+                raise ValueError('Unknown regime "%s" in scenario' % s[1])
+
+        scenario = sorted(scenario, key=lambda s: s[0])
+        self.scenario_times = tuple(float(s[0]) for s in scenario)
+        self.scenario_regimes = tuple(s[1] for s in scenario)
+
+        # model engines can only be reactivated if their clock can be set
+        inactive = set()
+        for regime in self.scenario_regimes:
+            for engine, (active, constants) in self.regime_engines[regime].iteritems():
+                if not active:
+                    inactive.add(engine)
+                elif engine in inactive and self.time_vars[engine] is None:
+                    raise ValueError(
+                        'Engine "%s" is reactivated in regime "%s", but has no "time_var" to set its clock' % (
+                            engine, regime))
+
+
+    def _check_storage(self, storage, context):
+
+        if not isinstance(storage, dict):
+            raise ValueError('Invalid storage settings for %s' % context)
+
+        for key, value in storage.iteritems():
+            if key in ['zlib', 'shuffle']:
+                valid = isinstance(value, bool)
+            elif key == 'complevel':
+                valid = is_integer(value) and 0 <= value <= 9
+            elif key == 'least_significant_digit':
+                valid = value is None or is_integer(value)
+            elif key == 'time_chunk':
+                valid = is_integer(value) and value >= 1
+            elif key == 'chunking':
+                valid = value in CHUNKING
+            elif key == 'chunksizes':
+                valid = isinstance(value, tuple) and \
+                        all([is_integer(x) and x >= 1 for x in value])
+            else:
+                raise ValueError('Unknown storage setting "%s" for %s' % (key, context))
+
+            if not valid:
+                raise ValueError('Invalid value "%s" for storage setting "%s" for %s' % (
+                    value, key, context))
+
+
+    def _check_engine(self, engine, context):
+        if not self.models.has_key(engine):
+            raise ValueError('Unknown model engine "%s" in %s' % (engine, context))
+
+
+    def _check_morfac(self, morfac):
+        if not is_number(morfac) or morfac <= 0.:
+            raise ValueError('Morphological acceleration factor must be positive, got %s' % morfac)
+        return float(morfac)
+
+
+def is_number(value):
+    '''Check if value is a number, excluding booleans'''
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+
+def is_integer(value):
+    '''Check if value is an integer, excluding booleans'''
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
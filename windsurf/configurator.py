@@ -255,16 +255,33 @@ class WindsurfScenario:
 
     
     def __init__(self, start=0., stop=3600.*24.*365, step=3600., interval=3600.*35, time=None):
+        self.regimes = {}
+        self.regimes_order = []
         self.interval = interval
         if time is not None:
             self.t = np.asarray(time)
         else:
             self.t = np.arange(start, stop+step, step)
 
+        # regime masks, one bit per regime
+        self.masks = np.zeros(len(self.t), dtype=np.uint8)
+
 
     def add_regime(self, regime, initialize=True):
+        if regime in self.regimes.keys():
+            raise ValueError('Regime [%s] already exists' % regime)
+
+        i = len(self.regimes_order)
+        if i >= 32:
+            raise ValueError('Too many regimes, at most 32 regimes are supported')
+
+        dtype = np.min_scalar_type(2**(i+1) - 1)
+        if dtype.itemsize > self.masks.dtype.itemsize:
+            self.masks = self.masks.astype(dtype)
+
         self.regimes_order.append(regime)
-        self.regimes[regime] = np.asarray([initialize] * len(self.t))
+        self.regimes[regime] = i
+        self.set_mask(regime, initialize)
         self.select_regime(regime)
 
 
@@ -275,6 +292,31 @@ class WindsurfScenario:
             raise ValueError('Unknown regime [%s]' % regime)
 
 
+    def get_mask(self, regime):
+        '''Return boolean mask of regime'''
+        return np.bitwise_and(self.masks, self._get_bit(regime)) > 0
+
+
+    def set_mask(self, regime, value, index=slice(None)):
+        '''Set mask of regime in given samples'''
+        bit = self._get_bit(regime)
+        if value:
+            self.masks[index] |= bit
+        else:
+            self.masks[index] &= ~bit
+
+
+    def get_codes(self, index=slice(None)):
+        '''Return index of regime in each sample
+
+        If multiple regimes apply to a sample, the regime that was
+        added last is returned. If no regime applies, -1 is returned.
+
+        '''
+
+        return np.frexp(self.masks[index])[1] - 1
+
+
     def add_condition(self, t, y, threshold=None, regime=None, exclude=False):
 
         t = np.asarray(t)
@@ -284,49 +326,231 @@ class WindsurfScenario:
         if regime is None:
             regime = self.selected_regime
 
-        # get all peaks
-        peaks = np.asarray(scipy.signal.argrelmax(y)[0])
+        peaks = get_peaks(y, threshold=threshold)
+        troughs = get_troughs(t, y, peaks, self.interval)
+        self.add_troughs(t, troughs, regime=regime, exclude=exclude)
+
+
+    def add_troughs(self, t, troughs, regime=None, exclude=False):
+        '''Add condition from troughs around peaks
+
+        Troughs that are closer than the interval are joined. Samples
+        in between the remaining troughs are storm samples. The regime
+        is set to the value of ``exclude`` outside storms.
 
-        # remove peaks below threshold
-        if threshold is not None:
-            peaks = np.delete(peaks, np.where(y[peaks] < threshold)[0])
+        Parameters
+        ----------
+        t : numpy.ndarray
+            time axis of timeseries
+        troughs : numpy.ndarray
+            indices of troughs before and after each peak, see
+            :func:`~windsurf.configurator.get_troughs`
+        regime : str, optional
+            regime to set (default: selected regime)
+        exclude : bool
+            value of regime outside storms
 
-        # add troughs in between peaks
-        troughs = []
-        for peak in peaks:
-            t1 = t[peak] - self.interval/2
-            t2 = t[peak] + self.interval/2
-            idx1 = (t >= t1) & (t <= t[peak])
-            idx2 = (t <= t2) & (t >= t[peak])
-            troughs.append(np.where(idx1)[0][0] + np.argmin(y[idx1]))
-            troughs.append(peak + np.argmin(y[idx2]))
+        '''
+
+        t = np.asarray(t)
+        troughs = np.asarray(troughs, dtype=int)
+
+        # set regime
+        if regime is None:
+            regime = self.selected_regime
 
         # join close troughs
-        while True:
-            idx = np.where(t[troughs[2::2]] - t[troughs[1:-1:2]] < self.interval)[0] * 2 + 1
-            if len(idx) == 0:
-                break
-            troughs = np.delete(troughs, np.concatenate((idx, idx+1)))
-        troughs = np.concatenate(([0], troughs, [len(t)]))
+        idx = np.where(t[troughs[2::2]] - t[troughs[1:-1:2]] < self.interval)[0] * 2 + 1
+        troughs = np.delete(troughs, np.concatenate((idx, idx+1)))
 
-        # determine regimes
-        idx = np.asarray(np.sum([[np.mod(i,2)==0] * n for i, n in enumerate(troughs[1:] - troughs[:-1])]))
-        idx = np.interp(self.t, t, idx) >= .5 # interpolate to generic time axis
-        self.regimes[regime][idx] = exclude
+        # determine regimes: samples in between joined troughs are
+        # storm samples
+        n = len(t)
+        storm = np.cumsum(np.bincount(troughs[0::2], minlength=n+1) -
+                          np.bincount(troughs[1::2], minlength=n+1))[:n] > 0
+        idx = np.interp(self.t, t, ~storm) >= .5 # interpolate to generic time axis
+        self.set_mask(regime, exclude, idx)
 
 
     def render_scenario(self):
+        return list(self.iter_scenario())
+
+
+    def iter_scenario(self, chunksize=100000):
+        '''Iterate over regime switches
+
+        Regime switches are determined from chunks of samples, such
+        that the regime of all samples is never held in memory at
+        once.
+
+        Parameters
+        ----------
+        chunksize : int
+            number of samples per chunk
+
+        Yields
+        ------
+        tuple
+            time and name of regime (None if no regime applies)
+
+        '''
+
+        names = np.asarray(self.regimes_order + [None], dtype=object)
+
+        p = -1
+        for i in range(0, len(self.t), chunksize):
+            codes = self.get_codes(slice(i, i+chunksize))
+            idx = np.where(codes != np.concatenate(([p], codes[:-1])))[0]
+            for t, s in zip(self.t[i+idx], names[codes[idx]]):
+                yield t, s
+            p = codes[-1]
+
+
+    def write_scenario(self, configfile, chunksize=100000):
+        '''Write scenario to Windsurf configuration file
+
+        Regime switches are written to the file while they are
+        determined, see
+        :func:`~windsurf.configurator.WindsurfScenario.iter_scenario`.
+        Other configuration options in an existing file are kept.
+
+        Parameters
+        ----------
+        configfile : str
+            path to Windsurf configuration file (e.g. windsurf.json)
+        chunksize : int
+            number of samples per chunk
+
+        '''
+
+        cfg = {}
+        if os.path.exists(configfile):
+            with open(configfile, 'r') as fp:
+                cfg = json.load(fp)
+            cfg.pop('scenario', None)
+
+        head = json.dumps(cfg, indent=4, sort_keys=True)
+
+        with open(configfile, 'w') as fp:
+            fp.write(head[:-1].rstrip())
+            if len(cfg) > 0:
+                fp.write(',')
+            fp.write('\n    "scenario": [')
+            for i, (t, regime) in enumerate(self.iter_scenario(chunksize=chunksize)):
+                fp.write('%s\n        %s' % (',' if i > 0 else '', json.dumps([float(t), regime])))
+            fp.write('\n    ]\n}\n')
+
+
+    def _get_bit(self, regime):
+        return self.masks.dtype.type(1 << self.regimes[regime])
+
+
+def get_peaks(y, threshold=None):
+    '''Return indices of peaks in timeseries
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        timeseries
+    threshold : float, optional
+        minimum value of peaks
+
+    Returns
+    -------
+    numpy.ndarray
+        indices of peaks
+
+    '''
+
+    y = np.asarray(y)
+
+    # get all peaks
+    peaks = np.asarray(scipy.signal.argrelmax(y)[0])
+
+    # remove peaks below threshold
+    if threshold is not None:
+        peaks = np.delete(peaks, np.where(y[peaks] < threshold)[0])
+
+    return peaks
+
+
+def get_troughs(t, y, peaks, interval):
+    '''Return indices of troughs around peaks in timeseries
+
+    Troughs are the first minima within half the interval before and
+    after each peak.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        time axis of timeseries
+    y : numpy.ndarray
+        timeseries
+    peaks : numpy.ndarray
+        indices of peaks
+    interval : float
+        interval around peaks
+
+    Returns
+    -------
+    numpy.ndarray
+        indices of trough before and trough after each peak
+
+    '''
+
+    t = np.asarray(t)
+    y = np.asarray(y)
+    peaks = np.asarray(peaks, dtype=int)
+
+    lo = np.searchsorted(t, t[peaks] - interval/2, side='left')
+    hi = np.searchsorted(t, t[peaks] + interval/2, side='right') - 1
+
+    troughs = np.zeros(2 * len(peaks), dtype=int)
+    troughs[0::2] = range_argmin(y, lo, peaks)
+    troughs[1::2] = range_argmin(y, peaks, hi)
+
+    return troughs
+
+
+def range_argmin(y, start, stop):
+    '''Return index of first minimum of array within ranges
+
+    Uses a sparse table of minima over ranges with a length of a
+    power of two. The table is built one level at a time and each
+    range is answered from the two overlapping ranges of the largest
+    fitting level, such that only a single level is held in memory.
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        array
+    start : numpy.ndarray
+        first index of each range
+    stop : numpy.ndarray
+        last index of each range (inclusive)
+
+    Returns
+    -------
+    numpy.ndarray
+        index of first minimum within each range
+
+    '''
 
-        scenario = np.asarray([None] * len(self.t))
+    y = np.asarray(y)
+    start = np.asarray(start, dtype=int)
+    stop = np.asarray(stop, dtype=int)
 
-        for regime in self.regimes_order:
-            scenario[self.regimes[regime]] = regime
+    # largest power of two that fits in each range
+    k = np.frexp(stop - start + 1)[1] - 1
 
-        p = None
-        scenario_consolidated = []
-        for i, (t, s) in enumerate(zip(self.t, scenario)):
-            if s != p:
-                scenario_consolidated.append((t,s))
-            p = s
+    result = np.zeros(len(start), dtype=int)
+    table = np.arange(len(y))
+    for j in range(k.max() + 1 if len(k) > 0 else 0):
+        if j > 0:
+            a, b = table[:-2**(j-1)], table[2**(j-1):]
+            table = np.where(y[a] <= y[b], a, b)
+        i = np.where(k == j)[0]
+        a, b = table[start[i]], table[stop[i] - 2**j + 1]
+        result[i] = np.where(y[a] <= y[b], a, b)
 
-        return scenario_consolidated
+    return result
@@ -1,7 +1,11 @@
 import docopt
 import logging
+import numpy as np
 from model import WindsurfWrapper
-from configurator import WindsurfConfigurator
+from remote import serve
+from configurator import WindsurfConfigurator, WindsurfScenario
+from compression import ScenarioCompressor
+from sweep import ScenarioSweep
 
 
 logging.basicConfig(filename='windsurf.log',
@@ -39,6 +43,136 @@ def windsurf():
     model.run(callback=arguments['--callback'])
 
 
+def windsurf_engine():
+    '''windsurf-engine : host a model engine for a remote windsurf model
+
+    Usage:
+        windsurf-engine <address> <engine> [--configfile=FILE] [--engine-path=PATH] [--verbose=LEVEL]
+
+    Positional arguments:
+        address              address to listen on (e.g. tcp://0.0.0.0:5000 or unix:///tmp/xbeach.sock)
+        engine               model engine library or Python class
+
+    Options:
+        -h, --help           show this help message and exit
+        --configfile=FILE    model engine configuration file
+        --engine-path=PATH   absolute path to model engine library
+        --verbose=LEVEL      print logging messages [default: 30]
+
+    '''
+
+    arguments = docopt.docopt(windsurf_engine.__doc__)
+
+    # initialize logger
+    if arguments['--verbose'] is not None:
+        logging.root.setLevel(int(arguments['--verbose']))
+    else:
+        logging.root.setLevel(logging.NOTSET)
+
+    # serve model engine
+    serve(arguments['<address>'],
+          arguments['<engine>'],
+          configfile=arguments['--configfile'],
+          engine_path=arguments['--engine-path'])
+
+
+def windsurf_compress():
+    '''windsurf-compress : compress forcing records into a shorter representative scenario
+
+    Usage:
+        windsurf-compress <timeseries> <threshold> [options]
+
+    Positional arguments:
+        timeseries          file with time and storm indicator (e.g. wind speed) in first two columns
+        threshold           storm threshold
+
+    Options:
+        -h, --help          show this help message and exit
+        --factor=N          compression factor for calm stretches [default: 10]
+        --interval=T        minimum duration of calm stretches in seconds [default: 126000]
+        --regimes=NAMES     names of calm and storm regime [default: calm,storm]
+        --wind=FILE         wind forcing file
+        --tide=FILE         tide forcing file
+        --waves=FILE        wave forcing file (jons_table)
+        --output=DIR        output directory [default: compressed]
+        --verbose=LEVEL     print logging messages [default: 30]
+
+    '''
+
+    arguments = docopt.docopt(windsurf_compress.__doc__)
+
+    # initialize logger
+    if arguments['--verbose'] is not None:
+        logging.root.setLevel(int(arguments['--verbose']))
+    else:
+        logging.root.setLevel(logging.NOTSET)
+
+    ts = np.loadtxt(arguments['<timeseries>'])[:,:2]
+    calm, storm = arguments['--regimes'].split(',')
+
+    # detect storms
+    scenario = WindsurfScenario(time=ts[:,0], interval=float(arguments['--interval']))
+    scenario.add_regime(calm)
+    scenario.add_regime(storm)
+    scenario.add_condition(ts[:,0], ts[:,1], threshold=float(arguments['<threshold>']))
+
+    # compress forcing
+    forcing = {kind : arguments['--%s' % kind] for kind in ['wind', 'tide', 'waves']
+               if arguments['--%s' % kind] is not None}
+    compressor = ScenarioCompressor(scenario, factor=float(arguments['--factor']), calm=[calm])
+    report = compressor.write(arguments['--output'], forcing)
+
+    for key, value in sorted(report.items()):
+        print '%-25s %12.3f' % (key, value)
+
+
+def windsurf_sweep():
+    '''windsurf-sweep : generate scenarios for a grid of storm thresholds and intervals
+
+    Usage:
+        windsurf-sweep <timeseries> <thresholds> [options]
+
+    Positional arguments:
+        timeseries          file with time and storm indicator (e.g. wind speed) in first two columns
+        thresholds          comma-separated list of storm thresholds
+
+    Options:
+        -h, --help          show this help message and exit
+        --intervals=T       comma-separated list of minimum durations of calm stretches in seconds [default: 126000]
+        --regimes=NAMES     names of calm and storm regime [default: calm,storm]
+        --config=FILE       configuration file used as template
+        --workers=N         number of threads (default: number of cores)
+        --output=DIR        output directory [default: sweep]
+        --verbose=LEVEL     print logging messages [default: 30]
+
+    '''
+
+    arguments = docopt.docopt(windsurf_sweep.__doc__)
+
+    # initialize logger
+    if arguments['--verbose'] is not None:
+        logging.root.setLevel(int(arguments['--verbose']))
+    else:
+        logging.root.setLevel(logging.NOTSET)
+
+    ts = np.loadtxt(arguments['<timeseries>'])[:,:2]
+    workers = arguments['--workers']
+
+    sweep = ScenarioSweep(ts[:,0], ts[:,1],
+                          thresholds=[float(x) for x in arguments['<thresholds>'].split(',')],
+                          intervals=[float(x) for x in arguments['--intervals'].split(',')],
+                          regimes=arguments['--regimes'].split(','),
+                          workers=int(workers) if workers is not None else None)
+    stats = sweep.write(arguments['--output'], configfile=arguments['--config'])
+
+    print '%12s %12s %8s %12s %10s  %s' % ('threshold', 'interval', 'storms',
+                                          'storm hours', 'fraction', 'configfile')
+    for s in stats:
+        print '%12g %12g %8d %12.1f %10.4f  %s' % (s['threshold'], s['interval'], s['storms'],
+                                                   s['storm_hours'], s['storm_fraction'],
+                                                   s['configfile'])
+
+
 def windsurf_setup():
     '''windsurf-setup : a model setup wizard for the windsurf model
 
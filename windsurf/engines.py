@@ -0,0 +1,577 @@
+import os
+import mmap
+import logging
+import tempfile
+import threading
+import traceback
+import importlib
+import numpy as np
+from bmi.api import IBmi
+from bmi.wrapper import BMIWrapper
+from multiprocessing import Process, Pipe
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+# location of named shared memory blocks
+if os.path.isdir('/dev/shm'):
+    SHM_PATH = '/dev/shm'
+else:
+    SHM_PATH = tempfile.gettempdir()
+
+
+def load_engine(engine, configfile='', engine_path=None):
+    '''Load BMI model engine
+
+    Loads a model engine either as external library through the BMI
+    wrapper or, if no library is found, as Python class.
+
+    Parameters
+    ----------
+    engine : str
+        name of model engine library or reference to Python class
+        (e.g. ``xbeachmi.model.XBeachMI``)
+    configfile : str
+        path to model engine configuration file
+    engine_path : str
+        absolute path to directory containing the model engine library
+
+    Returns
+    -------
+    IBmi
+        BMI compatible model engine object
+
+    Raises
+    ------
+    RuntimeError
+        if the model engine is not found
+
+    '''
+
+    # support local engines
+    if engine_path and \
+       os.path.isabs(engine_path) and \
+       os.path.exists(engine_path):
+
+        logger.debug('Adding library "%s" to path...' % engine_path)
+        os.environ['LD_LIBRARY_PATH'] = engine_path
+        os.environ['DYLD_LIBRARY_PATH'] = engine_path # Darwin
+
+    # initialize bmi wrapper
+    try:
+        # try external library
+        return BMIWrapper(
+            engine=engine,
+            configfile=configfile or ''
+        )
+    except RuntimeError:
+        # try python package
+        try:
+            p, c = engine.rsplit('.', 1)
+            mod = importlib.import_module(p)
+            return getattr(mod, c)(configfile=configfile or '')
+        except:
+            raise RuntimeError('Engine not found [%s]' % engine)
+
+
+def dispatch(wrapper, method, args):
+    '''Execute call on hosted model engine
+
+    Executes the batched calls ``get_vars`` and ``set_vars`` as
+    individual calls if the model engine does not support them. Partial
+    updates through ``set_var_slice`` and ``set_var_index`` fall back
+    to getting, patching and setting the entire array.
+
+    Parameters
+    ----------
+    wrapper : IBmi
+        BMI compatible model engine object
+    method : str
+        name of method to call
+    args : tuple
+        method arguments
+
+    Returns
+    -------
+    any
+        return value of method
+
+    '''
+
+    if method == 'set_var_slice':
+        return set_var_slice(wrapper, *args)
+    elif method == 'set_var_index':
+        return set_var_index(wrapper, *args)
+    elif method == 'get_vars' and not hasattr(wrapper, 'get_vars'):
+        names, = args
+        return [wrapper.get_var(name) for name in names]
+    elif method == 'set_vars' and not hasattr(wrapper, 'set_vars'):
+        names, values = args
+        for name, value in zip(names, values):
+            wrapper.set_var(name, value)
+    else:
+        return getattr(wrapper, method)(*args)
+
+
+def set_var_slice(wrapper, name, start, count, value):
+    '''Set slice of array in model engine
+
+    Routes the call to the model engine if supported. Otherwise, gets
+    the entire array, patches the slice and sets the entire array.
+
+    Parameters
+    ----------
+    wrapper : IBmi
+        BMI compatible model engine object
+    name : str
+        variable name
+    start : list
+        start index of slice in each dimension
+    count : list
+        length of slice in each dimension
+    value : numpy.ndarray
+        values in slice
+
+    '''
+
+    if hasattr(wrapper, 'set_var_slice'):
+        try:
+            return wrapper.set_var_slice(name, start, count, value)
+        except (AttributeError, NotImplementedError, TypeError):
+            # libraries may not export the function and BMI wrappers
+            # raise NotImplemented(...), which is a TypeError
+            pass
+
+    arr = np.array(wrapper.get_var(name))
+    arr[tuple([slice(i, i+n) for i, n in zip(start, count)])] = np.reshape(value, count)
+    wrapper.set_var(name, arr)
+
+
+def set_var_index(wrapper, name, index, value):
+    '''Set array elements by flat index in model engine
+
+    Routes the call to the model engine if supported. Otherwise, gets
+    the entire array, patches the elements and sets the entire array.
+
+    Parameters
+    ----------
+    wrapper : IBmi
+        BMI compatible model engine object
+    name : str
+        variable name
+    index : list
+        flat indices of array elements
+    value : numpy.ndarray
+        values of array elements
+
+    '''
+
+    if hasattr(wrapper, 'set_var_index'):
+        try:
+            return wrapper.set_var_index(name, index, value)
+        except (AttributeError, NotImplementedError, TypeError):
+            # libraries may not export the function and BMI wrappers
+            # raise NotImplemented(...), which is a TypeError
+            pass
+
+    arr = np.array(wrapper.get_var(name))
+    np.put(arr, index, value)
+    wrapper.set_var(name, arr)
+
+
+class SharedArray:
+    '''Numpy array in a named shared memory block
+
+    The memory block is a file in ``/dev/shm`` (or the temporary
+    directory if not available) that is mapped into memory by all
+    processes that attach to it. A :class:`SharedArray` can be
+    communicated between processes by its handle, see
+    :func:`~windsurf.engines.SharedArray.handle`.
+
+    '''
+
+
+    def __init__(self, name, shape, dtype, create=False):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        name : str
+            name of shared memory block
+        shape : tuple
+            array shape
+        dtype : str or numpy.dtype
+            array data type
+        create : bool
+            create new memory block rather than attaching to an
+            existing one
+
+        '''
+
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(SHM_PATH, name)
+
+        nbytes = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+
+        if create:
+            fd = os.open(self.path, os.O_CREAT | os.O_TRUNC | os.O_RDWR, 0600)
+            os.ftruncate(fd, nbytes)
+        else:
+            fd = os.open(self.path, os.O_RDWR)
+
+        try:
+            self._mmap = mmap.mmap(fd, nbytes)
+        finally:
+            os.close(fd)
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._mmap)
+
+
+    def handle(self):
+        '''Return picklable handle to attach to memory block'''
+        return (self.name, self.shape, self.dtype.str)
+
+
+    def close(self):
+        '''Detach from memory block'''
+
+        self.array = None
+        try:
+            self._mmap.close()
+        except:
+            logger.debug('Failed to close shared memory block "%s"' % self.name)
+
+
+    def unlink(self):
+        '''Remove memory block, attached processes keep access'''
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class EngineProxy(IBmi):
+    '''BMI proxy base class
+
+    Base class for model engines that are hosted outside the
+    coupler. All BMI calls are forwarded through the
+    :func:`~windsurf.engines.EngineProxy._call` method that is
+    implemented by the subclasses. In addition to the BMI calls, the
+    batched calls :func:`~windsurf.engines.EngineProxy.get_vars` and
+    :func:`~windsurf.engines.EngineProxy.set_vars` get or set multiple
+    arrays in a single round trip.
+
+    '''
+
+
+    def _call(self, method, *args):
+        raise NotImplementedError
+
+
+    def initialize(self):
+        return self._call('initialize')
+
+
+    def update(self, dt=-1):
+        return self._call('update', dt)
+
+
+    def finalize(self):
+        return self._call('finalize')
+
+
+    def get_current_time(self):
+        return self._call('get_current_time')
+
+
+    def get_start_time(self):
+        return self._call('get_start_time')
+
+
+    def get_end_time(self):
+        return self._call('get_end_time')
+
+
+    def get_var(self, name):
+        return self._call('get_var', name)
+
+
+    def get_var_count(self):
+        return self._call('get_var_count')
+
+
+    def get_var_name(self, i):
+        return self._call('get_var_name', i)
+
+
+    def get_var_rank(self, name):
+        return self._call('get_var_rank', name)
+
+
+    def get_var_shape(self, name):
+        return self._call('get_var_shape', name)
+
+
+    def get_var_type(self, name):
+        return self._call('get_var_type', name)
+
+
+    def inq_compound(self, name):
+        return self._call('inq_compound', name)
+
+
+    def inq_compound_field(self, name):
+        return self._call('inq_compound_field', name)
+
+
+    def set_var(self, name, value):
+        return self._call('set_var', name, value)
+
+
+    def get_vars(self, names):
+        '''Return list of arrays from model engine in a single call'''
+        return self._call('get_vars', list(names))
+
+
+    def set_vars(self, names, values):
+        '''Set list of arrays in model engine in a single call'''
+        return self._call('set_vars', list(names), list(values))
+
+
+    def set_var_index(self, name, index, value):
+        return self._call('set_var_index', name, index, value)
+
+
+    def set_var_slice(self, name, start, count, value):
+        return self._call('set_var_slice', name, start, count, value)
+
+
+class EngineProcess(EngineProxy):
+    '''BMI proxy for a model engine hosted in a worker process
+
+    Loads the model engine in a separate worker process, such that
+    model engines run on separate cores and a crashing model engine
+    does not take down the coupler. BMI calls are forwarded through a
+    pipe. Arrays that are exchanged between worker processes are
+    handed over through named shared memory blocks, see
+    :func:`~windsurf.engines.EngineProcess.get_var_shared` and
+    :func:`~windsurf.engines.EngineProcess.set_var_shared`.
+
+    '''
+
+
+    def __init__(self, engine, configfile='', engine_path=None, name=None):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        engine : str
+            name of model engine library or reference to Python class
+        configfile : str
+            path to model engine configuration file
+        engine_path : str
+            absolute path to directory containing the model engine library
+        name : str
+            name of model engine in coupler, used for logging and
+            naming of shared memory blocks
+
+        '''
+
+        self.name = name or engine
+        self.prefix = 'windsurf-%d-%s' % (os.getpid(), self.name)
+        self._attached = {}
+        self._lock = threading.Lock()
+
+        self._conn, conn = Pipe()
+        self._process = Process(target=serve_process,
+                                args=(conn, engine, configfile, engine_path, self.prefix))
+        self._process.daemon = True
+        self._process.start()
+
+        logger.debug('Started worker process %d for engine "%s"' % (self._process.pid,
+                                                                      self.name))
+
+        # wait for model engine to be loaded
+        self._call(None)
+
+
+    def _call(self, method, *args):
+        '''Forward call to worker process
+
+        Parameters
+        ----------
+        method : str
+            name of method to call on the model engine, use None to
+            wait for the worker process to be ready
+
+        Returns
+        -------
+        any
+            return value of method
+
+        Raises
+        ------
+        RuntimeError
+            if the method failed in the worker process or if the worker
+            process died
+
+        '''
+
+        with self._lock:
+            try:
+                if method is not None:
+                    self._conn.send((method, args))
+                success, result = self._conn.recv()
+            except (EOFError, IOError):
+                raise RuntimeError('Worker process of engine "%s" died [exitcode: %s]' % (
+                    self.name, self._process.exitcode))
+
+        if not success:
+            raise RuntimeError('Call "%s" failed in engine "%s":\n%s' % (
+                method, self.name, result))
+
+        return result
+
+
+    def get_var_shared(self, name):
+        '''Return array from model engine in shared memory block
+
+        The worker process copies the array into a shared memory block
+        that is owned by the worker process. The array is not
+        communicated through the pipe.
+
+        Parameters
+        ----------
+        name : str
+            variable name
+
+        Returns
+        -------
+        SharedArray
+            shared memory block holding the array
+
+        '''
+
+        handle = self._call('get_var_shared', name)
+        block = self._attached.get(name)
+        if block is None or block.handle() != handle:
+            if block is not None:
+                block.close()
+            block = SharedArray(*handle)
+            self._attached[name] = block
+        return block
+
+
+    def set_var_shared(self, name, block):
+        '''Set array in model engine from shared memory block
+
+        Parameters
+        ----------
+        name : str
+            variable name
+        block : SharedArray
+            shared memory block holding the array
+
+        '''
+
+        return self._call('set_var_shared', name, block.handle())
+
+
+    def finalize(self):
+        '''Finalize model engine and stop worker process'''
+
+        try:
+            return self._call('finalize')
+        finally:
+            for block in self._attached.itervalues():
+                block.close()
+            self._attached = {}
+            self._process.join(10.)
+            if self._process.is_alive():
+                self._process.terminate()
+
+
+def serve_process(conn, engine, configfile='', engine_path=None, prefix='windsurf'):
+    '''Host model engine in worker process
+
+    Loads the model engine and executes calls received through the
+    pipe until the model engine is finalized. Shared memory blocks
+    created by this process are removed upon exit.
+
+    Parameters
+    ----------
+    conn : multiprocessing.Connection
+        pipe to coupler
+    engine : str
+        name of model engine library or reference to Python class
+    configfile : str
+        path to model engine configuration file
+    engine_path : str
+        absolute path to directory containing the model engine library
+    prefix : str
+        prefix for names of shared memory blocks
+
+    '''
+
+    try:
+        wrapper = load_engine(engine, configfile, engine_path)
+    except:
+        conn.send((False, traceback.format_exc()))
+        return
+
+    conn.send((True, None))
+
+    blocks = {} # owned shared memory blocks
+    attached = {} # attached shared memory blocks by variable name
+    generation = 0
+
+    try:
+        while True:
+            try:
+                method, args = conn.recv()
+            except EOFError:
+                break
+
+            try:
+                if method == 'get_var_shared':
+                    name, = args
+                    val = np.asarray(wrapper.get_var(name))
+                    block = blocks.get(name)
+                    if block is None or block.shape != val.shape or block.dtype != val.dtype:
+                        if block is not None:
+                            block.close()
+                            block.unlink()
+                        generation += 1
+                        block = SharedArray('%s-%s-%d' % (prefix, name, generation),
+                                            val.shape, val.dtype, create=True)
+                        blocks[name] = block
+                    block.array[...] = val
+                    result = block.handle()
+                elif method == 'set_var_shared':
+                    name, handle = args
+                    block = attached.get(name)
+                    if block is None or block.handle() != handle:
+                        if block is not None:
+                            block.close()
+                        block = SharedArray(*handle)
+                        attached[name] = block
+                    # copy, as the model engine may keep a reference
+                    # to the array while the block is overwritten
+                    result = wrapper.set_var(name, np.array(block.array))
+                else:
+                    result = dispatch(wrapper, method, args)
+                conn.send((True, result))
+            except:
+                conn.send((False, traceback.format_exc()))
+
+            if method == 'finalize':
+                break
+    finally:
+        for block in attached.itervalues():
+            block.close()
+        for block in blocks.itervalues():
+            block.close()
+            block.unlink()
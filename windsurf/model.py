@@ -4,16 +4,17 @@ import imp
 import time
 import json
 import shutil
+import bisect
 import logging
+import hashlib
 import traceback
-import importlib
 import numpy as np
 import cPickle as pickle
 from bmi.api import IBmi
-from bmi.wrapper import BMIWrapper
 from multiprocessing import Process
+from multiprocessing.pool import ThreadPool
 
-import netcdf, parsers
+import netcdf, parsers, engines, remote, scheduler, regrid, variables, config
 
 
 # initialize log
@@ -48,6 +49,8 @@ class WindsurfWrapper:
         self.configfile = configfile
         self.restartfile = restartfile
         self.restart = restartfile is not None
+        self._buffers = {}
+        self._writer = None
 
 
     def run(self, callback=None, subprocess=True):
@@ -65,7 +68,14 @@ class WindsurfWrapper:
 
             
     def start(self, callback=None):
-        '''Start model time loop'''
+        '''Start model time loop
+
+        Output is written in a background thread, see
+        :class:`~windsurf.netcdf.NetCDFWriter`. The output file is
+        closed at the end of the simulation and if the simulation
+        fails.
+
+        '''
 
         # parse callback
         callback = self.parse_callback(callback)
@@ -73,6 +83,8 @@ class WindsurfWrapper:
         self.engine = Windsurf(configfile=self.configfile)
         self.engine.initialize()
 
+        self._compile_scenario()
+
         self.t = 0
         self.i = 0
         self.iout = 0
@@ -83,22 +95,28 @@ class WindsurfWrapper:
 
         self.output_init()
 
-        if self.restart:
-            self.load_restart_file()
-        else:
-            self.output()
-
-        while self.t < self.tstop:
-            if callback is not None:
-                callback(self.engine)
-            self.set_regime()
-            self.engine.update()
-            self.t = self.engine.get_current_time()
-            self.i += 1
-            self.output()
-            self.progress()
-            self.tlast = self.t
+        try:
+            if self.restart:
+                self.load_restart_file()
+            else:
+                self.output()
 
+            while self.t < self.tstop:
+                if callback is not None:
+                    callback(self.engine)
+                self.set_regime()
+                self.engine.update()
+                self.t = self.engine.get_current_time()
+                self.i += 1
+                self.output()
+                self.progress()
+                self.tlast = self.t
+        except:
+            logger.error('Simulation failed at t=%0.2f, closing output...' % self.t)
+            self.output_close(ignore_errors=True)
+            raise
+
+        self.output_close()
         self.engine.finalize()
         
         logger.debug('End of simulation')
@@ -108,31 +126,134 @@ class WindsurfWrapper:
         '''Set model settings according to current regime
 
         Checks which regime should be currently active. If the regime
-        is changed, the corresponding model parameters are set.
+        is changed, the corresponding model parameters are set. The
+        scenario is compiled once, see
+        :func:`~windsurf.model.WindsurfWrapper._compile_scenario`.
+        Only parameters that differ from the previous regime are set,
+        in a single call per model engine. Model engines are
+        deactivated in regimes that set "_active" to false for the
+        model engine, see
+        :func:`~windsurf.model.Windsurf.set_engine_active`. The
+        morphological acceleration factor is set from the "_morfac"
+        option of the regime, see
+        :func:`~windsurf.model.Windsurf.set_morfac`. Without a
+        scenario, no regime is set.
 
         '''
 
-        regimes = self.engine.get_config_value('regimes')
-        scenario = self.engine.get_config_value('scenario')
-        times = np.asarray([s[0] for s in scenario])
-        idx = np.where(times <= self.t)[0].max()
-            
-        if idx >= len(scenario):
-            logger.warning("Scenario too short, reusing last regime!")
-            idx = len(scenario)-1
-            
-        if scenario[idx][1] != self.regime:
-            self.regime = scenario[idx][1]
+        # current regime is valid until next switch
+        if self._scenario_start <= self.t < self._scenario_next:
+            return
+
+        times = self._scenario_times
+        if len(times) == 0:
+            # no scenario, model engines keep their own settings
+            self._scenario_start = -np.inf
+            self._scenario_next = np.inf
+            return
+
+        idx = bisect.bisect_right(times, self.t) - 1
+        if idx < 0:
+            raise ValueError('No regime defined at t=%0.2f, scenario starts at t=%0.2f' % (
+                self.t, times[0]))
+
+        self._scenario_start = times[idx]
+        self._scenario_next = times[idx+1] if idx+1 < len(times) else np.inf
+
+        if self._scenario_regimes[idx] != self.regime:
+            names, values = self._get_regime_transition(self.regime,
+                                                         self._scenario_regimes[idx])
+
+            self.regime = self._scenario_regimes[idx]
             logger.info('Switched to regime "%s"' % self.regime)
 
-            for engine, variables in regimes[self.regime].iteritems():
-                for name, value in variables.iteritems():
-                    logger.debug('Set parameter "%s" in engine "%s" to "%s"' % (name,
-                                                                                engine,
-                                                                                value))
-                    self.engine.set_var('%s.%s' % (engine, name), np.asarray(value))
+            for name, value in zip(names, values):
+                logger.debug('Set parameter "%s" to "%s"' % (name, value))
+
+            self.engine.set_vars(names, values)
+
+            # activate or deactivate model engines
+            cfg = self.engine.config
+            for engine, (active, constants) in cfg.regime_engines[self.regime].iteritems():
+                self.engine.set_engine_active(engine, active=active, constants=constants)
+
+            # set morphological acceleration factor
+            self.engine.set_morfac(cfg.regime_morfac[self.regime])
 
         
+    def _compile_scenario(self):
+        '''Compile scenario into sorted list of regime switches
+
+        The scenario is sorted by time when the configuration is
+        loaded, see :class:`~windsurf.config.WindsurfConfig`, such
+        that the current regime is found by bisection. The time of the next regime
+        switch is cached, such that
+        :func:`~windsurf.model.WindsurfWrapper.set_regime` returns
+        immediately until the next switch.
+
+        '''
+
+        self._scenario_times = list(self.engine.config.scenario_times)
+        self._scenario_regimes = list(self.engine.config.scenario_regimes)
+        self._scenario_start = np.inf
+        self._scenario_next = -np.inf
+
+        # precompute transitions between subsequent regimes
+        self._regime_transitions = {}
+        for old, new in zip([None] + self._scenario_regimes, self._scenario_regimes):
+            self._get_regime_transition(old, new)
+
+        logger.debug('Compiled scenario with %d regime switches' % len(self._scenario_times))
+
+
+    def _get_regime_transition(self, old, new):
+        '''Return model parameters that change between two regimes
+
+        Parameters that are equal in both regimes are left out. All
+        parameters of the new regime are returned if no old regime is
+        given. Transitions are cached.
+
+        Parameters
+        ----------
+        old : str
+            name of current regime or None
+        new : str
+            name of new regime
+
+        Returns
+        -------
+        list
+            parameter names including model engine prefix
+        list
+            parameter values
+
+        '''
+
+        if not self._regime_transitions.has_key((old, new)):
+            regimes = self.engine.config.regimes
+            if not regimes.has_key(new):
+                raise ValueError('Unknown regime "%s" in scenario' % new)
+
+            names = []
+            values = []
+            for engine, variables in sorted(regimes[new].iteritems()):
+                if engine.startswith('_'):
+                    continue # reserved for coupler settings
+                current = regimes.get(old, {}).get(engine, {})
+                for name, value in sorted(variables.iteritems()):
+                    if name.startswith('_'):
+                        continue # reserved for coupler settings
+                    if current.has_key(name) and type(current[name]) == type(value) \
+                       and current[name] == value:
+                        continue
+                    names.append('%s.%s' % (engine, name))
+                    values.append(np.asarray(value))
+
+            self._regime_transitions[(old, new)] = (names, values)
+
+        return self._regime_transitions[(old, new)]
+
+
     def parse_callback(self, callback):
         '''Parses callback definition and returns function
 
@@ -175,23 +296,27 @@ class WindsurfWrapper:
 
         Creates an empty netCDF4 output file with the necessary
         dimensions, variables, attributes and coordinate reference
-        system specification (crs).
+        system specification (crs). The output file is kept open by
+        an output writer until
+        :func:`~windsurf.model.WindsurfWrapper.output_close` is
+        called. The "queue", "flush" and "background" options in the
+        "netcdf" section configure the output writer, see
+        :class:`~windsurf.netcdf.NetCDFWriter`.
 
         '''
 
-        outputfile = self.engine.get_config_value('netcdf', 'outputfile')
-        outputvars = self.engine.get_config_value('netcdf', 'outputvars')
-        attributes = self.engine.get_config_value('netcdf', 'attributes')
-        crs = self.engine.get_config_value('netcdf', 'crs')
+        cfg = self.engine.config
+        outputfile = cfg.outputfile
+        outputvars = cfg.outputvars
         
         if outputfile is not None and outputvars is not None:
             if not self.restart or not os.path.exists(outputfile):
             
                 logger.debug('Initializing output...')
         
-                # get dimension names for each variable
+                # get dimension names and storage settings for each variable
                 variables = {
-                    v : { 'dimensions' : self.engine.get_dimensions(v) }
+                    v : dict(cfg.output_storage[v], dimensions=self.engine.get_dimensions(v))
                     for v in outputvars
                 }
 
@@ -201,39 +326,69 @@ class WindsurfWrapper:
                 netcdf.initialize(outputfile,
                                   self.read_dimensions(),
                                   variables=variables,
-                                  attributes=attributes,
-                                  crs=crs)
+                                  attributes=cfg.attributes,
+                                  crs=cfg.crs)
+
+            self._writer = netcdf.NetCDFWriter(outputfile,
+                                               queue_size=cfg.output_queue,
+                                               flush_interval=cfg.output_flush,
+                                               threaded=cfg.output_background)
+            self._writer.open()
+
+
+    def output_close(self, ignore_errors=False):
+        '''Write waiting output and close netCDF4 output file
+
+        Parameters
+        ----------
+        ignore_errors : bool
+            log errors while writing output rather than raising them
+
+        '''
+
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            try:
+                writer.close()
+            except:
+                if not ignore_errors:
+                    raise
+                logger.error(traceback.format_exc())
 
         
     def output(self):
-        '''Write model data to netCDF4 output file'''
+        '''Write model data to netCDF4 output file
+
+        Output is handed over to the output writer. Waiting output is
+        flushed to disk before restart and backup files are created.
+
+        '''
+
+        cfg = self.engine.config
 
         # dump restart and/or backup file if requested
-        times = self.engine.get_config_value('restart', 'times')
-        if times is not None:
-            tr = np.asarray(times)
-            if self.tlast > 0. and np.any((tr <= self.t) & (tr > self.tlast)):
-                self.dump_restart_file()
-                if self.engine.get_config_value('restart', 'backup'):
-                    self.create_backup()
+        tr = cfg.restart_times
+        if self.tlast > 0. and np.searchsorted(tr, self.t, side='right') > \
+                               np.searchsorted(tr, self.tlast, side='right'):
+            if self._writer is not None:
+                self._writer.flush()
+            self.dump_restart_file()
+            if cfg.restart_backup:
+                self.create_backup()
 
         # write output if requested
-        if np.mod(self.t, self.engine.tout) < self.t - self.tlast:
-
-            outputfile = self.engine.get_config_value('netcdf', 'outputfile')
-            outputvars = self.engine.get_config_value('netcdf', 'outputvars')
+        if np.mod(self.t, cfg.tout) < self.t - self.tlast:
 
-            if outputfile is not None and outputvars is not None:
+            if self._writer is not None:
                 
                 logger.debug('Writing output at t=%0.2f...' % self.t)
             
                 # get dimension data for each variable
-                variables = {v : self.engine.get_var(v) for v in outputvars}
+                outputvars = cfg.outputvars
+                variables = dict(zip(outputvars, self.get_buffered_vars(outputvars)))
                 variables['time'] = self.t
         
-                netcdf.append(outputfile,
-                              idx=self.iout,
-                              variables=variables)
+                self._writer.write(self.iout, variables)
 
                 self.iout += 1
             
@@ -248,12 +403,26 @@ class WindsurfWrapper:
                 self.engine.update(-dump['time'])
                 self.t = self.engine.get_current_time()
                 self.tlast = self.t
+                self._scenario_next = -np.inf # force regime lookup
                 self.iout = dump['iout']
                 self.i = dump['i']
+                self.engine.tmorph = dump.get('tmorph', dump['time'])
                     
+                names = []
+                values = []
                 for engine, variables in dump['data'].iteritems():
                     for var, val in variables.iteritems():
-                        self.engine.set_var('%s.%s' % (engine, var), val)
+                        names.append('%s.%s' % (engine, var))
+                        values.append(val)
+
+                self.engine.set_vars(names, values)
+
+                # restore inactive model engines and their time offsets
+                for engine, (active, offset) in dump.get('engines', {}).iteritems():
+                    m = self.engine.models[engine]
+                    m['_offset'] = offset
+                    m['_time'] = m['_wrapper'].get_current_time() + offset
+                    self.engine.set_engine_active(engine, active=active)
                         
             logger.info('Loaded restart file "%s".' % self.restartfile)
         else:
@@ -266,23 +435,25 @@ class WindsurfWrapper:
         fname = 'restart.%d.pkl' % self.t
         if not os.path.exists(fname):
 
-            variables = self.engine.get_config_value('restart', 'variables')
+            variables = self.engine.config.restart_variables
             if variables is not None:
 
                 dump = {
                     'time' : self.t,
                     'iout' : self.iout,
                     'i' : self.i,
+                    'tmorph' : self.engine.tmorph,
+                    'engines' : {},
                     'data' : {}
                 }
         
-                for model in self.engine.models.iterkeys():
+                for model, m in self.engine.models.iteritems():
+                    dump['engines'][model] = (m['_active'], m['_offset'])
                     dump['data'][model] = {}
 
-                for var in variables:
-                    val = self.engine.get_var(var)
-                    engine, var = self.engine._split_var(var)
-                    dump['data'][engine][var] = val
+                for var, val in zip(variables, self.get_buffered_vars(variables)):
+                    h = self.engine.get_var_handle(var)
+                    dump['data'][h.engine][h.name] = val
             
                 with open(fname, 'w') as fp:
                     pickle.dump(dump, fp)
@@ -290,12 +461,39 @@ class WindsurfWrapper:
                 logger.info('Written restart file "%s".' % fname)
 
 
+    def get_buffered_vars(self, names):
+        '''Return copies of arrays from model engines in persistent buffers
+
+        A buffer is allocated for each variable on first use and
+        reused as long as the shape of the variable does not change.
+        The buffers are overwritten on the next call for the same
+        variables.
+
+        Parameters
+        ----------
+        names : list
+            variable names including model engine prefix
+
+        Returns
+        -------
+        list
+            buffers filled with current variable values
+
+        '''
+
+        values = self.engine.get_vars(names, out=[self._buffers.get(name)
+                                                  for name in names])
+        self._buffers.update(zip(names, values))
+
+        return values
+
+
     def create_backup(self):
         '''Create backup file of output file'''
 
         logger.info('Creating backup file...')
 
-        outputfile = self.engine.get_config_value('netcdf', 'outputfile')
+        outputfile = self.engine.config.outputfile
         if outputfile is not None:
             shutil.copyfile(outputfile, '%s~' % outputfile)
 
@@ -405,6 +603,9 @@ class Windsurf(IBmi):
     '''
 
     t = 0.0
+    tmorph = 0.0
+    morfac = None
+    coupling_modes = config.COUPLING_MODES
 
     def __init__(self, configfile=None):
         '''Initialize the class
@@ -420,6 +621,10 @@ class Windsurf(IBmi):
         self.configfile = configfile
         self.load_configfile()
 
+        self._handles = {}
+        self._registry = dict(variables.DEFAULT_ENGINES)
+        self._var_names = []
+
 
     def __enter__(self):
         '''Enter the class'''
@@ -457,6 +662,16 @@ class Windsurf(IBmi):
 
         See for more information section :ref:`configuration`.
 
+        The configuration is validated and compiled once, see
+        :class:`~windsurf.config.WindsurfConfig`.
+
+        Raises
+        ------
+        IOError
+            if the configuration file does not exist
+        ValueError
+            if the configuration is invalid
+
         '''
 
         if os.path.exists(self.configfile):
@@ -472,11 +687,12 @@ class Windsurf(IBmi):
             logger.debug('Changed directory to "%s"' % fpath)
 
             with open(fname, 'r') as fp:
-                self.config = json.load(fp)
-                self.tstart = self.get_config_value('time', 'start')
-                self.tstop = self.get_config_value('time', 'stop')
-                self.tout = self.get_config_value('netcdf', 'interval')
-                self.models = self.get_config_value('models')
+                self.config = config.WindsurfConfig(json.load(fp))
+                self.tstart = self.config.tstart
+                self.tstop = self.config.tstop
+                self.tout = self.config.tout
+                self.models = {name : dict(props)
+                               for name, props in self.config.models.iteritems()}
         else:
             raise IOError('File not found: %s' % self.configfile)
         
@@ -498,36 +714,107 @@ class Windsurf(IBmi):
     
     def get_var(self, name):
         '''Return array from model engine'''
-        engine, name = self._split_var(name)
-        return self.models[engine]['_wrapper'].get_var(name).copy()
+        return self.get_var_handle(name).get().copy()
+
+
+    def get_var_handle(self, name):
+        '''Return handle on variable in model engine
+
+        Variable names are resolved once, see
+        :func:`~windsurf.model.Windsurf._split_var`. Handles are
+        cached and can be reused by the caller to access the variable
+        without resolving its name again.
+
+        Parameters
+        ----------
+        name : str
+            variable name including model engine prefix
+
+        Returns
+        -------
+        VariableHandle
+            handle on variable in model engine
+
+        '''
+
+        if not self._handles.has_key(name):
+            engine, var = self._split_var(name)
+            self._handles[name] = variables.VariableHandle(
+                engine, var, self.models[engine]['_wrapper'])
+
+        return self._handles[name]
+
+
+    def get_var_view(self, name):
+        '''Return read-only view on array from model engine
+
+        The view is not copied and reflects the memory of the model
+        engine. It is only valid until the model engine is updated or
+        the variable is reallocated.
+
+        '''
+
+        value = np.asarray(self.get_var_handle(name).get()).view()
+        value.flags.writeable = False
+        return value
+
+
+    def get_var_into(self, name, out):
+        '''Copy array from model engine into preallocated array
+
+        Parameters
+        ----------
+        name : str
+            variable name including model engine prefix
+        out : numpy.ndarray
+            preallocated array with same shape as variable
+
+        Returns
+        -------
+        numpy.ndarray
+            preallocated array
+
+        Raises
+        ------
+        ValueError
+            if the shape of the preallocated array does not match
+
+        '''
+
+        value = self.get_var_view(name)
+        if out.shape != value.shape:
+            raise ValueError('Shape %s of output array does not match shape %s of "%s"' % (
+                out.shape, value.shape, name))
+        np.copyto(out, value)
+        return out
 
     
     def get_var_count(self):
-        raise NotImplemented(
-            'BMI extended function "get_var_count" is not implemented yet')
+        '''Return number of variables reported by model engines'''
+        return len(self._var_names)
 
     
     def get_var_name(self, i):
-        raise NotImplemented(
-            'BMI extended function "get_var_name" is not implemented yet')
+        '''Return variable name including model engine prefix'''
+        return self._var_names[i]
 
     
     def get_var_rank(self, name):
         '''Return array rank or 0 for scalar'''
-        engine, name = self._split_var(name)
-        return self.models[engine]['_wrapper'].get_var_rank(name)
+        h = self.get_var_handle(name)
+        return h.wrapper.get_var_rank(h.name)
 
     
     def get_var_shape(self, name):
         '''Return array shape'''
-        engine, name = self._split_var(name)
-        return self.models[engine]['_wrapper'].get_var_shape(name)
+        h = self.get_var_handle(name)
+        return h.wrapper.get_var_shape(h.name)
 
     
     def get_var_type(self, name):
         '''Return type string, compatible with numpy'''
-        engine, name = self._split_var(name)
-        return self.models[engine]['_wrapper'].get_var_type(name)
+        h = self.get_var_handle(name)
+        return h.wrapper.get_var_type(h.name)
 
     
     def inq_compound(self, name):
@@ -540,20 +827,88 @@ class Windsurf(IBmi):
             'BMI extended function "inq_compound_field" is not implemented yet')
 
     
+    def get_vars(self, names, out=None):
+        '''Return list of arrays from model engines
+
+        Variables are grouped by model engine and read in a single
+        call per model engine if supported. Arrays are copied, either
+        into the preallocated arrays in ``out`` or into new arrays.
+
+        Parameters
+        ----------
+        names : list
+            variable names including model engine prefix
+        out : list, optional
+            preallocated arrays, either None or an array with the
+            same shape as the variable for each variable
+
+        Returns
+        -------
+        list
+            arrays from model engines
+
+        '''
+
+        values = list(out or [None] * len(names))
+
+        for engine, (idx, vars) in self._group_vars(names):
+            wrapper = self.models[engine]['_wrapper']
+            if hasattr(wrapper, 'get_vars'):
+                result = wrapper.get_vars(vars)
+            else:
+                result = [wrapper.get_var(var) for var in vars]
+
+            for i, value in zip(idx, result):
+                value = np.asarray(value)
+                if values[i] is not None and values[i].shape == value.shape:
+                    np.copyto(values[i], value)
+                elif isinstance(wrapper, engines.EngineProxy):
+                    values[i] = value
+                else:
+                    values[i] = value.copy()
+
+        return values
+
+
+    def set_vars(self, names, values):
+        '''Set list of arrays in model engines
+
+        Variables are grouped by model engine and written in a single
+        call per model engine if supported.
+
+        Parameters
+        ----------
+        names : list
+            variable names including model engine prefix
+        values : list
+            arrays to write
+
+        '''
+
+        for engine, (idx, vars) in self._group_vars(names):
+            wrapper = self.models[engine]['_wrapper']
+            if hasattr(wrapper, 'set_vars'):
+                wrapper.set_vars(vars, [values[i] for i in idx])
+            else:
+                for i, var in zip(idx, vars):
+                    wrapper.set_var(var, values[i])
+
+
     def set_var(self, name, value):
         '''Set array in model engine'''
-        engine, name = self._split_var(name)
-        self.models[engine]['_wrapper'].set_var(name, value)
+        self.get_var_handle(name).set(value)
 
     
     def set_var_index(self, name, index, value):
-        raise NotImplemented(
-            'BMI extended function "set_var_index" is not implemented yet')
+        '''Set array elements by flat index in model engine'''
+        h = self.get_var_handle(name)
+        engines.set_var_index(h.wrapper, h.name, index, value)
 
     
     def set_var_slice(self, name, start, count, value):
-        raise NotImplemented(
-            'BMI extended function "set_var_slice" is not implemented yet')
+        '''Set slice of array in model engine'''
+        h = self.get_var_handle(name)
+        engines.set_var_slice(h.wrapper, h.name, start, count, value)
 
     
     def initialize(self):
@@ -564,39 +919,59 @@ class Windsurf(IBmi):
             
             logger.info('Loading library "%s"...' % name)
 
-            # support local engines
-            if props.has_key('engine_path') and \
-               props['engine_path'] and \
-               os.path.isabs(props['engine_path']) and \
-               os.path.exists(props['engine_path']):
-                
-                logger.debug('Adding library "%s" to path...' % props['engine_path'])
-                os.environ['LD_LIBRARY_PATH'] = props['engine_path']
-                os.environ['DYLD_LIBRARY_PATH'] = props['engine_path'] # Darwin
+            host = self.config.hosts[name]
+            engine_path = props.get('engine_path')
 
-            # initialize bmi wrapper
-            try:
-                # try external library
-                self.models[name]['_wrapper'] = BMIWrapper(
-                    engine=props['engine'],
-                    configfile=props['configfile'] or ''
+            if host == 'local':
+                self.models[name]['_wrapper'] = engines.load_engine(
+                    props['engine'],
+                    configfile=props['configfile'],
+                    engine_path=engine_path
+                )
+            elif host.startswith('tcp://') or host.startswith('unix://'):
+                logger.info('Connecting to engine "%s" at "%s"...' % (name, host))
+                self.models[name]['_wrapper'] = remote.RemoteEngine(host, name=name)
+            elif host == 'process':
+                logger.info('Hosting engine "%s" in worker process...' % name)
+                self.models[name]['_wrapper'] = engines.EngineProcess(
+                    props['engine'],
+                    configfile=props['configfile'],
+                    engine_path=engine_path,
+                    name=name
                 )
-            except RuntimeError:
-                # try python package
-                try:
-                    p, c = props['engine'].rsplit('.', 1)
-                    mod = importlib.import_module(p)
-                    engine = getattr(mod, c)
-                    self.models[name]['_wrapper'] = engine(configfile=props['configfile'] or '')
-                except:
-                    raise RuntimeError('Engine not found [%s]' % props['engine'])
 
             # initialize time
             self.models[name]['_time'] = self.t
+            self.models[name]['_offset'] = 0.
+            self.models[name]['_active'] = True
 
             # initialize model engine
             self.models[name]['_wrapper'].initialize()
 
+        # register variables reported by model engines
+        self._handles = {}
+        self._registry, self._var_names = variables.build_registry(
+            {name : props['_wrapper'] for name, props in self.models.iteritems()})
+
+        # compile exchange plan
+        self._var_groups = {}
+        self._compile_exchange_plan()
+
+        # initialize coupling mode
+        self.coupling_mode = self.config.coupling_mode
+
+        # initialize scheduler
+        self._scheduler = self._create_scheduler()
+
+        # initialize morphological acceleration
+        self.set_morfac(self.config.morfac)
+
+        self._pool = None
+        if self.coupling_mode == 'threads':
+            workers = self.config.workers
+            self._pool = ThreadPool(workers)
+            logger.info('Stepping independent engines concurrently using %d threads' % workers)
+
     
     def update(self, dt=-1):
         '''Step model engines into the future
@@ -607,6 +982,20 @@ class Windsurf(IBmi):
         (approximately) at the same point in time. Exchange data if
         necessary.
 
+        The order in which model engines are stepped is determined by
+        the scheduler policy in the "coupling" section, see
+        :mod:`~windsurf.scheduler`. By default the model engine with
+        maximum lag is stepped first.
+
+        In the "threads" coupling mode, lagging model engines that do
+        not exchange data with each other are stepped concurrently,
+        see :func:`~windsurf.model.Windsurf._get_engines_independent`.
+        Results are identical to the default "sequential" mode.
+
+        Inactive model engines are not stepped, but their time in the
+        coupler is fast-forwarded to the other model engines, see
+        :func:`~windsurf.model.Windsurf.set_engine_active`.
+
         Parameters
         ----------
         dt : float
@@ -614,57 +1003,60 @@ class Windsurf(IBmi):
 
         '''
 
-        t0 = self.t
-        target_time = None
         engine_last = None
 
-        for engine in self.models.iterkeys():
-            self.models[engine]['_target'] = None
+        self._scheduler.start({name:m['_time'] for name, m in self.models.iteritems()
+                               if m['_active']})
 
         # repeat update until target time step is reached for all engines
-        while target_time is None or np.any([m['_time'] < target_time
-                                             for m in self.models.itervalues()]):
+        while not self._scheduler.done():
 
-            # determine model engine with maximum lag
-            engine = self._get_engine_maxlag()
-            e = self.models[engine]
-            now = e['_time']
+            # determine model engine(s) to step
+            if self.coupling_mode == 'sequential':
+                selected = [self._scheduler.next()]
+            else:
+                selected = self._get_engines_independent(self._scheduler.next_group())
+            now = {engine:self.models[engine]['_time'] for engine in selected}
 
             # exchange data if another model engine is selected
-            try:
-                if engine != engine_last:
-                    self._exchange_data(engine)
-            except:
-                logger.error('Failed to exchange data from "%s" to "%s"!' % (engine_last, engine))
-                logger.error(traceback.format_exc())
+            for engine in selected:
+                try:
+                    if engine != engine_last:
+                        self._exchange_data(engine)
+                except:
+                    logger.error('Failed to exchange data from "%s" to "%s"!' % (engine_last, engine))
+                    logger.error(traceback.format_exc())
+                engine_last = engine
 
-            # step model engine in future
-            try:
-                e['_wrapper'].update(dt)
-            except:
-                logger.error('Failed to update "%s"!' % engine)
-                logger.error(traceback.format_exc())
+            # step model engine(s) in future
+            if len(selected) > 1:
+                self._pool.map(lambda engine: self._update_engine(engine, dt), selected)
+            else:
+                self._update_engine(selected[0], dt)
 
-            # update time
-            e['_time'] = e['_wrapper'].get_current_time()
-            e['_target'] = e['_time']
+            for engine in selected:
+                e = self.models[engine]
 
-            logger.debug(
-                'Step engine "%s" from t=%0.2f to t=%0.2f into the future...' % (
-                    engine,
-                    now,
-                    e['_time']))
+                # update time
+                e['_time'] = e['_wrapper'].get_current_time() + e['_offset']
+                self._scheduler.advance(engine, e['_time'])
 
-            # determine target time step after first update
-            if target_time is None and \
-               np.all([m['_target'] is not None for m in self.models.itervalues()]):
-                
-                target_time = np.max([m['_time'] for m in self.models.itervalues()])
-                logger.debug('Set target time step to t=%0.2f' % target_time)
+                logger.debug(
+                    'Step engine "%s" from t=%0.2f to t=%0.2f into the future...' % (
+                        engine,
+                        now[engine],
+                        e['_time']))
 
-            engine_last = engine
+        # fast-forward clocks of inactive model engines
+        t = max([m['_time'] for m in self.models.itervalues() if m['_active']])
+        for m in self.models.itervalues():
+            if not m['_active']:
+                m['_offset'] += t - m['_time']
+                m['_time'] = t
 
+        t = self.t
         self.t = np.mean([m['_time'] for m in self.models.itervalues()])
+        self.tmorph += self.morfac * (self.t - t)
         logger.debug('Arrived in future at t=%0.2f' % self.t)
 
 
@@ -675,14 +1067,44 @@ class Windsurf(IBmi):
         for name, props in self.models.iteritems():
             self.models[name]['_wrapper'].finalize()
 
+        # report data exchange statistics
+        stats = getattr(self, 'exchange_stats', None)
+        if stats is not None and stats['bytes_skipped'] > 0:
+            logger.info('Exchanged %0.1f MB, skipped %0.1f MB of unchanged data (%0.1f%%)' % (
+                stats['bytes_copied'] / 1e6,
+                stats['bytes_skipped'] / 1e6,
+                100. * stats['bytes_skipped'] / (stats['bytes_copied'] + stats['bytes_skipped'])))
+
+        # stop worker threads
+        if getattr(self, '_pool', None) is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
 
     def _exchange_data(self, engine):
         '''Exchange data from all model engines to a given model engine
 
-        Reads exchange configuration and looks for items where the
-        given model engine is in the "var_to" field and reads the
-        corresponding "var_from" variable from the model engine
-        specified by the "var_to" variable.
+        Runs the items from the exchange plan that have the given
+        model engine as target and reads the corresponding "var_from"
+        variable from the source model engine. See
+        :func:`~windsurf.model.Windsurf._compile_exchange_plan`.
+        Variables are read from and written to model engines that
+        support batched calls in a single call per model engine.
+        Exchange items with an "interval" are skipped if less simulated
+        time than the interval has passed since their last successful
+        exchange. Exchange items with "skip_unchanged" are skipped if the
+        variable did not change since the last exchange, see
+        :func:`~windsurf.model.Windsurf._is_unchanged`. Exchange items
+        with "interpolate" pass the variable interpolated to the time
+        of the target model engine, see
+        :func:`~windsurf.model.Windsurf._interpolate_in_time`. Exchange
+        items with "region" only write part of the variable to the
+        target model engine, see
+        :func:`~windsurf.model.Windsurf._get_exchange_region`. Exchange
+        items with "morfac" pass the change of the variable scaled by
+        the morphological acceleration factor, see
+        :func:`~windsurf.model.Windsurf._accelerate_change`.
 
         Parameters
         ----------
@@ -691,49 +1113,907 @@ class Windsurf(IBmi):
 
         '''
 
-        exchange = self.get_config_value('exchange')
-        if exchange is not None:
-            for ex in exchange:
-                engine_to, var_to = self._split_var(ex['var_to'])
-                engine_from, var_from = self._split_var(ex['var_from'])
-                if engine_to == engine:
-                
-                    logger.debug('Exchange "%s" to "%s"' % (
-                        ex['var_from'],
-                        ex['var_to']))
-
-                    try:
-                        val = self.models[engine_from]['_wrapper'].get_var(var_from)
-                    except:
-                        logger.error('Failed to get "%s" from "%s"!' % (var_from, engine_from))
-                        logger.error(traceback.format_exc())
-
-                    try:
-                        self.models[engine_to]['_wrapper'].set_var(var_to, val)
-                    except:
-                        logger.error('Failed to set "%s" in "%s"!' % (var_to, engine_to))
-                        logger.error(traceback.format_exc())
+        # select exchange items that are due
+        t = self.models[engine]['_time']
+        links = []
+        pending = [] # change counters and states stored upon success
+        for link in self._exchange_plan.get(engine, []):
+            if link['interval'] > 0. and link['_last'] is not None and \
+               t - link['_last'] < link['interval']:
+                continue
+
+            # inactive model engines only export their frozen state once
+            update = {}
+            if not self.models[link['engine_from']]['_active']:
+                if link['_frozen']:
+                    continue
+                update['_frozen'] = True
+
+            # skip exchange items with unchanged change counter
+            if link['counter']:
+                try:
+                    counter = link['wrapper_from'].get_var_counter(link['name_from'])
+                    if counter == link['_counter']:
+                        self.exchange_stats['bytes_skipped'] += link['_nbytes']
+                        self._commit_exchange(link, t, update)
+                        continue
+                    update['_counter'] = counter
+                except:
+                    logger.error('Failed to get change counter of "%s" from "%s"!' % (
+                        link['name_from'], link['engine_from']))
+                    logger.error(traceback.format_exc())
+
+            links.append(link)
+            pending.append(update)
+
+        values = [None] * len(links)
+
+        # read data from source model engines
+        batches = {}
+        for i, link in enumerate(links):
+
+            logger.debug('Exchange "%s" to "%s"' % (
+                link['var_from'],
+                link['var_to']))
+
+            if link['batch_from']:
+                batches.setdefault(link['engine_from'], []).append(i)
+                continue
+
+            try:
+                if link['shared']:
+                    values[i] = link['wrapper_from'].get_var_shared(link['name_from'])
+                else:
+                    values[i] = link['wrapper_from'].get_var(link['name_from'])
+            except:
+                logger.error('Failed to get "%s" from "%s"!' % (link['name_from'],
+                                                                 link['engine_from']))
+                logger.error(traceback.format_exc())
+
+        for engine_from, idx in batches.iteritems():
+            names = [links[i]['name_from'] for i in idx]
+            try:
+                vals = self.models[engine_from]['_wrapper'].get_vars(names)
+                for i, val in zip(idx, vals):
+                    values[i] = val
+            except:
+                logger.error('Failed to get "%s" from "%s"!' % ('", "'.join(names),
+                                                                 engine_from))
+                logger.error(traceback.format_exc())
+
+        # write data to target model engine
+        batch = []
+        for i, link in enumerate(links):
+
+            if values[i] is None:
+                continue
+
+            if link['shared']:
+                link['_nbytes'] = values[i].array.nbytes
+            else:
+                link['_nbytes'] = np.asarray(values[i]).nbytes
+
+            if link['interpolate']:
+                values[i] = self._interpolate_in_time(link, values[i],
+                                                      self.models[link['engine_from']]['_time'],
+                                                      t)
+
+            if link['morfac']:
+                values[i] = self._accelerate_change(link, values[i])
+
+            if link['skip_unchanged'] and not link['counter']:
+                unchanged, pending[i]['_state'] = self._is_unchanged(link, values[i])
+                if unchanged:
+                    self.exchange_stats['bytes_skipped'] += link['_nbytes']
+                    self._commit_exchange(link, t, pending[i])
+                    continue
+
+            if link['regrid'] is not None:
+                try:
+                    values[i] = link['regrid'](values[i])
+                except:
+                    logger.error('Failed to regrid "%s" to "%s"!' % (link['var_from'],
+                                                                     link['var_to']))
+                    logger.error(traceback.format_exc())
+                    continue
+
+            if link['region'] is not None:
+                region, pending[i]['_region_state'] = self._get_exchange_region(link, values[i])
+                if region is None:
+                    self.exchange_stats['bytes_skipped'] += link['_nbytes']
+                    self._commit_exchange(link, t, pending[i])
+                    continue
+                elif region is not True:
+                    if self._set_exchange_region(link, values[i], *region):
+                        self._commit_exchange(link, t, pending[i])
+                    continue
+
+            self.exchange_stats['bytes_copied'] += link['_nbytes']
+
+            if link['batch_to']:
+                batch.append(i)
+                continue
+
+            try:
+                if link['shared']:
+                    link['wrapper_to'].set_var_shared(link['name_to'], values[i])
+                else:
+                    link['wrapper_to'].set_var(link['name_to'], values[i])
+                self._commit_exchange(link, t, pending[i])
+            except:
+                logger.error('Failed to set "%s" in "%s"!' % (link['name_to'],
+                                                               link['engine_to']))
+                logger.error(traceback.format_exc())
+
+        if len(batch) > 0:
+            names = [links[i]['name_to'] for i in batch]
+            try:
+                self.models[engine]['_wrapper'].set_vars(names,
+                                                         [values[i] for i in batch])
+                for i in batch:
+                    self._commit_exchange(links[i], t, pending[i])
+            except:
+                logger.error('Failed to set "%s" in "%s"!' % ('", "'.join(names),
+                                                               engine))
+                logger.error(traceback.format_exc())
+
+
+    def _commit_exchange(self, link, t, update=None):
+        '''Register successful exchange of exchange item
+
+        Called once the variable is written to the target model
+        engine, or found to be up to date, such that an exchange that
+        failed is retried on the next engine switch. Only then the
+        change counter and the states used by "skip_unchanged" and
+        "region" are stored, see
+        :func:`~windsurf.model.Windsurf._is_unchanged` and
+        :func:`~windsurf.model.Windsurf._get_exchange_region`.
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        t : float
+            current time of target model engine
+        update : dict, optional
+            change counter ("_counter"), state ("_state") and region
+            state ("_region_state") of the exchanged variable and
+            whether the frozen state of an inactive model engine is
+            exported ("_frozen")
+
+        '''
+
+        link['_last'] = t
+
+        if not update:
+            return
+
+        for key in ('_counter', '_frozen'):
+            if update.has_key(key):
+                link[key] = update[key]
+
+        for key in ('_state', '_region_state'):
+            state = update.get(key)
+            if state is None:
+                continue
+            if key == '_state' and link['skip_unchanged'] == 'hash':
+                link[key] = state
+            elif link[key] is not None and \
+                 link[key].shape == state.shape and \
+                 link[key].dtype == state.dtype:
+                link[key][...] = state
+            else:
+                link[key] = np.array(state)
+
+
+    def _interpolate_in_time(self, link, value, t_from, t_to):
+        '''Interpolate exchanged variable to time of target model engine
+
+        Keeps the last two states of the variable in the source model
+        engine and linearly interpolates, or extrapolates, these
+        states to the time of the target model engine. A new state is
+        stored every time the source model engine has advanced in
+        time since the last exchange. As long as only a single state
+        is known, that state is returned. The data type of the
+        variable is preserved. Variables that are not floating point,
+        like masks or counts, are not interpolated and the last state
+        is returned.
+
+        The interpolated variable is returned before it is checked by
+        "skip_unchanged", as the interpolated variable changes with
+        the time of the target model engine even if the source
+        variable does not. It is only found unchanged if the last two
+        states are equal, i.e. the source variable is steady.
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        value : numpy.ndarray
+            current value of variable in source model engine
+        t_from : float
+            current time of source model engine
+        t_to : float
+            current time of target model engine
+
+        Returns
+        -------
+        numpy.ndarray
+            variable at time of target model engine
+
+        '''
+
+        value = np.asarray(value)
+        states = link['_states']
+
+        # store new state, reusing memory of oldest state
+        if len(states) == 0 or states[-1][0] != t_from:
+            if len(states) == 2:
+                t, arr = states.pop(0)
+                if arr.shape == value.shape and arr.dtype == value.dtype:
+                    arr[...] = value
+                else:
+                    arr = np.array(value)
+            else:
+                arr = np.array(value)
+            states.append((t_from, arr))
+
+        if len(states) < 2:
+            return states[-1][1].copy()
+
+        (t0, v0), (t1, v1) = states
+        if t0 == t1 or v0.shape != v1.shape or v0.dtype != v1.dtype or \
+           not np.issubdtype(v1.dtype, np.inexact):
+            return v1.copy()
+
+        value = v0 + (v1 - v0) * ((t_to - t0) / (t1 - t0))
+        return value.astype(v1.dtype, copy=False)
+
+
+    def _accelerate_change(self, link, value):
+        '''Scale change of exchanged variable by morphological acceleration factor
+
+        Keeps the value of the variable in the source model engine
+        and the value written to the target model engine at the last
+        exchange. The target model engine receives its last value plus
+        the change in the source model engine since the last exchange
+        multiplied by the morphological acceleration factor. Only use
+        this option for variables that are not modified by the target
+        model engine, like the bed level of a model engine that does
+        not compute morphology itself. The change is accumulated in
+        double precision, but the value is returned in the data type of
+        the variable in the target model engine.
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        value : numpy.ndarray
+            current value of variable in source model engine
+
+        Returns
+        -------
+        numpy.ndarray
+            value of variable to write to target model engine
+
+        '''
+
+        value = np.asarray(value)
+        state = link['_morfac_state']
+        dtype = link['handle_to'].dtype or value.dtype
+
+        if state is None or state[0].shape != value.shape:
+            link['_morfac_state'] = (np.array(value, dtype=float),
+                                     np.array(value, dtype=float))
+            return value.astype(dtype)
+
+        value_from, value_to = state
+        if self.morfac != 1.:
+            value_to += self.morfac * (value - value_from)
+        else:
+            value_to[...] = value
+        value_from[...] = value
+
+        return value_to.astype(dtype)
+
+
+    def _get_exchange_region(self, link, value):
+        '''Get region of exchanged variable to write to target model engine
+
+        The "region" option of an exchange item is either a fixed
+        region, defined by the start index and length in each
+        dimension, or "changed". In the latter case, the region is the
+        bounding box of all array elements that changed since the last
+        exchange, which requires a copy of the last exchanged variable:
+
+        .. code-block:: json
+
+           {
+               "var_from" : "aeolis.zb",
+               "var_to" : "xbeach.zb",
+               "region" : {
+                   "start" : [0, 200],
+                   "count" : [1, 100]
+               }
+           }
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        value : numpy.ndarray
+            value of variable on grid of target model engine
+
+        The state of the exchange item is not modified. The returned
+        state is stored by
+        :func:`~windsurf.model.Windsurf._commit_exchange` once the
+        variable is written to the target model engine, such that
+        changes that failed to be written are written again.
+
+        Returns
+        -------
+        tuple, True or None
+            start index and length in each dimension of region, True
+            if the entire array should be written or None if nothing
+            changed
+        numpy.ndarray
+            state of the current variable for "changed" regions
+
+        '''
+
+        region = link['region']
+        if region != 'changed':
+            return (region['start'], region['count']), None
+
+        value = np.asarray(value)
+        state = link['_region_state']
+
+        if state is None or state.shape != value.shape or \
+           state.dtype != value.dtype or value.ndim == 0:
+            return True, value
+
+        changed = value != state
+
+        start = []
+        count = []
+        for axis in range(value.ndim):
+            other = tuple([i for i in range(value.ndim) if i != axis])
+            idx = np.where(np.any(changed, axis=other))[0]
+            if len(idx) == 0:
+                return None, None
+            start.append(int(idx[0]))
+            count.append(int(idx[-1] - idx[0] + 1))
+
+        return (start, count), value
+
+
+    def _set_exchange_region(self, link, value, start, count):
+        '''Write region of exchanged variable to target model engine
+
+        The region is passed as contiguous array in the data type of
+        the variable in the target model engine, as model engine
+        libraries ignore the strides of the array.
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        value : numpy.ndarray
+            value of variable on grid of target model engine
+        start : list
+            start index of region in each dimension
+        count : list
+            length of region in each dimension
+
+        Returns
+        -------
+        bool
+            True if the region was written
+
+        '''
+
+        dtype = link['handle_to'].dtype
+        value = np.asarray(value)[tuple([slice(i, i+n) for i, n in zip(start, count)])]
+        value = np.ascontiguousarray(value, dtype=dtype or value.dtype)
+
+        self.exchange_stats['bytes_skipped'] += link['_nbytes'] - value.nbytes
+        self.exchange_stats['bytes_copied'] += value.nbytes
+
+        try:
+            engines.set_var_slice(link['wrapper_to'], link['name_to'],
+                                  start, count, value)
+            return True
+        except:
+            logger.error('Failed to set region of "%s" in "%s"!' % (link['name_to'],
+                                                                     link['engine_to']))
+            logger.error(traceback.format_exc())
+            return False
+
+
+    def _is_unchanged(self, link, value):
+        '''Check if exchanged variable is unchanged since last exchange
+
+        Compares the variable either to a copy of the variable at the
+        last exchange ("compare") or to a hash of the variable at the
+        last exchange ("hash"). Hashing uses less memory, comparing is
+        faster. The state of the exchange item is not modified. The
+        returned state is stored by
+        :func:`~windsurf.model.Windsurf._commit_exchange` once the
+        variable is written to the target model engine.
+
+        Parameters
+        ----------
+        link : dict
+            exchange item from exchange plan
+        value : numpy.ndarray or SharedArray
+            current value of variable
+
+        Returns
+        -------
+        bool
+            True if variable is unchanged
+        numpy.ndarray or tuple
+            state of the current variable, None if unchanged
+
+        '''
+
+        if link['shared']:
+            value = value.array
+        value = np.asarray(value)
+
+        if link['skip_unchanged'] == 'hash':
+            digest = hashlib.sha1(np.ascontiguousarray(value)).digest()
+            state = (value.shape, value.dtype.str, digest)
+            if state == link['_state']:
+                return True, None
+            return False, state
+        else:
+            state = link['_state']
+            if state is not None and state.shape == value.shape and \
+               state.dtype == value.dtype and np.array_equal(state, value):
+                return True, None
+            return False, value
+
+
+    def _compile_exchange_plan(self):
+        '''Compile exchange configuration into exchange plan
+
+        Reads the exchange items validated by
+        :class:`~windsurf.config.WindsurfConfig` once and groups them
+        by target model engine. Each item holds the resolved
+        model engine names, variable names and BMI wrappers, such that
+        :func:`~windsurf.model.Windsurf._exchange_data` does not need
+        to parse the configuration on every engine switch. The order
+        of exchange items in the configuration is preserved. Exchange
+        items between model engines that are both hosted in a worker
+        process are handed over through shared memory. An optional
+        "interval" sets the minimum simulated time between exchanges
+        of an item. An optional "skip_unchanged" ("compare" or "hash")
+        skips exchanges of variables that did not change. Model
+        engines that report change counters for their variables
+        through a ``get_var_counter`` method are not compared, unless
+        the variable is interpolated in time. Only
+        use "skip_unchanged" for variables that are not modified by
+        the target model engine. An optional "regrid" interpolates the
+        variable from the grid of the source model engine to the grid
+        of the target model engine, see
+        :func:`~windsurf.model.Windsurf._compile_regridder`. Set
+        "interpolate" to interpolate the variable to the time of the
+        target model engine, see
+        :func:`~windsurf.model.Windsurf._interpolate_in_time`. Set
+        "region" to only write a fixed or the changed part of the
+        variable to the target model engine, see
+        :func:`~windsurf.model.Windsurf._get_exchange_region`. Set
+        "morfac" to scale the change of a bed variable by the
+        morphological acceleration factor, see
+        :func:`~windsurf.model.Windsurf._accelerate_change`.
+
+        Raises
+        ------
+        ValueError
+            if an exchange item refers to an unknown model engine
+
+        '''
+
+        self._exchange_plan = {}
+        self._exchange_pairs = set()
+        self.exchange_stats = {'bytes_copied' : 0, 'bytes_skipped' : 0}
+
+        for ex in self.config.exchange:
+            engine_from, name_from = self._split_var(ex['var_from'])
+            engine_to, name_to = self._split_var(ex['var_to'])
+
+            for engine in (engine_from, engine_to):
+                if not self.models.has_key(engine):
+                    raise ValueError(
+                        'Unknown model engine "%s" in exchange "%s" to "%s"' % (
+                            engine, ex['var_from'], ex['var_to']))
+
+            link = {
+                'var_from' : ex['var_from'],
+                'var_to' : ex['var_to'],
+                'engine_from' : engine_from,
+                'engine_to' : engine_to,
+                'name_from' : name_from,
+                'name_to' : name_to,
+                'wrapper_from' : self.models[engine_from]['_wrapper'],
+                'wrapper_to' : self.models[engine_to]['_wrapper'],
+                'handle_to' : self.get_var_handle(ex['var_to']),
+                'interval' : ex['interval'],
+                'skip_unchanged' : ex['skip_unchanged'],
+                'interpolate' : ex['interpolate'],
+                'morfac' : ex['morfac'],
+                'region' : ex['region'],
+                '_last' : None,
+                '_states' : [],
+                '_region_state' : None,
+                '_state' : None,
+                '_counter' : None,
+                '_nbytes' : 0,
+                '_frozen' : False,
+                '_morfac_state' : None,
+            }
+
+            # use change counters reported by model engine if supported,
+            # interpolated variables change even if the source does not
+            link['counter'] = bool(ex['skip_unchanged']) and \
+                              not ex['interpolate'] and \
+                              hasattr(link['wrapper_from'], 'get_var_counter')
+
+            # precompute regridding weights
+            link['regrid'] = self._compile_regridder(ex, engine_from, engine_to)
+
+            # hand over arrays between worker processes through shared memory
+            link['shared'] = link['regrid'] is None and \
+                not link['interpolate'] and not link['morfac'] and \
+                link['region'] is None and \
+                isinstance(link['wrapper_from'], engines.EngineProcess) and \
+                isinstance(link['wrapper_to'], engines.EngineProcess)
+
+            # use batched calls if supported
+            link['batch_from'] = not link['shared'] and \
+                                 hasattr(link['wrapper_from'], 'get_vars')
+            link['batch_to'] = not link['shared'] and \
+                               hasattr(link['wrapper_to'], 'set_vars')
+
+            if not self._exchange_plan.has_key(engine_to):
+                self._exchange_plan[engine_to] = []
+            self._exchange_plan[engine_to].append(link)
+            self._exchange_pairs.add((engine_from, engine_to))
+
+            logger.debug('Added exchange "%s" to "%s" to exchange plan' % (
+                ex['var_from'],
+                ex['var_to']))
     
 
-    def _get_engine_maxlag(self):
-        '''Get model engine with maximum lag from current time
+    def _compile_regridder(self, ex, engine_from, engine_to):
+        '''Compile regridding operator for exchange item
+
+        The "regrid" option of an exchange item is either the name of
+        the regridding method or a dictionary with the regridding
+        method and the names of the coordinate variables of both model
+        engines. Coordinates default to the "x" and "y" variables of
+        the model engines:
+
+        .. code-block:: json
+
+           {
+               "var_from" : "xbeach.zb",
+               "var_to" : "cdm.zb",
+               "regrid" : {
+                   "method" : "linear",
+                   "x_from" : "xbeach.x",
+                   "y_from" : "xbeach.y",
+                   "x_to" : "cdm.x",
+                   "y_to" : "cdm.y"
+               }
+           }
+
+        Parameters
+        ----------
+        ex : dict
+            exchange item from configuration
+        engine_from : str
+            name of source model engine
+        engine_to : str
+            name of target model engine
 
         Returns
         -------
-        str
-            name of model engine with larges lag
+        Regridder or None
+            regridding operator, see :class:`~windsurf.regrid.Regridder`
 
         '''
 
-        lag = np.inf
-        engine = None
-        
-        for name, props in self.models.iteritems():
-            if props['_time'] < lag:
-                lag = props['_time']
-                engine = name
+        cfg = ex.get('regrid')
+        if not cfg:
+            return None
+        if not isinstance(cfg, dict):
+            cfg = {'method' : cfg}
+
+        coords = {}
+        for key, engine in [('x_from', engine_from), ('y_from', engine_from),
+                            ('x_to', engine_to), ('y_to', engine_to)]:
+            coords[key] = self.get_var(cfg.get(key, '%s.%s' % (engine, key[0])))
+
+        logger.info('Computing regridding weights for exchange "%s" to "%s"...' % (
+            ex['var_from'],
+            ex['var_to']))
+
+        return regrid.Regridder(method=cfg.get('method', 'linear'), **coords)
+
+
+    def set_morfac(self, morfac):
+        '''Set morphological acceleration factor for all model engines
+
+        The morphological acceleration factor is managed by the
+        coupler, such that all model engines use the same factor. The
+        factor is written to the model engine parameters listed in the
+        "morfac_params" option of the "coupling" section:
+
+        .. code-block:: json
+
+           "coupling" : {
+               "morfac" : 1.0,
+               "morfac_params" : {
+                   "xbeach" : "morfac",
+                   "aeolis" : "accfac"
+               }
+           }
+
+        Bed changes of model engines that do not support morphological
+        acceleration themselves are scaled in the exchange, see
+        :func:`~windsurf.model.Windsurf._accelerate_change`. The
+        morphological time is kept in ``tmorph``, while all model
+        engines keep stepping in hydrodynamic time.
+
+        Parameters
+        ----------
+        morfac : float
+            morphological acceleration factor
+
+        Raises
+        ------
+        ValueError
+            if the factor is not positive
+
+        '''
+
+        morfac = float(morfac)
+        if morfac <= 0.:
+            raise ValueError('Morphological acceleration factor must be positive, got %s' % morfac)
+
+        if morfac == self.morfac:
+            return
+
+        params = self.config.morfac_params
+        names = ['%s.%s' % (engine, name) for engine, name in sorted(params.iteritems())]
+        self.set_vars(names, [np.asarray(morfac)] * len(names))
+
+        if self.morfac is not None:
+            logger.info('Changed morphological acceleration factor from %g to %g' % (
+                self.morfac, morfac))
+
+        self.morfac = morfac
+
+
+    def set_engine_active(self, engine, active=True, constants=None):
+        '''Activate or deactivate model engine
+
+        Inactive model engines are not stepped and data is not
+        exchanged to them. Their time in the coupler is fast-forwarded
+        with the other model engines by an offset to their own clock.
+        BMI offers no way to advance the clock of a model engine
+        without stepping it. Upon reactivation, the clock is therefore
+        set through the time variable given by the "time_var" option
+        of the model engine, such that the model engine reads its own
+        forcing, like tide, waves or wind, for the current time.
+        Model engines without a time variable cannot be reactivated
+        once they lag behind. Data is exchanged
+        from inactive model engines only once after deactivation,
+        passing their frozen state to the other model engines.
+        Optionally, constant values are set for exported variables of
+        the model engine upon deactivation:
+
+        .. code-block:: json
+
+           {
+               "xbeach" : {
+                   "_active" : false,
+                   "_constants" : {
+                       "H" : 0.0
+                   }
+               }
+           }
+
+        Parameters
+        ----------
+        engine : str
+            name of model engine
+        active : bool
+            activate (True) or deactivate (False) model engine
+        constants : dict, optional
+            constant values for variables of model engine to set upon
+            deactivation
+
+        Raises
+        ------
+        ValueError
+            if all model engines would be inactive
+        RuntimeError
+            if the clock of a reactivated model engine cannot be set
+
+        '''
+
+        m = self.models[engine]
+        if m['_active'] == active:
+            return
+
+        if not active:
+            if not any([p['_active'] for name, p in self.models.iteritems()
+                        if name != engine]):
+                raise ValueError('Cannot deactivate engine "%s", no active engine left' % engine)
+
+            for name, value in sorted((constants or {}).iteritems()):
+                current = np.asarray(m['_wrapper'].get_var(name))
+                m['_wrapper'].set_var(name, np.zeros(current.shape, dtype=current.dtype) + value)
+
+            for links in self._exchange_plan.itervalues():
+                for link in links:
+                    if link['engine_from'] == engine:
+                        link['_frozen'] = False
+
+            logger.info('Deactivated engine "%s" at t=%0.2f' % (engine, m['_time']))
+        else:
+            if m['_offset'] != 0.:
+                self._set_engine_time(engine)
+            logger.info('Activated engine "%s" at t=%0.2f' % (engine, m['_time']))
+
+        m['_active'] = active
+        self._scheduler = self._create_scheduler()
+
+
+    def _set_engine_time(self, engine):
+        '''Move clock of model engine forward to its time in the coupler
+
+        Sets the time variable of the model engine, see
+        :func:`~windsurf.model.Windsurf.set_engine_active`, and checks
+        that the model engine reports the new time.
+
+        Parameters
+        ----------
+        engine : str
+            name of model engine
+
+        Raises
+        ------
+        RuntimeError
+            if the model engine has no time variable or does not
+            report the new time
+
+        '''
+
+        m = self.models[engine]
+        time_var = self.config.time_vars.get(engine)
+        if time_var is None:
+            raise RuntimeError(
+                'Cannot reactivate engine "%s", it lags %0.2f behind and has no "time_var" to set its clock' % (
+                    engine, m['_offset']))
 
-        return engine
+        t = m['_wrapper'].get_current_time() + m['_offset']
+        m['_wrapper'].set_var(time_var, np.asarray(t, dtype=float))
+
+        offset = t - m['_wrapper'].get_current_time()
+        if abs(offset) > 1e-6 * max(1., abs(t)):
+            raise RuntimeError(
+                'Engine "%s" did not accept time t=%0.2f through "%s", it reports t=%0.2f' % (
+                    engine, t, time_var, t - offset))
+
+        m['_offset'] = 0.
+        m['_time'] = t
+
+        logger.debug('Set time of engine "%s" to t=%0.2f' % (engine, t))
+
+
+    def _create_scheduler(self):
+        '''Create scheduler for active model engines'''
+
+        return scheduler.create_scheduler(
+            self.config.scheduler,
+            [name for name in self.models.keys() if self.models[name]['_active']],
+            ratio=self.config.ratio)
+
+
+    def _update_engine(self, engine, dt=-1):
+        '''Step single model engine into the future
+
+        Errors are logged rather than raised, such that a failing
+        model engine does not interrupt other model engines that are
+        stepped concurrently.
+
+        Parameters
+        ----------
+        engine : str
+            model engine to step
+        dt : float
+            time step, use -1 for automatic time step
+
+        '''
+
+        try:
+            self.models[engine]['_wrapper'].update(dt)
+        except:
+            logger.error('Failed to update "%s"!' % engine)
+            logger.error(traceback.format_exc())
+
+
+    def _get_engines_independent(self, candidates):
+        '''Get model engines that can be stepped concurrently
+
+        Selects model engines from a group of model engines that are
+        equally eligible to be stepped, in the order in which the
+        scheduler would select them one by one. The selection stops at
+        the first model engine that exchanges data with an engine that
+        is already selected. Exchanging data to all selected engines
+        before stepping them concurrently therefore gives results that
+        are identical to stepping them sequentially.
+
+        Parameters
+        ----------
+        candidates : list
+            names of model engines eligible to be stepped, see
+            :func:`~windsurf.scheduler.Scheduler.next_group`
+
+        Returns
+        -------
+        list
+            names of model engines that can be stepped concurrently
+
+        '''
+
+        selected = []
+        for name in candidates:
+            if any([(name, other) in self._exchange_pairs or
+                    (other, name) in self._exchange_pairs
+                    for other in selected]):
+                break
+            selected.append(name)
+
+        return selected
+
+
+    def _group_vars(self, names):
+        '''Group variable names by model engine
+
+        Groups are cached, such that variable names in a recurring
+        list of names are only resolved once.
+
+        Parameters
+        ----------
+        names : list
+            variable names including model engine prefix
+
+        Returns
+        -------
+        list
+            tuples with name of model engine and a tuple with the
+            positions in the list of names and the variable names
+            without model engine prefix
+
+        '''
+
+        key = tuple(names)
+        if not self._var_groups.has_key(key):
+            groups = {}
+            for i, name in enumerate(names):
+                h = self.get_var_handle(name)
+                if not groups.has_key(h.engine):
+                    groups[h.engine] = ([], [])
+                groups[h.engine][0].append(i)
+                groups[h.engine][1].append(h.name)
+            self._var_groups[key] = sorted(groups.items())
+
+        return self._var_groups[key]
 
 
     def _split_var(self, name):
@@ -745,8 +2025,11 @@ class Windsurf(IBmi):
         contains a dot (.) the left and right side of the dot are
         chosen as the engine and variable name respectively. If the
         original string contains no dot the default engine is chosen
-        for the given variable name. If no default engine is defined
-        for the given variable name a ValueError is raised.
+        for the given variable name, see
+        :func:`~windsurf.variables.build_registry`. If no default
+        engine is defined for the given variable name a ValueError is
+        raised. Use :func:`~windsurf.model.Windsurf.get_var_handle` to
+        resolve a variable name only once.
 
         Parameters
         ----------
@@ -779,30 +2062,14 @@ class Windsurf(IBmi):
 
         parts = name.split('.')
 
-        engine = None
-        name = None
-        
-        if len(parts) == 1:
-            name = parts[0]
-        elif len(parts) == 2:
-            if parts[0] in self.models.keys():
-                engine, name = parts
-            else:
-                name = '.'.join(parts)
-        else:
-            engine = parts[0]
-            name = '.'.join(parts)
+        if len(parts) > 1 and self.models.has_key(parts[0]):
+            return parts[0], '.'.join(parts[1:])
 
+        engine = self._registry.get(name) or self._registry.get(parts[0])
         if engine is None:
-            if name.split('.')[0] in ['Cu', 'Ct', 'supply', 'pickup', 'mass', 'uth',
-                                      'uw', 'uws', 'uwn', 'udir']:
-                engine = 'aeolis'
-            elif name.split('.')[0] in ['zb', 'zs', 'zs0', 'H']:
-                engine = 'xbeach'
-            else:
-                raise ValueError(
-                    'Unknown variable "%s", specify engine using "<engine>.%s"' % (
-                        name, name))
+            raise ValueError(
+                'Unknown variable "%s", specify engine using "<engine>.%s"' % (
+                    name, name))
             
         return engine, name
 
@@ -819,6 +2086,13 @@ class Windsurf(IBmi):
         ------
         value form JSON configuration file or (partial) structure or None if non-existent
 
+        Notes
+        -----
+        Values of the configuration file are immutable and lookups are
+        cached, see :func:`~windsurf.config.WindsurfConfig.get`. Use
+        the compiled values of :class:`~windsurf.config.WindsurfConfig`
+        where possible.
+
         '''
 
         if kwargs.has_key('cfg'):
@@ -827,7 +2101,7 @@ class Windsurf(IBmi):
             cfg = None
             
         if cfg is None:
-            cfg = self.config
+            return self.config.get(*keys)
 
         if len(keys) > 0:
             if cfg.has_key(keys[0]):
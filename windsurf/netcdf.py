@@ -1,8 +1,15 @@
+import Queue
 import netCDF4
 import logging
+import threading
+import numpy as np
 from datetime import datetime
 
 
+# initialize log
+logger = logging.getLogger(__name__)
+
+
 def initialize(ncfile, dimensions, variables=None, attributes=None, crs=None):
     '''Initialize netCDF4 file
 
@@ -29,6 +36,9 @@ def initialize(ncfile, dimensions, variables=None, attributes=None, crs=None):
            }
         }
 
+    Variables may also define their storage settings, see
+    :func:`get_storage_options`.
+
     Parameters
     ----------
     ncfile : str
@@ -200,7 +210,8 @@ def initialize(ncfile, dimensions, variables=None, attributes=None, crs=None):
         if variables is not None:
             for var, props in variables.iteritems():
 
-                nc.createVariable(var, 'float32', props['dimensions'])
+                nc.createVariable(var, 'float32', props['dimensions'],
+                                  **get_storage_options(props, dimensions))
                 nc.variables[var].long_name = var
                 nc.variables[var].standard_name = ''
                 nc.variables[var].units = ''
@@ -271,19 +282,356 @@ def append(ncfile, idx, variables):
 
     try:
         nc = netCDF4.Dataset(ncfile, 'a')
-        nc.variables['time'][idx] = variables['time']
-        for name, value in variables.iteritems():
-            nc.variables[name][idx,...] = value
-
-        nc.variables['time_bounds'][idx,0] \
-            = 0 if idx == 0 else nc.variables['time'][idx]
-        nc.variables['time_bounds'][idx,1] = variables['time']
+        write(nc, idx, variables)
     finally:
         try:
             nc.close()
         except:
             logging.debug('Failed to close netCDF file')
-            
+
+
+def write(nc, idx, variables):
+    '''Write data to open netCDF4 file
+
+    Parameters
+    ----------
+    nc : netCDF4.Dataset
+        netCDF4 dataset opened for writing
+    idx : int
+        time index to write to
+    variables : dict
+        dict with variable names (keys) and data to be
+        appended (values)
+
+    '''
+
+    nc.variables['time'][idx] = variables['time']
+    for name, value in variables.iteritems():
+        nc.variables[name][idx,...] = value
+
+    nc.variables['time_bounds'][idx,0] \
+        = 0 if idx == 0 else nc.variables['time'][idx]
+    nc.variables['time_bounds'][idx,1] = variables['time']
+
+
+class NetCDFWriter:
+    '''Writer of netCDF4 output in a background thread
+
+    Keeps the netCDF4 file open and writes snapshots of the output
+    variables in a background thread, such that the model time loop
+    does not wait for the disk. Snapshots are passed through a
+    bounded queue: the model time loop only waits if the writer falls
+    behind by more than the queue size. Data is flushed to disk every
+    given number of writes, on request and when the writer is closed.
+    Errors in the background thread are raised on the next call to
+    the writer. Snapshots are copied into a pool of at most the queue
+    size plus one preallocated buffers per variable, that are reused
+    once written.
+
+    Examples
+    --------
+    >>> with NetCDFWriter('windsurf.nc') as writer:
+    ...     writer.write(0, {'time' : 0., 'zb' : zb})
+    ...     writer.flush()
+
+    '''
+
+
+    def __init__(self, ncfile, queue_size=4, flush_interval=10, threaded=True):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        ncfile : str
+            path to existing netCDF4 file
+        queue_size : int
+            maximum number of snapshots waiting to be written
+        flush_interval : int
+            number of writes between flushes to disk
+        threaded : bool
+            write in background thread, otherwise write immediately
+
+        '''
+
+        self.ncfile = ncfile
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.threaded = threaded
+
+        self._nc = None
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._writes = 0
+        self._buffers = None # free snapshot buffers
+        self._nbuffers = 0 # number of allocated snapshot buffers
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, errtype, errobj, traceback):
+        self.close()
+
+
+    def open(self):
+        '''Open netCDF4 file and start background thread'''
+
+        self._nc = netCDF4.Dataset(self.ncfile, 'a')
+        self._writes = 0
+        self._set_chunk_cache()
+
+        if self.threaded:
+            self._queue = Queue.Queue(maxsize=self.queue_size)
+            self._buffers = Queue.Queue()
+            self._nbuffers = 0
+            self._thread = threading.Thread(target=self._run, name='netcdf-writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+        logger.debug('Opened netCDF file "%s"' % self.ncfile)
+
+
+    def write(self, idx, variables):
+        '''Write snapshot of output variables
+
+        The variables are copied into a snapshot buffer, such that
+        the caller can reuse its arrays immediately. Waits for a free
+        buffer if all buffers are waiting to be written.
+
+        Parameters
+        ----------
+        idx : int
+            time index to write to
+        variables : dict
+            dict with variable names (keys) and data to be
+            appended (values)
+
+        '''
+
+        if not self.threaded:
+            self._submit(('write', idx, variables))
+            return
+
+        self._check_open()
+        self._check()
+
+        buffers = self._get_buffers()
+        snapshot = {}
+        for name, value in variables.iteritems():
+            value = np.asarray(value)
+            buf = buffers.get(name)
+            if buf is None or buf.shape != value.shape or buf.dtype != value.dtype:
+                buf = buffers[name] = value.copy()
+            else:
+                np.copyto(buf, value)
+            snapshot[name] = buf
+
+        try:
+            self._submit(('write', idx, snapshot, buffers))
+        except:
+            self._buffers.put(buffers)
+            raise
+
+
+    def flush(self):
+        '''Write all waiting snapshots and flush data to disk'''
+        self._submit(('flush',))
+        if self.threaded:
+            self._queue.join()
+            self._check()
+
+
+    def close(self):
+        '''Write all waiting snapshots and close netCDF4 file'''
+
+        if self._nc is None:
+            return
+
+        try:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._check()
+        finally:
+            self._thread = None
+            self._queue = None
+            self._buffers = None
+            try:
+                self._nc.close()
+            except:
+                logger.debug('Failed to close netCDF file')
+            self._nc = None
+
+        logger.debug('Closed netCDF file "%s"' % self.ncfile)
+
+
+    def _submit(self, task):
+        self._check_open()
+        self._check()
+        if self.threaded:
+            self._queue.put(task)
+        else:
+            self._process(task)
+
+
+    def _check_open(self):
+        if self._nc is None:
+            raise IOError('netCDF file "%s" is not open' % self.ncfile)
+
+
+    def _get_buffers(self):
+        '''Return free snapshot buffers, allocating at most queue size plus one'''
+
+        try:
+            return self._buffers.get_nowait()
+        except Queue.Empty:
+            if self._nbuffers < self.queue_size + 1:
+                self._nbuffers += 1
+                return {}
+        return self._buffers.get()
+
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    break
+                if self._error is None:
+                    self._process(task)
+            except Exception as e:
+                logger.error('Failed to write netCDF file "%s": %s' % (self.ncfile, e))
+                self._error = e
+            finally:
+                if task is not None and task[0] == 'write':
+                    self._buffers.put(task[3])
+                self._queue.task_done()
+
+
+    def _process(self, task):
+        if task[0] == 'write':
+            write(self._nc, task[1], task[2])
+            self._writes += 1
+            if self.flush_interval and self._writes % self.flush_interval == 0:
+                self._nc.sync()
+        elif task[0] == 'flush':
+            self._nc.sync()
+
+
+    def _set_chunk_cache(self):
+        '''Size chunk caches to hold all chunks of a single time step
+
+        Chunks spanning multiple time steps are written partially in
+        each time step. Unless all chunks touched by a time step fit
+        in the cache, they are compressed and decompressed in every
+        time step.
+
+        '''
+
+        for var in self._nc.variables.itervalues():
+            chunks = var.chunking()
+            if chunks == 'contiguous' or len(var.dimensions) == 0 or \
+               var.dimensions[0] != 'time' or chunks[0] <= 1:
+                continue
+            n = np.prod([int(np.ceil(float(s) / c)) for s, c in zip(var.shape[1:], chunks[1:])])
+            size = n * np.prod(chunks) * var.dtype.itemsize
+            size0, nelems0, preemption0 = var.get_var_chunk_cache()
+            if size > size0:
+                var.set_var_chunk_cache(size=int(size), nelems=max(nelems0, 2 * int(n) + 1),
+                                        preemption=preemption0)
+
+
+def get_storage_options(props, dimensions):
+    '''Return storage options for netCDF4 variable
+
+    Compression is set through "zlib", "complevel" and "shuffle".
+    Values are quantized to a number of decimals through
+    "least_significant_digit". Chunk shapes are set explicitly through
+    "chunksizes" or derived from the access pattern through
+    "chunking", see :func:`get_chunksizes`. Settings that are not
+    given are left to the netCDF4 library.
+
+    Parameters
+    ----------
+    props : dict
+        variable specification with dimensions and storage settings
+    dimensions : dict
+        dict with dimension variables x, y, layers and fractions
+
+    Returns
+    -------
+    dict
+        keyword arguments for ``netCDF4.Dataset.createVariable``
+
+    '''
+
+    options = {}
+    for key in ['zlib', 'complevel', 'shuffle', 'least_significant_digit']:
+        if props.has_key(key):
+            options[key] = props[key]
+
+    if props.get('chunksizes') is not None:
+        options['chunksizes'] = tuple(props['chunksizes'])
+    elif props.get('chunking') is not None:
+        sizes = {k : len(v) for k, v in dimensions.iteritems()}
+        options['chunksizes'] = get_chunksizes(props['dimensions'], sizes,
+                                               chunking=props['chunking'],
+                                               time_chunk=props.get('time_chunk', 256))
+
+    return options
+
+
+def get_chunksizes(dims, sizes, chunking='map', time_chunk=256, chunk_bytes=2**20):
+    '''Return chunk shape for access pattern
+
+    Chunks for reading maps hold a single time step of the entire
+    domain. Chunks for reading timeseries hold a number of time steps
+    of part of the domain. The spatial extent of these chunks is
+    halved until a chunk of float32 values fits the given size.
+
+    Parameters
+    ----------
+    dims : tuple
+        dimension names of variable
+    sizes : dict
+        sizes of dimensions other than time
+    chunking : str
+        access pattern: "map" or "timeseries"
+    time_chunk : int
+        number of time steps per chunk ("timeseries")
+    chunk_bytes : int
+        maximum size of a chunk in bytes ("timeseries")
+
+    Returns
+    -------
+    tuple
+        chunk shape
+
+    '''
+
+    if chunking == 'map':
+        return tuple([1 if d == 'time' else sizes[d] for d in dims])
+    elif chunking == 'timeseries':
+        chunks = {d : time_chunk if d == 'time' else sizes[d] for d in dims}
+        while np.prod(chunks.values()) * 4 > chunk_bytes:
+            spatial = [d for d in ['y', 'x'] if chunks.has_key(d) and chunks[d] > 1]
+            if len(spatial) == 0:
+                break
+            d = max(spatial, key=lambda d: chunks[d])
+            chunks[d] = (chunks[d] + 1) // 2
+        return tuple([chunks[d] for d in dims])
+    else:
+        raise ValueError('Unknown chunking "%s", use "map" or "timeseries"' % chunking)
+
 
 def set_ncattr(nc, key, value):
     '''Set netCDF4 attribute safe for boolean values
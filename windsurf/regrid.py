@@ -0,0 +1,327 @@
+import logging
+import numpy as np
+import scipy.sparse
+import scipy.spatial
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+class Regridder:
+    '''Interpolation operator between two model engine grids
+
+    Precomputes the interpolation weights between two grids once and
+    stores them as sparse matrix, such that regridding an array is a
+    single sparse matrix-vector product. Grids are given by the
+    coordinates of their grid points. Arrays may have trailing
+    dimensions (e.g. sediment fractions) that are regridded
+    independently.
+
+    The following methods are supported:
+
+    - ``linear``: linear interpolation along a profile or barycentric
+      interpolation on a Delaunay triangulation of a 2D grid. Target
+      points outside the source grid get the value of the nearest
+      source point.
+    - ``nearest``: nearest neighbour interpolation.
+    - ``conservative``: area-weighted averaging over overlapping grid
+      cells of rectilinear grids. The integral over the domain, like
+      the total sediment mass, is conserved where the source grid
+      covers the target grid.
+
+    If all source points are on a single line in cross-shore or
+    alongshore direction, like in a profile model, the source grid is
+    considered one-dimensional and values are repeated along the other
+    dimension of the target grid.
+
+    '''
+
+
+    methods = ['linear', 'nearest', 'conservative']
+
+
+    def __init__(self, x_from, y_from, x_to, y_to, method='linear'):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        x_from, y_from : numpy.ndarray
+            coordinates of source grid
+        x_to, y_to : numpy.ndarray
+            coordinates of target grid
+        method : str
+            interpolation method
+
+        '''
+
+        if method not in self.methods:
+            raise ValueError('Unknown regridding method "%s", use one of: %s' % (
+                method, ', '.join(self.methods)))
+
+        x_from = np.asarray(x_from, dtype=float)
+        y_from = np.asarray(y_from, dtype=float)
+        x_to = np.asarray(x_to, dtype=float)
+        y_to = np.asarray(y_to, dtype=float)
+
+        self.method = method
+        self.shape_from = x_from.shape
+        self.shape_to = x_to.shape
+
+        if method == 'conservative':
+            self.matrix = conservative_weights(x_from, y_from, x_to, y_to)
+        else:
+            # remove degenerate dimensions from source grid
+            p_from = []
+            p_to = []
+            for c_from, c_to in [(x_from, x_to), (y_from, y_to)]:
+                if np.ptp(c_from) > 0.:
+                    p_from.append(c_from.ravel())
+                    p_to.append(c_to.ravel())
+
+            if len(p_from) == 0:
+                self.matrix = scipy.sparse.csr_matrix(
+                    np.ones((x_to.size, x_from.size)) / x_from.size)
+            elif method == 'linear' and len(p_from) == 1:
+                self.matrix = linear_weights_1d(p_from[0], p_to[0])
+            elif method == 'linear':
+                self.matrix = linear_weights_2d(np.column_stack(p_from),
+                                                np.column_stack(p_to))
+            else:
+                self.matrix = nearest_weights(np.column_stack(p_from),
+                                              np.column_stack(p_to))
+
+        logger.debug('Computed %s regridding weights from %s to %s grid (%d non-zeros)' % (
+            method, self.shape_from, self.shape_to, self.matrix.nnz))
+
+
+    def __call__(self, value):
+        '''Regrid array
+
+        Parameters
+        ----------
+        value : numpy.ndarray
+            array on source grid
+
+        Returns
+        -------
+        numpy.ndarray
+            array on target grid
+
+        '''
+
+        value = np.asarray(value)
+        n = len(self.shape_from)
+        result = self.matrix.dot(value.reshape((self.matrix.shape[1], -1)))
+        return result.reshape(self.shape_to + value.shape[n:])
+
+
+def linear_weights_1d(x_from, x_to):
+    '''Compute linear interpolation weights along a single dimension
+
+    Target points outside the source range get the value of the
+    nearest end point, like :func:`numpy.interp`.
+
+    Parameters
+    ----------
+    x_from : numpy.ndarray
+        1D array with source coordinates
+    x_to : numpy.ndarray
+        1D array with target coordinates
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        interpolation weights
+
+    '''
+
+    n_from = len(x_from)
+    n_to = len(x_to)
+
+    order = np.argsort(x_from, kind='mergesort')
+    xs = x_from[order]
+
+    if n_from == 1:
+        return scipy.sparse.csr_matrix(np.ones((n_to, 1)))
+
+    i1 = np.clip(np.searchsorted(xs, x_to), 1, n_from - 1)
+    i0 = i1 - 1
+    dx = xs[i1] - xs[i0]
+    dx[dx == 0.] = 1.
+    w1 = np.clip((x_to - xs[i0]) / dx, 0., 1.)
+
+    rows = np.concatenate((np.arange(n_to), np.arange(n_to)))
+    cols = np.concatenate((order[i0], order[i1]))
+    data = np.concatenate((1. - w1, w1))
+
+    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n_to, n_from)).tocsr()
+
+
+def linear_weights_2d(p_from, p_to):
+    '''Compute barycentric interpolation weights on a Delaunay triangulation
+
+    Target points outside the triangulation get the value of the
+    nearest source point.
+
+    Parameters
+    ----------
+    p_from : numpy.ndarray
+        source points (n x 2)
+    p_to : numpy.ndarray
+        target points (m x 2)
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        interpolation weights
+
+    '''
+
+    n_from = p_from.shape[0]
+    n_to = p_to.shape[0]
+
+    tri = scipy.spatial.Delaunay(p_from)
+    simplex = tri.find_simplex(p_to)
+    inside = simplex >= 0
+
+    T = tri.transform[simplex[inside]]
+    b = np.einsum('ijk,ik->ij', T[:,:2,:], p_to[inside] - T[:,2,:])
+    b = np.column_stack((b, 1. - b.sum(axis=1)))
+
+    rows = np.repeat(np.where(inside)[0], 3)
+    cols = tri.simplices[simplex[inside]].ravel()
+    data = b.ravel()
+
+    # nearest neighbour outside triangulation
+    outside = np.where(~inside)[0]
+    if len(outside) > 0:
+        _, nearest = scipy.spatial.cKDTree(p_from).query(p_to[outside])
+        rows = np.concatenate((rows, outside))
+        cols = np.concatenate((cols, nearest))
+        data = np.concatenate((data, np.ones(len(outside))))
+
+    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n_to, n_from)).tocsr()
+
+
+def nearest_weights(p_from, p_to):
+    '''Compute nearest neighbour interpolation weights
+
+    Parameters
+    ----------
+    p_from : numpy.ndarray
+        source points (n x d)
+    p_to : numpy.ndarray
+        target points (m x d)
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        interpolation weights
+
+    '''
+
+    n_from = p_from.shape[0]
+    n_to = p_to.shape[0]
+
+    _, nearest = scipy.spatial.cKDTree(p_from).query(p_to)
+
+    return scipy.sparse.coo_matrix((np.ones(n_to), (np.arange(n_to), nearest)),
+                                   shape=(n_to, n_from)).tocsr()
+
+
+def conservative_weights(x_from, y_from, x_to, y_to):
+    '''Compute conservative remapping weights between rectilinear grids
+
+    Grids are 2D arrays with the cross-shore coordinate varying along
+    the columns and the alongshore coordinate varying along the
+    rows. Cell edges are located halfway between grid points.
+
+    Parameters
+    ----------
+    x_from, y_from : numpy.ndarray
+        coordinates of source grid
+    x_to, y_to : numpy.ndarray
+        coordinates of target grid
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        remapping weights
+
+    '''
+
+    x_from = np.atleast_2d(x_from)
+    y_from = np.atleast_2d(y_from)
+    x_to = np.atleast_2d(x_to)
+    y_to = np.atleast_2d(y_to)
+
+    Wx = overlap_weights_1d(x_from[0,:], x_to[0,:])
+    Wy = overlap_weights_1d(y_from[:,0], y_to[:,0])
+
+    return scipy.sparse.kron(Wy, Wx).tocsr()
+
+
+def overlap_weights_1d(c_from, c_to):
+    '''Compute fractions of overlap between grid cells along a single dimension
+
+    Each target cell gets the length-weighted average of the
+    overlapping source cells. Target cells that do not overlap with
+    any source cell get the value of the nearest source cell. If the
+    source grid consists of a single cell, its value is used for all
+    target cells.
+
+    Parameters
+    ----------
+    c_from : numpy.ndarray
+        1D array with source grid point coordinates
+    c_to : numpy.ndarray
+        1D array with target grid point coordinates
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        overlap weights
+
+    '''
+
+    n_from = len(c_from)
+    n_to = len(c_to)
+
+    if n_from == 1:
+        return scipy.sparse.csr_matrix(np.ones((n_to, 1)))
+
+    order = np.argsort(c_from, kind='mergesort')
+    e_from = cell_edges(c_from[order])
+    e_to = cell_edges(np.sort(c_to)) if n_to > 1 else np.asarray([-np.inf, np.inf])
+    rank_to = np.argsort(np.argsort(c_to, kind='mergesort'), kind='mergesort')
+
+    rows = []
+    cols = []
+    data = []
+
+    for i in range(n_to):
+        a, b = e_to[rank_to[i]], e_to[rank_to[i] + 1]
+        j0 = max(0, np.searchsorted(e_from, a, side='right') - 1)
+        j1 = min(n_from, np.searchsorted(e_from, b, side='left'))
+        j = np.arange(j0, j1)
+        overlap = np.minimum(b, e_from[j+1]) - np.maximum(a, e_from[j])
+        mask = overlap > 0.
+        if np.any(mask):
+            rows.extend([i] * mask.sum())
+            cols.extend(order[j[mask]])
+            data.extend(overlap[mask] / overlap[mask].sum())
+        else:
+            rows.append(i)
+            cols.append(order[np.argmin(np.abs(c_from[order] - c_to[i]))])
+            data.append(1.)
+
+    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n_to, n_from)).tocsr()
+
+
+def cell_edges(c):
+    '''Return cell edges halfway between sorted grid point coordinates'''
+
+    c = np.asarray(c, dtype=float)
+    mid = (c[1:] + c[:-1]) / 2.
+    return np.concatenate(([c[0] - (mid[0] - c[0])], mid, [c[-1] + (c[-1] - mid[-1])]))
@@ -0,0 +1,406 @@
+'''Remote model engines
+
+Model engines can be hosted by a server process on another node, see
+:func:`serve`, and coupled through a :class:`RemoteEngine` proxy.
+Coupler and server communicate through a binary message protocol.
+Each message is a frame consisting of an 8-byte unsigned integer
+holding the payload size followed by the payload. The payload is a
+sequence of values, each starting with a single-byte type tag:
+
+=====  ===========================================================
+tag    value
+=====  ===========================================================
+``N``  None
+``b``  boolean (1 byte)
+``i``  integer (8 bytes)
+``f``  float (8 bytes)
+``s``  string (4-byte length, UTF-8 data)
+``a``  array (dtype string, 1-byte rank, 8 bytes per dimension,
+       C-ordered raw data)
+``l``  list (4-byte length, values)
+=====  ===========================================================
+
+A request holds the method name followed by its arguments. A
+response holds a boolean success flag followed by either the return
+value or the error message.
+
+'''
+
+import os
+import time
+import socket
+import struct
+import logging
+import threading
+import traceback
+import numpy as np
+
+import engines
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+HEADER = struct.Struct('!Q')
+
+
+def parse_address(address):
+    '''Parse socket address
+
+    Parameters
+    ----------
+    address : str
+        socket address, either ``tcp://<host>:<port>`` or
+        ``unix://<path>``
+
+    Returns
+    -------
+    int
+        socket address family
+    tuple or str
+        socket address
+
+    Raises
+    ------
+    ValueError
+        if the address cannot be parsed
+
+    '''
+
+    if address.startswith('tcp://'):
+        host, port = address[6:].rsplit(':', 1)
+        return socket.AF_INET, (host or '0.0.0.0', int(port))
+    elif address.startswith('unix://'):
+        return socket.AF_UNIX, address[7:]
+    else:
+        raise ValueError('Invalid address "%s", use "tcp://<host>:<port>" or "unix://<path>"' % address)
+
+
+def pack(value, chunks):
+    '''Pack value into list of binary chunks
+
+    Array data is appended as buffer to prevent copying.
+
+    Parameters
+    ----------
+    value : None, bool, int, float, str, list or numpy.ndarray
+        value to pack
+    chunks : list
+        list of binary chunks to append to
+
+    '''
+
+    if value is None:
+        chunks.append('N')
+    elif isinstance(value, (bool, np.bool_)):
+        chunks.append('b' + struct.pack('!?', value))
+    elif isinstance(value, (int, long, np.integer)):
+        chunks.append('i' + struct.pack('!q', value))
+    elif isinstance(value, (float, np.floating)):
+        chunks.append('f' + struct.pack('!d', value))
+    elif isinstance(value, basestring):
+        value = value.encode('utf-8')
+        chunks.append('s' + struct.pack('!I', len(value)))
+        chunks.append(value)
+    elif isinstance(value, (list, tuple)):
+        chunks.append('l' + struct.pack('!I', len(value)))
+        for v in value:
+            pack(v, chunks)
+    else:
+        value = np.asarray(value, order='C')
+        if value.dtype.hasobject:
+            raise TypeError('Cannot pack value of type "%s"' % type(value))
+        dtype = value.dtype.str
+        chunks.append('a' + struct.pack('!B%dsB%dq' % (len(dtype), value.ndim),
+                                        len(dtype), dtype, value.ndim, *value.shape))
+        chunks.append(buffer(value))
+
+
+def unpack(data, offset=0):
+    '''Unpack value from binary data
+
+    Arrays are returned as writable views on the data.
+
+    Parameters
+    ----------
+    data : bytearray
+        binary data
+    offset : int
+        offset of value in data
+
+    Returns
+    -------
+    any
+        unpacked value
+    int
+        offset of next value in data
+
+    '''
+
+    tag = chr(data[offset])
+    offset += 1
+
+    if tag == 'N':
+        return None, offset
+    elif tag == 'b':
+        return struct.unpack_from('!?', data, offset)[0], offset + 1
+    elif tag == 'i':
+        return struct.unpack_from('!q', data, offset)[0], offset + 8
+    elif tag == 'f':
+        return struct.unpack_from('!d', data, offset)[0], offset + 8
+    elif tag == 's':
+        n, = struct.unpack_from('!I', data, offset)
+        offset += 4
+        return str(data[offset:offset+n]), offset + n
+    elif tag == 'l':
+        n, = struct.unpack_from('!I', data, offset)
+        offset += 4
+        values = []
+        for i in range(n):
+            value, offset = unpack(data, offset)
+            values.append(value)
+        return values, offset
+    elif tag == 'a':
+        n, = struct.unpack_from('!B', data, offset)
+        dtype, ndim = struct.unpack_from('!%dsB' % n, data, offset + 1)
+        offset += n + 2
+        shape = struct.unpack_from('!%dq' % ndim, data, offset)
+        offset += 8 * ndim
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        value = np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return value, offset + count * dtype.itemsize
+    else:
+        raise ValueError('Invalid type tag "%s"' % tag)
+
+
+def send_message(sock, values):
+    '''Send sequence of values as single frame
+
+    Parameters
+    ----------
+    sock : socket.socket
+        connected socket
+    values : list
+        values to send
+
+    '''
+
+    chunks = []
+    for value in values:
+        pack(value, chunks)
+
+    sock.sendall(HEADER.pack(sum([len(c) for c in chunks])))
+    for chunk in chunks:
+        sock.sendall(chunk)
+
+
+def recv_message(sock):
+    '''Receive single frame as sequence of values
+
+    Parameters
+    ----------
+    sock : socket.socket
+        connected socket
+
+    Returns
+    -------
+    list
+        received values
+
+    Raises
+    ------
+    EOFError
+        if the connection is closed
+
+    '''
+
+    n, = HEADER.unpack(str(_recv_exact(sock, HEADER.size)))
+    data = _recv_exact(sock, n)
+
+    values = []
+    offset = 0
+    while offset < n:
+        value, offset = unpack(data, offset)
+        values.append(value)
+
+    return values
+
+
+def _recv_exact(sock, n):
+    '''Receive exactly n bytes into bytearray'''
+
+    data = bytearray(n)
+    view = memoryview(data)
+    while n > 0:
+        m = sock.recv_into(view, n)
+        if m == 0:
+            raise EOFError('Connection closed')
+        view = view[m:]
+        n -= m
+    return data
+
+
+class RemoteEngine(engines.EngineProxy):
+    '''BMI proxy for a model engine hosted by a remote server
+
+    Connects to a model engine server started with :func:`serve`,
+    for example through the ``windsurf-engine`` command, that may run
+    on another node. BMI calls, including the batched calls
+    :func:`~windsurf.engines.EngineProxy.get_vars` and
+    :func:`~windsurf.engines.EngineProxy.set_vars`, are forwarded
+    over a TCP or Unix socket.
+
+    '''
+
+
+    def __init__(self, address, name=None, timeout=60.):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        address : str
+            server address, either ``tcp://<host>:<port>`` or
+            ``unix://<path>``
+        name : str
+            name of model engine in coupler, used for logging
+        timeout : float
+            time to wait for the server to become available
+
+        '''
+
+        self.name = name or address
+        self.address = address
+        self._lock = threading.Lock()
+
+        family, addr = parse_address(address)
+
+        t0 = time.time()
+        while True:
+            self._sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                self._sock.connect(addr)
+                break
+            except socket.error:
+                self._sock.close()
+                if time.time() - t0 > timeout:
+                    raise RuntimeError('Failed to connect to engine "%s" at "%s"' % (
+                        self.name, address))
+                time.sleep(.1)
+
+        if family == socket.AF_INET:
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        logger.debug('Connected to engine "%s" at "%s"' % (self.name, address))
+
+
+    def _call(self, method, *args):
+        '''Forward call to remote server
+
+        Parameters
+        ----------
+        method : str
+            name of method to call on the model engine
+
+        Returns
+        -------
+        any
+            return value of method
+
+        Raises
+        ------
+        RuntimeError
+            if the method failed on the server or if the connection
+            is lost
+
+        '''
+
+        with self._lock:
+            try:
+                send_message(self._sock, [method] + list(args))
+                success, result = recv_message(self._sock)
+            except (EOFError, socket.error):
+                raise RuntimeError('Lost connection to engine "%s" at "%s"' % (
+                    self.name, self.address))
+
+        if not success:
+            raise RuntimeError('Call "%s" failed in engine "%s":\n%s' % (
+                method, self.name, result))
+
+        return result
+
+
+    def finalize(self):
+        '''Finalize model engine and close connection'''
+
+        try:
+            return self._call('finalize')
+        finally:
+            self._sock.close()
+
+
+def serve(address, engine, configfile='', engine_path=None):
+    '''Host model engine for a remote coupler
+
+    Loads the model engine and waits for a single coupler to
+    connect. Executes calls received from the coupler until the
+    model engine is finalized or the connection is closed.
+
+    Parameters
+    ----------
+    address : str
+        address to listen on, either ``tcp://<host>:<port>`` or
+        ``unix://<path>``
+    engine : str
+        name of model engine library or reference to Python class
+    configfile : str
+        path to model engine configuration file
+    engine_path : str
+        absolute path to directory containing the model engine library
+
+    '''
+
+    wrapper = engines.load_engine(engine, configfile, engine_path)
+
+    family, addr = parse_address(address)
+
+    server = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_INET:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(addr)
+    server.listen(1)
+
+    logger.info('Serving engine "%s" at "%s"' % (engine, address))
+
+    try:
+        conn, client = server.accept()
+        if family == socket.AF_INET:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        logger.info('Accepted connection from "%s"' % str(client))
+
+        try:
+            while True:
+                try:
+                    message = recv_message(conn)
+                except EOFError:
+                    logger.warning('Connection closed before engine was finalized')
+                    break
+
+                method, args = message[0], message[1:]
+
+                try:
+                    result = engines.dispatch(wrapper, method, args)
+                    send_message(conn, [True, result])
+                except:
+                    send_message(conn, [False, traceback.format_exc()])
+
+                if method == 'finalize':
+                    break
+        finally:
+            conn.close()
+    finally:
+        server.close()
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.remove(addr)
@@ -0,0 +1,250 @@
+import heapq
+import logging
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    '''Model engine scheduler base class
+
+    Base class for schedulers that determine the order in which
+    model engines are stepped within a single call to
+    :func:`~windsurf.model.Windsurf.update`. The base class keeps
+    track of the engine times and the target time incrementally. The
+    target time is set to the maximum engine time as soon as all
+    model engines are stepped at least once. The update is done when
+    all model engines have reached the target time.
+
+    '''
+
+
+    def __init__(self, engines, **kwargs):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        engines : list
+            names of model engines, the order is used to break ties
+
+        '''
+
+        self.engines = list(engines)
+        self.order = {e:i for i, e in enumerate(self.engines)}
+        self.times = {}
+        self.target_time = None
+
+
+    def start(self, times):
+        '''Start scheduling of a single update
+
+        Parameters
+        ----------
+        times : dict
+            current time of each model engine
+
+        '''
+
+        self.times = dict(times)
+        self.target_time = None
+        self._pending = set(self.engines) # engines not yet stepped
+        self._below = 0 # number of engines below target time
+
+
+    def next(self):
+        '''Return name of model engine to step next'''
+        raise NotImplementedError
+
+
+    def next_group(self):
+        '''Return names of model engines that are equally eligible to be stepped next
+
+        The first model engine is the one returned by
+        :func:`~windsurf.scheduler.Scheduler.next`. The other model
+        engines are the ones that would be selected next if the first
+        one is stepped.
+
+        '''
+
+        return [self.next()]
+
+
+    def advance(self, engine, time):
+        '''Register new time of a stepped model engine
+
+        Parameters
+        ----------
+        engine : str
+            name of stepped model engine
+        time : float
+            new time of model engine
+
+        '''
+
+        if self.target_time is not None and \
+           self.times[engine] < self.target_time and time >= self.target_time:
+            self._below -= 1
+
+        self.times[engine] = time
+
+        # determine target time step after first update
+        if self.target_time is None:
+            self._pending.discard(engine)
+            if len(self._pending) == 0:
+                self.target_time = max(self.times.itervalues())
+                self._below = len([t for t in self.times.itervalues()
+                                   if t < self.target_time])
+                logger.debug('Set target time step to t=%0.2f' % self.target_time)
+
+
+    def done(self):
+        '''Return True if all model engines reached the target time'''
+        return self.target_time is not None and self._below == 0
+
+
+class MaxLagScheduler(Scheduler):
+    '''Scheduler that steps the model engine with maximum lag
+
+    Model engine times are kept in a heap, such that the model engine
+    with maximum lag is found without scanning all model engines.
+
+    '''
+
+
+    def start(self, times):
+        Scheduler.start(self, times)
+        self._heap = [(self.times[e], i, e) for i, e in enumerate(self.engines)]
+        heapq.heapify(self._heap)
+
+
+    def next(self):
+        return self._heap[0][2]
+
+
+    def next_group(self):
+        t = self._heap[0][0]
+        return [e for _, _, e in sorted([x for x in self._heap if x[0] == t])]
+
+
+    def advance(self, engine, time):
+        Scheduler.advance(self, engine, time)
+        item = (time, self.order[engine], engine)
+        if self._heap[0][2] == engine:
+            heapq.heapreplace(self._heap, item)
+        else:
+            self._heap = [x for x in self._heap if x[2] != engine] + [item]
+            heapq.heapify(self._heap)
+
+
+class RoundRobinScheduler(Scheduler):
+    '''Scheduler that steps the model engines in turn
+
+    Model engines that reached the target time are skipped.
+
+    '''
+
+
+    def start(self, times):
+        Scheduler.start(self, times)
+        self._i = 0
+
+
+    def next(self):
+        n = len(self.engines)
+        for i in range(n):
+            engine = self.engines[(self._i + i) % n]
+            if self.target_time is None or self.times[engine] < self.target_time:
+                return engine
+
+
+    def advance(self, engine, time):
+        Scheduler.advance(self, engine, time)
+        self._i = (self.order[engine] + 1) % len(self.engines)
+
+
+class FixedRatioScheduler(Scheduler):
+    '''Scheduler that steps the model engines a fixed number of times
+
+    Each update steps every model engine a fixed number of times,
+    according to the given ratio (default: 1). Within an update, the
+    model engine with maximum lag among the ones that did not reach
+    their number of steps is stepped first. The update is done when
+    all model engines reached their number of steps.
+
+    '''
+
+
+    def __init__(self, engines, ratio=None, **kwargs):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        engines : list
+            names of model engines, the order is used to break ties
+        ratio : dict
+            number of steps per update for each model engine
+
+        '''
+
+        Scheduler.__init__(self, engines)
+        self.ratio = {e:int((ratio or {}).get(e, 1)) for e in self.engines}
+
+
+    def start(self, times):
+        Scheduler.start(self, times)
+        self._remaining = dict(self.ratio)
+        self._steps = sum(self._remaining.itervalues())
+
+
+    def next(self):
+        return min([(self.times[e], i, e) for i, e in enumerate(self.engines)
+                    if self._remaining[e] > 0])[2]
+
+
+    def advance(self, engine, time):
+        Scheduler.advance(self, engine, time)
+        self._remaining[engine] -= 1
+        self._steps -= 1
+
+
+    def done(self):
+        return self._steps <= 0
+
+
+SCHEDULERS = {
+    'maxlag' : MaxLagScheduler,
+    'roundrobin' : RoundRobinScheduler,
+    'ratio' : FixedRatioScheduler,
+}
+
+
+def create_scheduler(policy, engines, **kwargs):
+    '''Create scheduler for given policy
+
+    Parameters
+    ----------
+    policy : str
+        scheduling policy (maxlag, roundrobin or ratio)
+    engines : list
+        names of model engines
+    kwargs : dict
+        policy specific options (e.g. ``ratio``)
+
+    Returns
+    -------
+    Scheduler
+        scheduler object
+
+    Raises
+    ------
+    ValueError
+        if the policy is unknown
+
+    '''
+
+    if not SCHEDULERS.has_key(policy):
+        raise ValueError('Unknown scheduler "%s", use one of: %s' % (
+            policy, ', '.join(sorted(SCHEDULERS.keys()))))
+
+    return SCHEDULERS[policy](engines, **kwargs)
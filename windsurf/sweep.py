@@ -0,0 +1,218 @@
+'''Batch scenario generation
+
+Derives scenarios for a grid of storm thresholds and intervals from a
+single forcing timeseries, for example to calibrate the storm
+threshold. Peaks are determined once and troughs once per interval,
+such that all scenarios are derived from a shared precomputation.
+Scenarios are derived in parallel and written to a separate Windsurf
+configuration file each.
+
+'''
+
+import os
+import shutil
+import logging
+import itertools
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+from configurator import WindsurfScenario, get_peaks, get_troughs
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+class ScenarioSweep:
+    '''Generator of scenarios for a grid of thresholds and intervals
+
+    Examples
+    --------
+    >>> sweep = ScenarioSweep(t, hs, thresholds=[1.5, 2., 2.5],
+    ...                       intervals=[3600.*24, 3600.*35])
+    >>> stats = sweep.write('sweep', configfile='windsurf.json')
+
+    '''
+
+
+    def __init__(self, t, y, thresholds, intervals=None, time=None,
+                 regimes=None, workers=None):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        t : numpy.ndarray
+            time axis of forcing timeseries
+        y : numpy.ndarray
+            forcing timeseries (e.g. wind speed or wave height)
+        thresholds : list
+            storm thresholds
+        intervals : list, optional
+            minimum durations of calm stretches in seconds (default:
+            35 hours)
+        time : numpy.ndarray, optional
+            time axis of scenarios (default: time axis of forcing
+            timeseries)
+        regimes : list, optional
+            names of calm and storm regime (default: calm, storm)
+        workers : int, optional
+            number of threads (default: number of cores)
+
+        '''
+
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.thresholds = sorted(thresholds)
+        self.intervals = sorted(intervals or [3600.*35])
+        self.time = self.t if time is None else np.asarray(time, dtype=float)
+        self.regimes = regimes or ['calm', 'storm']
+        self.workers = workers
+
+        # peaks above lowest threshold
+        self.peaks = get_peaks(self.y, threshold=self.thresholds[0])
+
+        self._troughs = {}
+
+
+    def get_troughs(self, interval):
+        '''Return troughs around all peaks for given interval'''
+
+        if not self._troughs.has_key(interval):
+            self._troughs[interval] = get_troughs(self.t, self.y, self.peaks, interval)
+        return self._troughs[interval]
+
+
+    def get_scenario(self, threshold, interval):
+        '''Return scenario for given threshold and interval
+
+        Parameters
+        ----------
+        threshold : float
+            storm threshold
+        interval : float
+            minimum duration of calm stretches in seconds
+
+        Returns
+        -------
+        WindsurfScenario
+            scenario with calm and storm regime
+
+        '''
+
+        calm, storm = self.regimes
+
+        # troughs around peaks above threshold
+        keep = np.repeat(self.y[self.peaks] >= threshold, 2)
+        troughs = self.get_troughs(interval)[keep]
+
+        scenario = WindsurfScenario(time=self.time, interval=interval)
+        scenario.add_regime(calm)
+        scenario.add_regime(storm)
+        scenario.add_troughs(self.t, troughs)
+
+        return scenario
+
+
+    def get_stats(self, scenario, threshold, interval):
+        '''Return statistics of scenario
+
+        Returns
+        -------
+        dict
+            threshold, interval, number of storms, storm hours and
+            fraction of time in storms
+
+        '''
+
+        storm = scenario.get_mask(self.regimes[1])
+        dt = np.diff(scenario.t)
+
+        return {
+            'threshold' : threshold,
+            'interval' : interval,
+            'storms' : int(np.sum(storm[1:] & ~storm[:-1]) + storm[:1].sum()),
+            'storm_hours' : np.sum(dt[storm[:-1]]) / 3600.,
+            'storm_fraction' : np.sum(dt[storm[:-1]]) / np.sum(dt) if len(dt) > 0 else 0.,
+        }
+
+
+    def run(self, func):
+        '''Derive scenarios for all combinations of thresholds and intervals
+
+        Troughs are determined for all intervals first. Scenarios are
+        derived in parallel.
+
+        Parameters
+        ----------
+        func : function
+            function called with scenario, threshold and interval
+            for each combination, returning a result
+
+        Returns
+        -------
+        list
+            results for all combinations, ordered by interval and
+            threshold
+
+        '''
+
+        combinations = list(itertools.product(self.intervals, self.thresholds))
+
+        def job(combination):
+            interval, threshold = combination
+            scenario = self.get_scenario(threshold, interval)
+            return func(scenario, threshold, interval)
+
+        pool = ThreadPool(self.workers)
+        try:
+            pool.map(self.get_troughs, self.intervals)
+            results = pool.map(job, combinations)
+        finally:
+            pool.close()
+            pool.join()
+
+        logger.info('Derived %d scenarios from %d peaks' % (len(combinations), len(self.peaks)))
+
+        return results
+
+
+    def get_filename(self, threshold, interval):
+        '''Return name of configuration file for given threshold and interval'''
+        return 'windsurf_T%g_I%g.json' % (threshold, interval)
+
+
+    def write(self, path, configfile=None):
+        '''Write configuration file for each combination
+
+        Parameters
+        ----------
+        path : str
+            output directory
+        configfile : str, optional
+            Windsurf configuration file used as template for all
+            configuration files
+
+        Returns
+        -------
+        list
+            statistics of each scenario, see
+            :func:`~windsurf.sweep.ScenarioSweep.get_stats`
+
+        '''
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        def func(scenario, threshold, interval):
+            fname = os.path.join(path, self.get_filename(threshold, interval))
+            if configfile is not None:
+                shutil.copyfile(configfile, fname)
+            elif os.path.exists(fname):
+                os.remove(fname)
+            scenario.write_scenario(fname)
+
+            stats = self.get_stats(scenario, threshold, interval)
+            stats['configfile'] = fname
+            return stats
+
+        return self.run(func)
@@ -0,0 +1,181 @@
+import logging
+import numpy as np
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+# default model engines for variable names without model engine
+# prefix, used if the model engines do not report their variables
+DEFAULT_ENGINES = {
+    'Cu' : 'aeolis',
+    'Ct' : 'aeolis',
+    'supply' : 'aeolis',
+    'pickup' : 'aeolis',
+    'mass' : 'aeolis',
+    'uth' : 'aeolis',
+    'uw' : 'aeolis',
+    'uws' : 'aeolis',
+    'uwn' : 'aeolis',
+    'udir' : 'aeolis',
+    'zb' : 'xbeach',
+    'zs' : 'xbeach',
+    'zs0' : 'xbeach',
+    'H' : 'xbeach',
+}
+
+
+class VariableHandle(object):
+    '''Handle on a variable in a model engine
+
+    Holds the resolved model engine, variable name and model engine
+    object of a variable, such that the variable name only needs to be
+    resolved once. Handles are obtained through
+    :func:`~windsurf.model.Windsurf.get_var_handle` and can be cached
+    by the caller. The shape and data type of the variable are
+    determined on first access, preferably through ``get_var_shape``
+    and ``get_var_type``, and can be updated using
+    :func:`~windsurf.variables.VariableHandle.refresh`. They are None
+    for variables that cannot be read, like some model parameters.
+
+    '''
+
+
+    def __init__(self, engine, name, wrapper):
+        '''Initialize the class
+
+        Parameters
+        ----------
+        engine : str
+            name of model engine
+        name : str
+            name of variable in model engine
+        wrapper : IBmi
+            BMI compatible model engine object
+
+        '''
+
+        self.engine = engine
+        self.name = name
+        self.wrapper = wrapper
+        self._shape = None
+        self._dtype = None
+        self._resolved = False
+
+
+    def __repr__(self):
+        return '<VariableHandle "%s.%s" %s %s>' % (self.engine, self.name,
+                                                   self.shape, self.dtype)
+
+
+    @property
+    def shape(self):
+        '''Shape of variable or None if unknown'''
+        if not self._resolved:
+            self.refresh()
+        return self._shape
+
+
+    @property
+    def dtype(self):
+        '''Data type of variable or None if unknown'''
+        if not self._resolved:
+            self.refresh()
+        return self._dtype
+
+
+    def refresh(self):
+        '''Update shape and data type of variable
+
+        Uses ``get_var_shape`` and ``get_var_type`` if the model
+        engine implements them and falls back to reading the variable
+        otherwise. Shape and data type are set to None if neither
+        succeeds, like for write-only model parameters.
+
+        '''
+
+        self._resolved = True
+        self._shape = None
+        self._dtype = None
+
+        try:
+            self._shape = tuple(int(n) for n in self.wrapper.get_var_shape(self.name))
+            self._dtype = np.dtype(self.wrapper.get_var_type(self.name))
+            return
+        except:
+            pass
+
+        try:
+            value = np.asarray(self.wrapper.get_var(self.name))
+            self._shape = value.shape
+            self._dtype = value.dtype
+        except:
+            self._shape = None
+            self._dtype = None
+            logger.debug('Cannot determine shape of "%s" in engine "%s"' % (
+                self.name, self.engine))
+
+
+    def get(self):
+        '''Return array from model engine'''
+        return self.wrapper.get_var(self.name)
+
+
+    def set(self, value):
+        '''Set array in model engine'''
+        self.wrapper.set_var(self.name, value)
+
+
+def build_registry(wrappers):
+    '''Build registry of default model engines for variable names
+
+    Collects the variables of all model engines that report them
+    through ``get_var_count`` and ``get_var_name``. Variables listed
+    in :data:`DEFAULT_ENGINES` are assigned to the listed model engine
+    if it is loaded. Other variables that are reported by a single
+    model engine are assigned to that model engine.
+
+    Parameters
+    ----------
+    wrappers : dict
+        BMI compatible model engine objects by model engine name
+
+    Returns
+    -------
+    dict
+        default model engine by variable name
+    list
+        names of all reported variables including model engine prefix
+
+    '''
+
+    registry = dict(DEFAULT_ENGINES)
+    names = []
+    owners = {}
+
+    for engine in sorted(wrappers.iterkeys()):
+        wrapper = wrappers[engine]
+        try:
+            variables = [wrapper.get_var_name(i)
+                         for i in range(wrapper.get_var_count())]
+        except:
+            logger.debug('Engine "%s" does not report its variables' % engine)
+            continue
+
+        for var in variables:
+            names.append('%s.%s' % (engine, var))
+            if not owners.has_key(var):
+                owners[var] = []
+            owners[var].append(engine)
+
+    for var, engines in owners.iteritems():
+        if registry.has_key(var) and wrappers.has_key(registry[var]):
+            continue
+        elif len(engines) == 1:
+            registry[var] = engines[0]
+        else:
+            logger.debug('Variable "%s" is reported by multiple engines: %s' % (
+                var, ', '.join(engines)))
+
+    return registry, names
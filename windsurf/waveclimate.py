@@ -0,0 +1,319 @@
+'''Wave climate reduction
+
+Reduces a wave climate, like the JONSWAP conditions in
+``jons_table.txt``, into a small number of representative wave
+conditions. Each representative condition has a duration and weight
+equal to the total duration and fraction of time of the conditions it
+represents. Conditions are grouped using one of the following
+methods:
+
+- ``energy_flux``: conditions are divided into directional sectors
+  and each sector is divided into wave height classes that hold
+  equal parts of the wave energy flux of that sector.
+- ``kmeans``: conditions are clustered using k-means clustering on
+  normalized wave height, wave period and direction.
+- ``grid``: conditions are divided into regular wave height, wave
+  period and direction classes.
+
+Representative wave heights are chosen such that the wave energy flux
+is conserved, wave periods and directions are averaged weighted by
+the wave energy flux. All methods are vectorized and reduce
+multi-decade hourly wave climates in seconds.
+
+'''
+
+import logging
+import numpy as np
+
+
+# initialize log
+logger = logging.getLogger(__name__)
+
+
+# columns of jons_table
+HM0, TP, DIR, GAMMA, S, DURATION, DTBC = range(7)
+
+
+def reduce_wave_climate(table, method='energy_flux', n_classes=10, n_sectors=4,
+                        n_periods=3, iterations=50):
+    '''Reduce wave climate into representative wave conditions
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        wave climate in ``jons_table`` format: wave height,
+        peak period, direction, peak enhancement factor, directional
+        spreading, duration and time step of boundary conditions
+    method : str
+        reduction method: "energy_flux", "kmeans" or "grid"
+    n_classes : int
+        number of wave height classes per sector ("energy_flux" and
+        "grid") or number of clusters ("kmeans")
+    n_sectors : int
+        number of directional sectors ("energy_flux" and "grid")
+    n_periods : int
+        number of wave period classes ("grid")
+    iterations : int
+        maximum number of iterations ("kmeans")
+
+    Returns
+    -------
+    numpy.ndarray
+        representative wave conditions in ``jons_table`` format
+    numpy.ndarray
+        weight (fraction of time) of each representative condition
+
+    Raises
+    ------
+    ValueError
+        if the method is unknown
+
+    '''
+
+    table = np.atleast_2d(np.asarray(table, dtype=float))
+
+    if method == 'energy_flux':
+        classes = classify_energy_flux(table, n_classes, n_sectors)
+    elif method == 'kmeans':
+        classes = classify_kmeans(table, n_classes, iterations)
+    elif method == 'grid':
+        classes = classify_grid(table, n_classes, n_sectors, n_periods)
+    else:
+        raise ValueError('Unknown reduction method "%s", use one of: energy_flux, kmeans, grid' % method)
+
+    reduced, weights = aggregate_classes(table, classes)
+
+    logger.info('Reduced wave climate from %d to %d conditions using %s method' % (
+        len(table), len(reduced), method))
+
+    return reduced, weights
+
+
+def reduce_jons_table(infile, outfile, **kwargs):
+    '''Reduce wave climate in jons_table file
+
+    Parameters
+    ----------
+    infile : str
+        path to input jons_table file
+    outfile : str
+        path to output jons_table file
+    kwargs : dict
+        options passed to :func:`reduce_wave_climate`
+
+    Returns
+    -------
+    numpy.ndarray
+        weight (fraction of time) of each representative condition
+
+    '''
+
+    reduced, weights = reduce_wave_climate(np.loadtxt(infile), **kwargs)
+    np.savetxt(outfile, reduced, fmt='%f')
+
+    return weights
+
+
+def get_energy_flux(table):
+    '''Return wave energy flux of each condition, per unit duration
+
+    Deep water approximation: proportional to the squared wave height
+    times the wave period.
+
+    '''
+
+    return table[:,HM0]**2 * table[:,TP]
+
+
+def get_sectors(directions, n_sectors):
+    '''Divide directions into equal sectors
+
+    Sectors are centered around the mean direction of the wave
+    climate, such that a narrow directional distribution is not split
+    at an arbitrary angle.
+
+    '''
+
+    r = np.radians(directions)
+    center = np.degrees(np.arctan2(np.mean(np.sin(r)), np.mean(np.cos(r))))
+    rel = np.mod(directions - center + 180., 360.)
+    return np.minimum((rel / 360. * n_sectors).astype(int), n_sectors - 1)
+
+
+def classify_energy_flux(table, n_classes, n_sectors):
+    '''Classify wave conditions in classes of equal energy flux
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        wave climate in ``jons_table`` format
+    n_classes : int
+        number of wave height classes per sector
+    n_sectors : int
+        number of directional sectors
+
+    Returns
+    -------
+    numpy.ndarray
+        class index of each wave condition
+
+    '''
+
+    sector = get_sectors(table[:,DIR], n_sectors)
+    flux = get_energy_flux(table) * table[:,DURATION]
+
+    # sort by sector and wave height
+    order = np.lexsort((table[:,HM0], sector))
+    cumflux = np.cumsum(flux[order])
+
+    # cumulative energy flux within each sector
+    total = np.bincount(sector, weights=flux, minlength=n_sectors)
+    offset = np.concatenate(([0.], np.cumsum(total)[:-1]))
+    s = sector[order]
+    frac = (cumflux - offset[s] - .5 * flux[order]) / np.where(total[s] > 0., total[s], 1.)
+
+    classes = np.zeros(len(table), dtype=int)
+    classes[order] = s * n_classes + np.clip((frac * n_classes).astype(int), 0, n_classes - 1)
+
+    return classes
+
+
+def classify_kmeans(table, n_classes, iterations=50):
+    '''Classify wave conditions using k-means clustering
+
+    Clusters wave height, wave period and direction, normalized by
+    their standard deviation. Directions are represented as unit
+    vectors. Initial cluster centers are chosen at evenly spaced
+    quantiles of the energy flux, such that results are
+    deterministic.
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        wave climate in ``jons_table`` format
+    n_classes : int
+        number of clusters
+    iterations : int
+        maximum number of iterations
+
+    Returns
+    -------
+    numpy.ndarray
+        class index of each wave condition
+
+    '''
+
+    r = np.radians(table[:,DIR])
+    features = np.column_stack((table[:,HM0], table[:,TP], np.cos(r), np.sin(r)))
+    std = features.std(axis=0)
+    features /= np.where(std > 1e-9, std, 1.)
+
+    n_classes = min(n_classes, len(table))
+    order = np.argsort(get_energy_flux(table), kind='mergesort')
+    centers = features[order[np.linspace(0, len(table) - 1, n_classes).astype(int)]]
+
+    classes = np.zeros(len(table), dtype=int)
+    for i in range(iterations):
+        # squared distances to centers, leaving out the squared norm
+        # of the features as it does not affect the nearest center
+        d = (centers**2).sum(axis=1)[np.newaxis,:] - 2. * features.dot(centers.T)
+        new = np.argmin(d, axis=1)
+        if i > 0 and np.all(new == classes):
+            break
+        classes = new
+
+        counts = np.bincount(classes, minlength=n_classes)
+        for j in range(features.shape[1]):
+            sums = np.bincount(classes, weights=features[:,j], minlength=n_classes)
+            centers[:,j] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:,j])
+
+    return classes
+
+
+def classify_grid(table, n_classes, n_sectors, n_periods):
+    '''Classify wave conditions in regular classes
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        wave climate in ``jons_table`` format
+    n_classes : int
+        number of wave height classes
+    n_sectors : int
+        number of directional sectors
+    n_periods : int
+        number of wave period classes
+
+    Returns
+    -------
+    numpy.ndarray
+        class index of each wave condition
+
+    '''
+
+    def regular(x, n):
+        lo, hi = x.min(), x.max()
+        if hi == lo:
+            return np.zeros(len(x), dtype=int)
+        return np.minimum(((x - lo) / (hi - lo) * n).astype(int), n - 1)
+
+    sector = get_sectors(table[:,DIR], n_sectors)
+    height = regular(table[:,HM0], n_classes)
+    period = regular(table[:,TP], n_periods)
+
+    return (sector * n_periods + period) * n_classes + height
+
+
+def aggregate_classes(table, classes):
+    '''Compute representative wave condition of each class
+
+    Empty classes are removed.
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        wave climate in ``jons_table`` format
+    classes : numpy.ndarray
+        class index of each wave condition
+
+    Returns
+    -------
+    numpy.ndarray
+        representative wave conditions in ``jons_table`` format
+    numpy.ndarray
+        weight (fraction of time) of each representative condition
+
+    '''
+
+    classes = np.unique(classes, return_inverse=True)[1]
+    n = classes.max() + 1
+
+    duration = table[:,DURATION]
+    flux = get_energy_flux(table) * duration
+
+    def total(x):
+        return np.bincount(classes, weights=x, minlength=n)
+
+    T = total(duration)
+    F = total(flux)
+    Fw = np.where(F > 0., F, 1.)
+
+    # flux-weighted averages, or time-weighted averages if there is no flux
+    def average(x):
+        return np.where(F > 0., total(flux * x) / Fw, total(duration * x) / T)
+
+    reduced = np.zeros((n, table.shape[1]))
+    reduced[:,TP] = average(table[:,TP])
+    reduced[:,HM0] = np.sqrt(F / T / np.where(reduced[:,TP] > 0., reduced[:,TP], 1.))
+
+    r = np.radians(table[:,DIR])
+    reduced[:,DIR] = np.mod(np.degrees(np.arctan2(average(np.sin(r)),
+                                                  average(np.cos(r)))), 360.)
+
+    for j in range(table.shape[1]):
+        if j not in (HM0, TP, DIR, DURATION):
+            reduced[:,j] = total(duration * table[:,j]) / T
+
+    reduced[:,DURATION] = T
+
+    return reduced, T / T.sum()